@@ -0,0 +1,199 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from core import CaseCatalog
+
+# Sessions per task. Tasks, not workers, get their own random stream, so
+# results for a seed are the same whatever the number of processes
+SESSIONS_PER_TASK = 1000
+# Opens simulated at once per task, bounds the size of the draw matrix
+BLOCK_STEPS = 1000
+# Balance percentiles reported along the trajectories
+TRAJECTORY_POINTS = 10
+PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+def case_statistics(case):
+    # Exact figures for one opening, from the same probabilities the drops use
+    probabilities = np.asarray(case.sampler.probabilities, dtype=np.float64)
+    prices = np.array([item['price'] for item in case.items], dtype=np.float64)
+    if not len(prices) or probabilities.sum() <= 0:
+        return None
+
+    ev = float(probabilities @ prices)
+    variance = float(probabilities @ (prices - ev) ** 2)
+    net = prices - case.price
+
+    # Quantiles of the result of a single opening, from the exact distribution
+    order = np.argsort(net)
+    cumulative = np.cumsum(probabilities[order])
+
+    def quantile(q):
+        return float(net[order][min(np.searchsorted(cumulative, q), len(order) - 1)])
+
+    return {
+        'price': case.price,
+        'items': len(prices),
+        'expected_value': ev,
+        'std': variance ** 0.5,
+        'return_to_player': ev / case.price if case.price else None,
+        'house_edge': case.price - ev,
+        'profit_chance': float(probabilities[net > 0].sum()),
+        'net_quantiles': {f"p{p}": quantile(p / 100) for p in PERCENTILES},
+        'best_drop': float(prices.max()),
+        'worst_drop': float(prices.min())
+    }
+
+def simulate_sessions(prices, prob, alias, case_price, bankroll, opens, sessions, seed, checkpoints):
+    # Runs in a worker process. Every session opens the case and sells the
+    # drop right away until it has made `opens` openings or can't afford
+    # the next one (ruin). Returns final balances, ruin times (-1 if never
+    # ruined) and the balances at each checkpoint step
+    rng = np.random.default_rng(seed)
+    n = len(prices)
+    net = prices - case_price
+    balances = np.full(sessions, float(bankroll))
+    ruin_times = np.full(sessions, -1, dtype=np.int64)
+    alive = np.flatnonzero(balances >= case_price)
+    ruin_times[balances < case_price] = 0
+    trajectory = np.empty((sessions, len(checkpoints)))
+
+    step = 0
+    for point, target in enumerate(checkpoints):
+        while step < target and len(alive):
+            size = min(BLOCK_STEPS, target - step)
+            columns = rng.integers(0, n, size=(len(alive), size))
+            coins = rng.random((len(alive), size))
+            drawn = np.where(coins < prob[columns], columns, alias[columns])
+            paths = balances[alive, None] + np.cumsum(net[drawn], axis=1)
+
+            # Balance before each opening in the block; below the price means ruin
+            before = np.concatenate((balances[alive, None], paths[:, :-1]), axis=1)
+            broke = before < case_price
+            ruined = broke.any(axis=1)
+            first = broke.argmax(axis=1)
+
+            ended = alive[ruined]
+            balances[ended] = before[ruined, first[ruined]]
+            ruin_times[ended] = step + first[ruined]
+            # A session left short by its last draw is caught by the next block
+            alive = alive[~ruined]
+            balances[alive] = paths[~ruined, -1]
+            step += size
+        trajectory[:, point] = balances
+    return balances, ruin_times, trajectory
+
+def analyze_case(case, pool, sessions, opens, bankroll, seed):
+    stats = case_statistics(case)
+    if stats is None:
+        return None
+
+    sampler = case.sampler
+    prices = np.array([item['price'] for item in case.items], dtype=np.float64)
+    prob = np.asarray(sampler.prob, dtype=np.float64)
+    alias = np.asarray(sampler.alias, dtype=np.intp)
+    checkpoints = sorted({max(1, round(opens * (i + 1) / TRAJECTORY_POINTS))
+                          for i in range(TRAJECTORY_POINTS)})
+
+    task_sizes = [min(SESSIONS_PER_TASK, sessions - start)
+                  for start in range(0, sessions, SESSIONS_PER_TASK)]
+    seeds = np.random.SeedSequence([seed, *case.name.encode('utf-8')]).spawn(len(task_sizes))
+    start = time.perf_counter()
+    futures = [pool.submit(simulate_sessions, prices, prob, alias, case.price, bankroll, opens,
+                           size, task_seed, checkpoints)
+               for size, task_seed in zip(task_sizes, seeds)]
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+
+    balances = np.concatenate([r[0] for r in results])
+    ruin_times = np.concatenate([r[1] for r in results])
+    trajectory = np.concatenate([r[2] for r in results])
+    ruined = ruin_times >= 0
+    opened = np.where(ruined, ruin_times, opens)
+
+    stats['session'] = {
+        'sessions': sessions,
+        'opens': opens,
+        'bankroll': bankroll,
+        'expected_loss': opens * stats['house_edge'],
+        'ruin_chance': float(ruined.mean()),
+        'ruin_time': ({f"p{p}": float(np.percentile(ruin_times[ruined], p)) for p in (5, 50, 95)}
+                      if ruined.any() else None),
+        'final_balance': {f"p{p}": float(np.percentile(balances, p)) for p in PERCENTILES},
+        'mean_final_balance': float(balances.mean()),
+        'trajectory': [{'opens': point,
+                        **{f"p{p}": float(np.percentile(trajectory[:, i], p)) for p in (5, 50, 95)}}
+                       for i, point in enumerate(checkpoints)],
+        'simulated_opens': int(opened.sum()),
+        'seconds': elapsed
+    }
+    return stats
+
+def print_report(name, stats):
+    print(f"== {name} (${stats['price']:.2f}, {stats['items']} items)")
+    if stats['return_to_player'] is not None:
+        print(f"   expected value ${stats['expected_value']:.2f} ({stats['return_to_player']:.1%} of the price), "
+              f"std ${stats['std']:.2f}, house edge ${stats['house_edge']:.2f} per open")
+    else:
+        print(f"   expected value ${stats['expected_value']:.2f}, std ${stats['std']:.2f}")
+    print(f"   profit on {stats['profit_chance']:.1%} of opens, drops from ${stats['worst_drop']:.2f} "
+          f"to ${stats['best_drop']:.2f}")
+    print("   result of one open: " + ", ".join(f"{p} {v:+.2f}" for p, v in stats['net_quantiles'].items()))
+
+    session = stats.get('session')
+    if session:
+        print(f"   {session['sessions']} sessions of up to {session['opens']} opens from "
+              f"${session['bankroll']:.2f}: ruin chance {session['ruin_chance']:.1%}, "
+              f"expected loss ${session['expected_loss']:.2f}")
+        if session['ruin_time']:
+            print("   opens until ruin: " + ", ".join(f"{p} {v:.0f}" for p, v in session['ruin_time'].items()))
+        print("   final balance: " + ", ".join(f"{p} ${v:.2f}" for p, v in session['final_balance'].items()))
+        for point in session['trajectory']:
+            print(f"     after {point['opens']:>8} opens: p5 ${point['p5']:.2f}  "
+                  f"p50 ${point['p50']:.2f}  p95 ${point['p95']:.2f}")
+        print(f"   {session['simulated_opens'] / session['seconds']:,.0f} simulated opens/s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Expected value and risk of opening cases")
+    parser.add_argument("--cases", default="cases", help="Cases folder")
+    parser.add_argument("names", nargs="*", help="Case names to analyze (default: all)")
+    parser.add_argument("--sessions", type=int, default=10000, help="Simulated sessions per case")
+    parser.add_argument("--opens", type=int, default=1000, help="Opens per session")
+    parser.add_argument("--bankroll", type=float, default=1000.0, help="Starting balance of each session")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for reproducible simulations")
+    parser.add_argument("--exact-only", action="store_true", help="Skip the simulations")
+    parser.add_argument("--output", help="Write the reports as JSON to this file")
+    args = parser.parse_args()
+
+    cases = CaseCatalog(args.cases).load()
+    if args.names:
+        cases = [case for case in cases if case.name in args.names]
+    if not cases:
+        print("No cases to analyze")
+        return 1
+
+    reports = {}
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for case in sorted(cases, key=lambda case: case.name):
+            if args.exact_only:
+                stats = case_statistics(case)
+            else:
+                stats = analyze_case(case, pool, args.sessions, args.opens, args.bankroll, args.seed)
+            if stats is None:
+                print(f"== {case.name}: no items that can drop")
+                continue
+            reports[case.name] = stats
+            print_report(case.name, stats)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'seed': args.seed, 'cases': reports}, f, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,399 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from core import Account, Case, CaseCatalog, Inventory, RARITY_WEIGHTS
+
+RARITIES = list(RARITY_WEIGHTS)
+
+# Generators
+
+def generate_cases(folder, case_count, min_items, max_items, seed=0, sprite_ratio=0.5):
+    # Synthetic cases/ folder. All images are hard links to one small PNG so
+    # that thousands of cases don't take long to generate or much disk
+    from PIL import Image
+
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    template = os.path.join(folder, ".template.png")
+    Image.new('RGB', (256, 256), color=(90, 120, 200)).save(template)
+
+    for c in range(case_count):
+        case_folder = os.path.join(folder, f"Case {c:05d}")
+        sprites = os.path.join(case_folder, "sprites")
+        os.makedirs(sprites, exist_ok=True)
+        with open(os.path.join(case_folder, "case.txt"), 'w', encoding='utf-8') as f:
+            f.write(f"Case {c:05d}\n{rng.uniform(1, 50):.2f}\n")
+        link_file(template, os.path.join(case_folder, "case.png"))
+
+        lines = []
+        for i in range(rng.randint(min_items, max_items)):
+            rarity = rng.choice(RARITIES)
+            lines.append(f"Item{i};Skin{i};{rng.uniform(0.1, 500):.2f};{rarity}\n")
+            if rng.random() < sprite_ratio:
+                link_file(template, os.path.join(sprites, f"Item{i}_Skin{i}.png"))
+        with open(os.path.join(case_folder, "items.txt"), 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+    os.remove(template)
+
+def link_file(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+def generate_inventory(path, cases, count, seed=0, journal=True, catalog=None):
+    # Inventory file with `count` random drops from `cases`
+    rng = random.Random(seed)
+    inventory = Inventory(path, journal=journal, catalog=catalog)
+    batch = []
+    for _ in range(count):
+        batch.append(rng.choice(cases).sampler.draw(rng))
+        if len(batch) >= 10000:
+            inventory.add_items(batch)
+            batch = []
+    inventory.add_items(batch)
+    inventory.save()
+    inventory.close()
+
+# Measurement
+
+def summarize(name, durations, ops_per_sample=1, **extra):
+    # Latency percentiles per sample and overall throughput in ops/s
+    ordered = sorted(durations)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+    total = sum(durations)
+    result = {
+        'name': name,
+        'samples': len(durations),
+        'ops': len(durations) * ops_per_sample,
+        'total_s': total,
+        'mean_ms': statistics.fmean(durations) * 1000,
+        'p50_ms': percentile(50) * 1000,
+        'p90_ms': percentile(90) * 1000,
+        'p99_ms': percentile(99) * 1000,
+        'max_ms': ordered[-1] * 1000,
+        'ops_per_s': len(durations) * ops_per_sample / total if total else 0.0
+    }
+    result.update(extra)
+    return result
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+# Benchmarks
+
+def bench_case_loading(workspace, args):
+    folder = os.path.join(workspace, "cases")
+    folders = [entry.path for entry in os.scandir(folder) if entry.is_dir()]
+    results = [summarize("case.load_from_folder",
+                         timed_each(Case.load_from_folder, folders), cases=len(folders))]
+
+    manifest = os.path.join(folder, ".catalog.json")
+
+    def load_all():
+        cases = CaseCatalog(folder).load()
+        headers_done = time.perf_counter()
+        for case in cases:
+            case.items
+        return headers_done
+
+    for label, keep_manifest in (("cold", False), ("warm", True)):
+        headers, full = [], []
+        for _ in range(args.repeat):
+            if not keep_manifest and os.path.exists(manifest):
+                os.remove(manifest)
+            start = time.perf_counter()
+            headers_done = load_all()
+            full.append(time.perf_counter() - start)
+            headers.append(headers_done - start)
+            # Let the background writer finish before the next run
+            wait_for_manifest(manifest)
+        results.append(summarize(f"catalog.load.{label}.headers", headers, len(folders)))
+        results.append(summarize(f"catalog.load.{label}.items", full, len(folders)))
+    return results
+
+def timed_each(fn, values):
+    durations = []
+    for value in values:
+        start = time.perf_counter()
+        fn(value)
+        durations.append(time.perf_counter() - start)
+    return durations
+
+def wait_for_manifest(path, timeout=30):
+    deadline = time.time() + timeout
+    while not os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.01)
+
+def bench_draws(workspace, args, cases):
+    rng = random.Random(1)
+    samples = [rng.choice(cases) for _ in range(args.draws)]
+    for case in set(samples):
+        case.sampler
+    durations = timed_each(lambda case: case.sampler.draw(), samples)
+    results = [summarize("sampler.draw", durations)]
+
+    batch = 10000
+    case = max(cases, key=lambda c: len(c.items))
+    durations = timed(lambda: case.sampler.draw_many(batch), max(1, args.draws // batch))
+    results.append(summarize("sampler.draw_many", durations, batch, items=len(case.items)))
+    return results
+
+def bench_inventory(workspace, args, cases, catalog):
+    results = []
+    for size in args.inventory:
+        for label, journal, item_catalog in (("journal", True, catalog),
+                                             ("plain", False, None)):
+            path = os.path.join(workspace, f"inventory_{label}_{size}.txt")
+            generate_inventory(path, cases, size, journal=journal, catalog=item_catalog)
+            file_size = os.path.getsize(path)
+
+            holder = {}
+
+            def load():
+                holder['inventory'] = Inventory(path, journal=journal, catalog=item_catalog)
+
+            results.append(summarize(f"inventory.load.{label}.{size}", timed(load, args.repeat), size,
+                                     items=size, file_bytes=file_size))
+            inventory = holder['inventory']
+            results.append(summarize(f"inventory.save.{label}.{size}", timed(inventory.save, args.repeat),
+                                     size, items=size))
+
+            if journal:
+                drops = [random.choice(cases).sampler.draw() for _ in range(args.adds)]
+                results.append(summarize(f"inventory.add_item.{label}.{size}",
+                                         timed_each(inventory.add_item, drops), items=size))
+            inventory.close()
+    return results
+
+def bench_ledger(workspace, args, cases, catalog):
+    folder = os.path.join(workspace, "ledger")
+    os.makedirs(folder, exist_ok=True)
+    account = Account(os.path.join(folder, "money.txt"), os.path.join(folder, "inventory.txt"),
+                      os.path.join(folder, "ledger.log"), catalog)
+    account.money_manager.balance = 1e12
+    drops = [random.choice(cases).sampler.draw() for _ in range(args.adds)]
+
+    def open_one(item):
+        with account.transaction():
+            account.money_manager.deduct_money(1.0)
+            account.inventory.add_item(item)
+
+    durations = timed_each(open_one, drops)
+    start = time.perf_counter()
+    account.ledger.flush()
+    flush = time.perf_counter() - start
+    result = summarize("account.open_transaction", durations, writes=account.ledger.writes,
+                       final_flush_ms=flush * 1000)
+    account.close()
+    return [result]
+
+def bench_cli(workspace, args, cases, catalog):
+    # Whole command-line runs, interpreter start included, against a large
+    # inventory: open and sell must stay within the budget whatever its size
+    import subprocess
+
+    import cli
+
+    folder = os.path.join(workspace, "cli")
+    os.makedirs(folder, exist_ok=True)
+    size = args.cli_inventory
+    # Files of an earlier run in the same workspace would add to this one
+    for name in ("inventory.txt", "inventory.txt.bak", "ledger.log", "ledger.log.old"):
+        if os.path.exists(os.path.join(folder, name)):
+            os.remove(os.path.join(folder, name))
+    generate_inventory(os.path.join(folder, "inventory.txt"), cases, size, catalog=catalog)
+    with open(os.path.join(folder, "money.txt"), 'w') as f:
+        f.write("1000000000.0")
+    cheapest = min(cases, key=lambda case: case.price)
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "cli.py"),
+               "--cases", os.path.join(workspace, "cases"),
+               "--money", os.path.join(folder, "money.txt"),
+               "--inventory", os.path.join(folder, "inventory.txt"),
+               "--ledger", os.path.join(folder, "ledger.log")]
+
+    # A few ids spread over the file; after the first run they are sold already
+    sold = [str(item_id) for item_id in range(1, size + 1, max(1, size // 5))]
+
+    results = []
+    # list and stats go through every item; the others only read the ends of the files
+    for name, extra, budget in (("balance", ["balance"], cli.STARTUP_BUDGET_MS),
+                                ("list", ["list", "--sort", "price", "--desc", "--limit", "20"], None),
+                                ("stats", ["stats"], None),
+                                ("open", ["open", cheapest.name, "10"], cli.STARTUP_BUDGET_MS),
+                                ("sell", ["sell", *sold], cli.STARTUP_BUDGET_MS)):
+        durations = timed(lambda: subprocess.run(command + extra, capture_output=True, check=True),
+                          args.repeat)
+        result = summarize(f"cli.{name}", durations, items=size)
+        if budget is not None:
+            result['budget_ms'] = budget
+            result['over_budget'] = result['p50_ms'] > budget
+        results.append(result)
+    return results
+
+def bench_rendering(workspace, args, catalog):
+    # Needs a display; without one the benchmark is reported as skipped
+    try:
+        from tkinter import Tk, TclError
+        root = Tk()
+    except Exception as e:
+        return [{'name': "render.inventory", 'skipped': f"no display: {e}"}]
+
+    # Imported here so the other benchmarks (and server.py load) never load Tk
+    from image_cache import ImageCache
+    from main import CaseApp
+
+    class BenchApp(CaseApp):
+        # The real inventory screen over the benchmark files; only the
+        # startup of the window (cases folder, watcher, main menu) is left out
+        def __init__(self, root, account):
+            self.root = root
+            self.catalog = catalog
+            self.account = account
+            self.money_manager = account.money_manager
+            self.inventory = account.inventory
+            self.images = ImageCache(cache_dir=os.path.join(workspace, "thumbnails"))
+            self.screens = {}
+            self.current_screen = None
+            self.balance_labels = []
+            self.case_grid = None
+            self.inventory_filter_job = None
+            self.selected_items = set()
+            self.selected_total = 0.0
+            self.inventory_dirty = True
+            self.inventory_refresh_pending = False
+
+    results = []
+    account = None
+    try:
+        root.withdraw()
+        root.geometry("1000x700")
+        size = args.inventory[-1]
+        path = os.path.join(workspace, f"inventory_journal_{size}.txt")
+        account = Account(os.path.join(workspace, "render_money.txt"), path,
+                          os.path.join(workspace, "render_ledger.log"), catalog, eager_checkpoints=False)
+        app = BenchApp(root, account)
+
+        start = time.perf_counter()
+        app.show_inventory()
+        root.update()
+        view = app.inventory_list
+        results.append(summarize("render.inventory.open", [time.perf_counter() - start],
+                                 items=size, rows=len(view.rows)))
+
+        def scroll():
+            view.yview("scroll", 5, "units")
+            root.update_idletasks()
+
+        results.append(summarize("render.inventory.scroll", timed(scroll, 200), items=size))
+    except TclError as e:
+        results.append({'name': "render.inventory", 'skipped': str(e)})
+    finally:
+        if account is not None:
+            account.close()
+        root.destroy()
+    return results
+
+# Reporting
+
+def print_results(results, baseline=None):
+    previous = {r['name']: r for r in (baseline or {}).get('results', []) if 'skipped' not in r}
+    print(f"{'benchmark':40} {'ops/s':>14} {'p50 ms':>10} {'p99 ms':>10} {'max ms':>10}")
+    for r in results:
+        if 'skipped' in r:
+            print(f"{r['name']:40} skipped ({r['skipped']})")
+            continue
+        line = (f"{r['name']:40} {r['ops_per_s']:>14,.0f} {r['p50_ms']:>10.3f} "
+                f"{r['p99_ms']:>10.3f} {r['max_ms']:>10.3f}")
+        if r['name'] in previous and previous[r['name']]['ops_per_s']:
+            line += f"  x{r['ops_per_s'] / previous[r['name']]['ops_per_s']:.2f} vs baseline"
+        if r.get('over_budget'):
+            line += f"  OVER BUDGET ({r['budget_ms']} ms)"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark case loading, drops and inventory storage")
+    parser.add_argument("--cases", type=int, default=200, help="Number of synthetic cases")
+    parser.add_argument("--min-items", type=int, default=10, help="Minimum items per case")
+    parser.add_argument("--max-items", type=int, default=100, help="Maximum items per case")
+    parser.add_argument("--inventory", type=int, nargs="+", default=[1000, 100000],
+                        help="Inventory sizes to benchmark")
+    parser.add_argument("--cli-inventory", type=int, default=1000000,
+                        help="Inventory size for the command-line runs")
+    parser.add_argument("--draws", type=int, default=100000, help="Number of single draws")
+    parser.add_argument("--adds", type=int, default=2000, help="Number of single item adds")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of whole-file benchmarks")
+    parser.add_argument("--only", nargs="+",
+                        choices=["cases", "draws", "inventory", "ledger", "cli", "render"],
+                        help="Run only these groups")
+    parser.add_argument("--workspace", help="Keep generated data in this folder")
+    parser.add_argument("--output", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    args = parser.parse_args()
+
+    groups = set(args.only or ["cases", "draws", "inventory", "ledger", "cli", "render"])
+    workspace = args.workspace or tempfile.mkdtemp(prefix="casepy-bench-")
+    cases_folder = os.path.join(workspace, "cases")
+
+    try:
+        if not os.path.exists(cases_folder):
+            start = time.perf_counter()
+            generate_cases(cases_folder, args.cases, args.min_items, args.max_items)
+            print(f"Generated {args.cases} cases in {time.perf_counter() - start:.1f}s")
+
+        catalog = CaseCatalog(cases_folder)
+        cases = catalog.load()
+
+        results = []
+        if "cases" in groups:
+            results += bench_case_loading(workspace, args)
+        if "draws" in groups:
+            results += bench_draws(workspace, args, cases)
+        if "inventory" in groups or "render" in groups:
+            results += bench_inventory(workspace, args, cases, catalog)
+        if "ledger" in groups:
+            results += bench_ledger(workspace, args, cases, catalog)
+        if "cli" in groups:
+            results += bench_cli(workspace, args, cases, catalog)
+        if "render" in groups:
+            results += bench_rendering(workspace, args, catalog)
+    finally:
+        if not args.workspace:
+            shutil.rmtree(workspace, ignore_errors=True)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            'timestamp': time.time(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'parameters': {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+            'results': results
+        }
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,222 @@
+import argparse
+import io
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+
+# Pack layout, all integers little-endian:
+#   header     magic, version, item count, blob count and section offsets
+#   meta       JSON with the case name, price and rarity weights
+#   item table per item: name/skin/rarity lengths, price, sprite blob index
+#              (-1 when there is no sprite), then the three UTF-8 strings
+#   blob index per blob: offset and length inside the file
+#   blobs      raw PNG bytes; blob 0 is the case image
+PACK_MAGIC = b"CPAK"
+PACK_VERSION = 1
+PACK_EXTENSION = ".casepack"
+HEADER = struct.Struct("<4sHHIIQQQQ")
+ITEM = struct.Struct("<HHHdi")
+BLOB = struct.Struct("<QQ")
+# Item, skin and rarity names are stored with a 16-bit length
+MAX_NAME_BYTES = 0xFFFF
+
+# Sprite paths inside a pack look like "pack:<pack file>#<blob index>"
+PACK_PREFIX = "pack:"
+
+class CasePack:
+    # Read-only view of a pack file through mmap. Item sprites are sliced
+    # straight out of the mapping, nothing is read until it is needed
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+        (magic, version, _, self.item_count, self.blob_count,
+         meta_offset, meta_size, items_offset, blobs_offset) = HEADER.unpack_from(self.map, 0)
+        if magic != PACK_MAGIC:
+            raise ValueError(f"{path} is not a case pack")
+        if version != PACK_VERSION:
+            raise ValueError(f"Unsupported case pack version {version} in {path}")
+
+        meta = json.loads(bytes(self.view[meta_offset:meta_offset + meta_size]).decode('utf-8'))
+        self.name = meta['name']
+        self.price = meta['price']
+        self.rarity_weights = meta.get('weights', {})
+        self.items_offset = items_offset
+        self.blobs_offset = blobs_offset
+
+    def read_items(self):
+        # Yields (item, skin, price, rarity, sprite blob index or -1)
+        offset = self.items_offset
+        for _ in range(self.item_count):
+            name_len, skin_len, rarity_len, price, blob = ITEM.unpack_from(self.map, offset)
+            offset += ITEM.size
+            name = str(self.view[offset:offset + name_len], 'utf-8')
+            offset += name_len
+            skin = str(self.view[offset:offset + skin_len], 'utf-8')
+            offset += skin_len
+            rarity = str(self.view[offset:offset + rarity_len], 'utf-8')
+            offset += rarity_len
+            yield name, skin, price, rarity, blob
+
+    def blob(self, index):
+        if not 0 <= index < self.blob_count:
+            raise IndexError(f"No blob {index} in {self.path}")
+        offset, length = BLOB.unpack_from(self.map, self.blobs_offset + index * BLOB.size)
+        return self.view[offset:offset + length]
+
+    def open_image(self, index):
+        from PIL import Image
+
+        # PIL reads the sprite straight from the mapping, the blob is never copied whole
+        return Image.open(BlobReader(self.blob(index)))
+
+class BlobReader(io.RawIOBase):
+    # Seekable file object over a memoryview. io.BytesIO would copy the view
+    # first, this only copies what is read
+    def __init__(self, view):
+        self.view = view
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        end = len(self.view) if size is None or size < 0 else self.position + size
+        data = bytes(self.view[self.position:end])
+        self.position += len(data)
+        return data
+
+    def readinto(self, buffer):
+        data = self.view[self.position:self.position + len(buffer)]
+        buffer[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += len(self.view)
+        if offset < 0:
+            raise ValueError(f"Negative seek position {offset}")
+        self.position = offset
+        return self.position
+
+    def tell(self):
+        return self.position
+
+_packs = {}
+_packs_lock = threading.Lock()
+
+def open_pack(path):
+    # Packs are mapped once per process and remapped when the file changes
+    mtime_ns = os.stat(path).st_mtime_ns
+    with _packs_lock:
+        pack = _packs.get(path)
+        if pack is None or pack.mtime_ns != mtime_ns:
+            pack = CasePack(path)
+            _packs[path] = pack
+        return pack
+
+def forget_pack(path):
+    # Drops a removed or replaced pack; the mapping closes once nothing uses it
+    with _packs_lock:
+        _packs.pop(path, None)
+
+def sprite_ref(pack_path, index):
+    return f"{PACK_PREFIX}{pack_path}#{index}"
+
+def parse_ref(ref):
+    pack_path, _, index = ref[len(PACK_PREFIX):].rpartition('#')
+    return pack_path, int(index)
+
+def is_pack_ref(path):
+    return isinstance(path, str) and path.startswith(PACK_PREFIX)
+
+def open_sprite(ref):
+    pack_path, index = parse_ref(ref)
+    return open_pack(pack_path).open_image(index)
+
+def write_pack(out_path, name, price, rarity_weights, case_image, items):
+    # items: (item, skin, price, rarity, sprite file path or None)
+    blob_paths = [case_image]
+    item_table = bytearray()
+    for item_name, skin, item_price, rarity, sprite in items:
+        blob = -1
+        if sprite:
+            blob = len(blob_paths)
+            blob_paths.append(sprite)
+        encoded = [item_name.encode('utf-8'), skin.encode('utf-8'), rarity.encode('utf-8')]
+        # Checked before anything is written, the lengths are stored in 16 bits
+        for part in encoded:
+            if len(part) > MAX_NAME_BYTES:
+                raise ValueError(f"Item {item_name[:40]!r}: names in a pack can't be longer than "
+                                 f"{MAX_NAME_BYTES} bytes")
+        item_table += ITEM.pack(*(len(part) for part in encoded), item_price, blob)
+        for part in encoded:
+            item_table += part
+
+    meta = json.dumps({'name': name, 'price': price, 'weights': rarity_weights},
+                      ensure_ascii=False).encode('utf-8')
+    meta_offset = HEADER.size
+    items_offset = meta_offset + len(meta)
+    blobs_offset = items_offset + len(item_table)
+    data_offset = blobs_offset + len(blob_paths) * BLOB.size
+
+    temp_path = out_path + ".tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(PACK_MAGIC, PACK_VERSION, 0, len(items), len(blob_paths),
+                            meta_offset, len(meta), items_offset, blobs_offset))
+        f.write(meta)
+        f.write(item_table)
+
+        offset = data_offset
+        for path in blob_paths:
+            size = os.path.getsize(path)
+            f.write(BLOB.pack(offset, size))
+            offset += size
+        for path in blob_paths:
+            with open(path, 'rb') as blob_file:
+                shutil.copyfileobj(blob_file, f)
+    os.replace(temp_path, out_path)
+
+def pack_folder(folder_path, out_path=None):
+    from core import Case
+
+    name, price, image_path, rarity_weights = Case.read_case_info(folder_path)
+    items = Case.read_items(folder_path, name)
+    out_path = out_path or folder_path.rstrip("/\\") + PACK_EXTENSION
+    write_pack(out_path, name, price, rarity_weights, image_path,
+               [(item['item'], item['skin'], item['price'], item['rarity'], item['sprite'])
+                for item in items])
+    return out_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile case folders into single-file case packs")
+    parser.add_argument("folders", nargs="+", help="Case folders to pack")
+    parser.add_argument("-o", "--output", help="Output file (only with a single folder)")
+    args = parser.parse_args()
+
+    if args.output and len(args.folders) > 1:
+        parser.error("--output can only be used with a single folder")
+
+    for folder in args.folders:
+        try:
+            out_path = pack_folder(folder, args.output)
+            print(f"{folder} -> {out_path} ({os.path.getsize(out_path)} bytes)")
+        except Exception as e:
+            print(f"Error packing {folder}: {str(e)}")
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
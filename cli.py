@@ -0,0 +1,320 @@
+import argparse
+import sys
+import time
+
+# Set before anything heavy is imported; --timings reports against it
+START = time.perf_counter()
+
+# Launch-to-first-output budget for commands that don't read the whole
+# inventory (balance, open, and sell by id) and for the fixed part of every
+# other command. bench.py --only cli checks it. Tk, PIL and numpy are never
+# imported unless the window is opened
+STARTUP_BUDGET_MS = 100
+STARTING_BALANCE = 1000.0
+DEFAULT_LIMIT = 50
+
+class Timings:
+    # Phase durations of one run, printed to stderr with --timings
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.phases = []
+        self.last = START
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    def report(self):
+        if not self.enabled:
+            return
+        total = (self.last - START) * 1000
+        phases = ", ".join(f"{phase} {seconds * 1000:.1f} ms" for phase, seconds in self.phases)
+        print(f"timings: {phases}; total {total:.1f} ms (startup budget {STARTUP_BUDGET_MS} ms)",
+              file=sys.stderr)
+
+def read_ledger(ledger_path):
+    # Records not yet in the state files, the rotated part first
+    from ledger import ROTATED_SUFFIX, read_records
+
+    return read_records(ledger_path + ROTATED_SUFFIX)[0] + read_records(ledger_path)[0]
+
+def read_balance(money_path, ledger_path):
+    # Balance as the app would see it: the newest one in the ledger, else
+    # money.txt. Nothing is written, unlike MoneyManager
+    records = read_ledger(ledger_path)
+    for record in reversed(records):
+        if 'b' in record:
+            return record['b']
+    try:
+        with open(money_path, 'r') as f:
+            return float(f.read())
+    except FileNotFoundError:
+        return STARTING_BALANCE
+
+def load_catalog(args):
+    # Only the headers are read; a case's items are parsed when something uses them
+    from core import CaseCatalog
+
+    catalog = CaseCatalog(args.cases, preload_items=False)
+    catalog.load()
+    return catalog
+
+def load_inventory(args, catalog):
+    # The checkpointed inventory plus whatever the ledger holds on top of
+    # it, for commands that only read; neither file is written
+    from core import Inventory
+
+    inventory = Inventory(args.inventory, catalog=catalog, read_only=True)
+    for record in read_ledger(args.ledger):
+        inventory.apply_changes(record.get('a', ()), record.get('d', ()))
+    return inventory
+
+def open_account(args, catalog, item_ids=None):
+    # None while the window or another command has the account open;
+    # nothing is written then. Changes only go to the ledger, the
+    # inventory is rewritten when the ledger gets long, not on every run.
+    # With item_ids (empty when only adding) the rest of the inventory is
+    # left on disk, unless the files need a full load
+    from core import Account, AccountLockedError
+
+    try:
+        account = Account(args.money, args.inventory, args.ledger, catalog, load=False,
+                          eager_checkpoints=False)
+    except AccountLockedError as e:
+        print(str(e))
+        return None
+    if item_ids is None or not account.load_partial(item_ids):
+        account.finish_loading()
+    return account
+
+def query_filter(args):
+    from core import item_filter
+
+    return item_filter(rarity=args.rarity, max_price=args.under, case=args.case,
+                       min_price=args.over, name=args.name)
+
+def has_filter(args):
+    return any(value is not None for value in (args.rarity, args.under, args.case, args.over, args.name))
+
+def format_item(item_id, item):
+    name = f"{item['item']} | {item['skin']}"
+    return f"{item_id:>8}  {name:<40} {item['rarity']:<10} ${item['price']:>10.2f}  {item.get('case') or ''}"
+
+# Commands
+
+def cmd_balance(args, timings):
+    balance = read_balance(args.money, args.ledger)
+    timings.mark("data")
+    print(f"Balance: ${balance:.2f}")
+    return 0
+
+def cmd_list(args, timings):
+    import heapq
+    from core import RARITY_WEIGHTS, item_fields
+
+    inventory = load_inventory(args, load_catalog(args))
+    timings.mark("data")
+
+    if has_filter(args):
+        predicate = query_filter(args)
+        entries = [(item_id, item_fields(item)) for item_id, item in inventory.items.items()
+                   if predicate(item)]
+    else:
+        entries = [(item_id, item_fields(item)) for item_id, item in inventory.items.items()]
+    total = len(entries)
+
+    # One pass over the matches; with a limit only that many are kept sorted
+    if args.sort == 'price':
+        key = lambda entry: (entry[1]['price'], entry[0])
+    elif args.sort == 'rarity':
+        ranks = {rarity: rank for rank, rarity in enumerate(RARITY_WEIGHTS)}
+        key = lambda entry: (ranks.get(entry[1]['rarity'].lower(), len(ranks)), entry[0])
+    else:
+        key = lambda entry: entry[0]
+    if args.limit and args.limit < total:
+        pick = heapq.nlargest if args.desc else heapq.nsmallest
+        entries = pick(args.limit, entries, key=key)
+    else:
+        entries.sort(key=key, reverse=args.desc)
+
+    for item_id, item in entries:
+        print(format_item(item_id, item))
+    print(f"Showing {len(entries)} of {total} matching items ({len(inventory)} in inventory)")
+    return 0
+
+def cmd_stats(args, timings):
+    from collections import defaultdict
+    from core import RARITY_WEIGHTS, item_fields
+
+    inventory = load_inventory(args, load_catalog(args))
+    balance = read_balance(args.money, args.ledger)
+    timings.mark("data")
+
+    by_rarity = defaultdict(lambda: [0, 0.0])
+    by_case = defaultdict(lambda: [0, 0.0])
+    for item in inventory.items.values():
+        item = item_fields(item)
+        for group in (by_rarity[item['rarity'].lower()], by_case[item.get('case') or "(no case)"]):
+            group[0] += 1
+            group[1] += item['price']
+
+    print(f"Balance: ${balance:.2f}")
+    print(f"Items: {len(inventory)} worth ${inventory.total_value:.2f}")
+    ranks = {rarity: rank for rank, rarity in enumerate(RARITY_WEIGHTS)}
+    print("By rarity:")
+    for rarity in sorted(by_rarity, key=lambda r: (ranks.get(r, len(ranks)), r)):
+        count, value = by_rarity[rarity]
+        print(f"  {rarity:<12} {count:>8}  ${value:>12.2f}")
+    print("By case:")
+    for case, (count, value) in sorted(by_case.items(), key=lambda entry: -entry[1][1]):
+        print(f"  {case:<30} {count:>8}  ${value:>12.2f}")
+    return 0
+
+def cmd_open(args, timings):
+    import random
+    from collections import Counter
+
+    if args.count <= 0:
+        print("Count must be positive")
+        return 1
+    catalog = load_catalog(args)
+    case = catalog.cases_by_name.get(args.case_name)
+    if case is None:
+        # Names are matched exactly first, then without regard to case
+        wanted = args.case_name.lower()
+        case = next((c for name, c in catalog.cases_by_name.items() if name.lower() == wanted), None)
+    if case is None:
+        print(f"Case {args.case_name} not found")
+        return 1
+    account = open_account(args, catalog, item_ids=())
+    timings.mark("data")
+    if account is None:
+        return 1
+
+    try:
+        cost = case.price * args.count
+        if account.money_manager.balance < cost:
+            print("Not enough funds!")
+            return 1
+        drops = case.sampler.draw_many(args.count, random.Random(args.seed))
+        # Payment and drops are committed together
+        with account.transaction():
+            account.money_manager.deduct_money(cost)
+            account.inventory.add_items(drops)
+        timings.mark("command")
+
+        print(f"Opened {args.count} x {case.name} for ${cost:.2f}")
+        counts = Counter((item['item'], item['skin'], item['rarity'], item['price']) for item in drops)
+        for (item_name, skin, rarity, price), count in sorted(counts.items(), key=lambda entry: -entry[0][3]):
+            print(f"  {count:>6} x {item_name} | {skin} ({rarity}, ${price:.2f})")
+        print(f"Total value: ${sum(item['price'] for item in drops):.2f}")
+        print(f"Balance: ${account.money_manager.balance:.2f}")
+    finally:
+        account.close()
+    return 0
+
+def cmd_sell(args, timings):
+    if not args.ids and not has_filter(args) and not args.all:
+        print("Nothing to sell: give item ids, a filter, or --all")
+        return 1
+    # Selling by id only reads those items; a filter alone or --all needs all of them
+    account = open_account(args, load_catalog(args), item_ids=args.ids or None)
+    timings.mark("data")
+    if account is None:
+        return 1
+
+    try:
+        inventory = account.inventory
+        if args.ids:
+            item_ids = [item_id for item_id in args.ids if item_id in inventory.items]
+            if has_filter(args):
+                predicate = query_filter(args)
+                item_ids = [item_id for item_id in item_ids if predicate(inventory.get(item_id))]
+        elif has_filter(args):
+            item_ids = inventory.find_where(query_filter(args))
+        else:
+            item_ids = list(inventory.items)
+
+        if args.dry_run:
+            total = sum(inventory.get(item_id)['price'] for item_id in item_ids)
+            print(f"Would sell {len(item_ids)} items for ${total:.2f}")
+            return 0
+        sold_items, total = account.sell_items(item_ids)
+        timings.mark("command")
+        print(f"Sold {len(sold_items)} items for ${total:.2f}")
+        print(f"Balance: ${account.money_manager.balance:.2f}")
+    finally:
+        account.close()
+    return 0
+
+def cmd_gui(args, timings):
+    # The window, with Tk and PIL, is only imported here
+    import main
+
+    timings.mark("imports")
+    main.run_app(["--profile"] if args.profile else [])
+    return 0
+
+def add_filter_arguments(parser):
+    parser.add_argument("--rarity", help="Only items of this rarity")
+    parser.add_argument("--case", help="Only items from this case")
+    parser.add_argument("--name", help="Only items whose 'item | skin' contains this text")
+    parser.add_argument("--under", type=float, help="Only items cheaper than this")
+    parser.add_argument("--over", type=float, help="Only items at least this expensive")
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="CasePy from the command line; without a command the window opens")
+    parser.add_argument("--cases", default="cases", help="Cases folder")
+    parser.add_argument("--money", default="money.txt", help="Balance file")
+    parser.add_argument("--inventory", default="inventory.txt", help="Inventory file")
+    parser.add_argument("--ledger", default="ledger.log", help="Ledger file")
+    parser.add_argument("--timings", action="store_true", help="Print startup and phase timings to stderr")
+    commands = parser.add_subparsers(dest="command")
+
+    balance_parser = commands.add_parser("balance", help="Show the balance")
+    balance_parser.set_defaults(run=cmd_balance)
+
+    list_parser = commands.add_parser("list", help="List inventory items")
+    add_filter_arguments(list_parser)
+    list_parser.add_argument("--sort", choices=["acquired", "price", "rarity"], default="acquired")
+    list_parser.add_argument("--desc", action="store_true", help="Reverse the order")
+    list_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="Items to show, 0 for all")
+    list_parser.set_defaults(run=cmd_list)
+
+    open_parser = commands.add_parser("open", help="Open a case N times")
+    open_parser.add_argument("case_name", help="Case name, as shown in the app")
+    open_parser.add_argument("count", type=int, nargs="?", default=1)
+    open_parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible draws")
+    open_parser.set_defaults(run=cmd_open)
+
+    sell_parser = commands.add_parser("sell", help="Sell items by id and/or filter")
+    sell_parser.add_argument("ids", type=int, nargs="*", help="Item ids, as shown by list")
+    add_filter_arguments(sell_parser)
+    sell_parser.add_argument("--all", action="store_true", help="Sell everything")
+    sell_parser.add_argument("--dry-run", action="store_true", help="Only show what would be sold")
+    sell_parser.set_defaults(run=cmd_sell)
+
+    stats_parser = commands.add_parser("stats", help="Balance and inventory value by rarity and case")
+    stats_parser.set_defaults(run=cmd_stats)
+
+    gui_parser = commands.add_parser("gui", help="Open the window (the default)")
+    gui_parser.add_argument("--profile", action="store_true", help="Turn on instrumentation")
+    gui_parser.set_defaults(run=cmd_gui)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command is None:
+        args.profile = False
+        args.run = cmd_gui
+    timings = Timings(args.timings)
+    timings.mark("startup")
+    try:
+        return args.run(args, timings)
+    finally:
+        timings.mark("output")
+        timings.report()
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,1793 @@
+import os
+import bisect
+import random
+import json
+import hashlib
+import itertools
+import mmap
+import zlib
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from collections import Counter
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+import casepack
+import instrument
+from ledger import Ledger
+
+# Cases, inventory, balance and the account tying them together. Nothing
+# here needs Tk or PIL, so command-line tools can import it and start fast;
+# the window lives in main.py
+
+# Default drop weights per rarity, can be overridden per case in case.txt
+RARITY_WEIGHTS = {
+    'common': 50,
+    'uncommon': 30,
+    'rare': 15,
+    'mythical': 4,
+    'legendary': 1
+}
+
+# Cached index of parsed cases, stored inside the cases folder
+CATALOG_MANIFEST = ".catalog.json"
+CATALOG_VERSION = 1
+CATALOG_WORKERS = 8
+
+class RaritySampler:
+    # Weighted item sampler using the alias method: the table is built once
+    # in O(n) and every draw afterwards costs O(1) whatever the weights are
+    def __init__(self, items, rarity_weights=None):
+        self.items = items
+        weights_table = dict(RARITY_WEIGHTS)
+        if rarity_weights:
+            weights_table.update({k.lower(): v for k, v in rarity_weights.items()})
+        
+        weights = []
+        for item in items:
+            weight = float(weights_table.get(item['rarity'].lower(), 1))
+            if weight < 0:
+                raise ValueError(f"Negative weight for rarity {item['rarity']}")
+            weights.append(weight)
+        
+        total = sum(weights)
+        self.probabilities = [w / total for w in weights] if total > 0 else [0.0] * len(weights)
+        # Checked on every draw, so worked out once here
+        self.drawable = total > 0
+        self.prob = [1.0] * len(items)
+        self.alias = list(range(len(items)))
+        if total <= 0:
+            return
+        
+        # Vose's alias table construction
+        n = len(items)
+        scaled = [p * n for p in self.probabilities]
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Leftovers are 1.0 up to rounding errors
+        for i in large + small:
+            self.prob[i] = 1.0
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def draw_index(self, rng=random):
+        if not self.drawable:
+            raise ValueError("No items available to draw")
+        i = int(rng.random() * len(self.items))
+        return i if rng.random() < self.prob[i] else self.alias[i]
+    
+    def draw(self, rng=random):
+        return self.items[self.draw_index(rng)]
+    
+    def draw_many(self, count, rng=random):
+        if count <= 0:
+            return []
+        if not self.drawable:
+            raise ValueError("No items available to draw")
+        
+        items, prob, alias = self.items, self.prob, self.alias
+        n = len(items)
+        rand = rng.random
+        result = []
+        append = result.append
+        for _ in range(count):
+            i = int(rand() * n)
+            append(items[i] if rand() < prob[i] else items[alias[i]])
+        return result
+
+class Case:
+    def __init__(self, name, price, image_path, items, rarity_weights=None):
+        self.name = name
+        self.price = price
+        self.image_path = image_path
+        self.rarity_weights = rarity_weights or {}
+        self.folder_path = None
+        self._items = None
+        self._sampler = None
+        # Items may still be loading in the background, they are only waited for when needed
+        self._pending_items = None
+        # Set when nothing loads them in the background: runs the load on first use
+        self.item_loader = None
+        # Hot reload may replace the items from another thread while they are resolved
+        self._items_lock = threading.Lock()
+        if isinstance(items, Future):
+            self._pending_items = items
+        else:
+            self.set_items(items)
+    
+    def set_items(self, items):
+        with self._items_lock:
+            self._items = items
+            self._pending_items = None
+            self._sampler = None
+    
+    def resolve_items(self):
+        with self._items_lock:
+            pending = self._pending_items
+        if pending is None:
+            return
+        
+        if self.item_loader is not None and not pending.done():
+            self.item_loader()
+        try:
+            items = pending.result()
+        except Exception as e:
+            print(f"Error loading items of {self.name}: {str(e)}")
+            items = []
+        with self._items_lock:
+            # Newer items set in the meantime win over the ones just loaded
+            if self._pending_items is pending:
+                self._items = items
+                self._pending_items = None
+                self._sampler = None
+    
+    @property
+    def items(self):
+        self.resolve_items()
+        return self._items
+    
+    @property
+    def sampler(self):
+        # Drop table is compiled once per case, on first use, not on every opening
+        if self._sampler is None:
+            self._sampler = RaritySampler(self.items, self.rarity_weights)
+        return self._sampler
+    
+    @classmethod
+    def load_from_folder(cls, folder_path):
+        try:
+            name, price, image_path, rarity_weights = cls.read_case_info(folder_path)
+            items = cls.read_items(folder_path, name)
+            case = cls(name, price, image_path, items, rarity_weights)
+            case.folder_path = folder_path
+            return case
+            
+        except Exception as e:
+            print(f"Error loading case from {folder_path}: {str(e)}")
+            return None
+    
+    @staticmethod
+    def read_pack_items(pack):
+        # Sprites stay inside the pack and are referenced by blob index
+        return [{
+            'case': pack.name,
+            'index': index,
+            'item': item_name,
+            'skin': skin_name,
+            'price': item_price,
+            'rarity': rarity,
+            'sprite': casepack.sprite_ref(pack.path, blob) if blob >= 0 else None
+        } for index, (item_name, skin_name, item_price, rarity, blob) in enumerate(pack.read_items())]
+    
+    @staticmethod
+    def read_case_info(folder_path):
+        # Load case information
+        case_txt = os.path.join(folder_path, "case.txt")
+        if not os.path.exists(case_txt):
+            raise FileNotFoundError(f"File {case_txt} not found")
+        
+        with open(case_txt, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+            if len(lines) < 2:
+                raise ValueError("Not enough data in case.txt")
+            
+            name = lines[0].strip()
+            price = float(lines[1].strip())
+            
+            # Optional per-rarity weight overrides, one "rarity=weight" per line
+            rarity_weights = {}
+            for line in lines[2:]:
+                if '=' in line:
+                    rarity, weight = line.split('=', 1)
+                    rarity_weights[rarity.strip().lower()] = float(weight.strip())
+        
+        # Load case image
+        image_path = os.path.join(folder_path, "case.png")
+        if not os.path.exists(image_path):
+            raise FileNotFoundError(f"Image {image_path} not found")
+        
+        return name, price, image_path, rarity_weights
+    
+    @staticmethod
+    def read_items(folder_path, case_name):
+        items_txt = os.path.join(folder_path, "items.txt")
+        if not os.path.exists(items_txt):
+            raise FileNotFoundError(f"File {items_txt} not found")
+        
+        # One directory listing instead of an exists() call per sprite
+        try:
+            sprite_files = set(os.listdir(os.path.join(folder_path, "sprites")))
+        except OSError:
+            sprite_files = set()
+        
+        with open(items_txt, 'r', encoding='utf-8') as f:
+            return Case.parse_items(folder_path, case_name, f, sprite_files)
+    
+    @staticmethod
+    def parse_items(folder_path, case_name, lines, sprite_files):
+        sprites_folder = os.path.join(folder_path, "sprites")
+        items = []
+        for line in lines:
+            if line.strip():
+                item_data = line.strip().split(';')
+                if len(item_data) < 4:
+                    continue
+                    
+                item_name = item_data[0]
+                skin_name = item_data[1]
+                item_price = float(item_data[2])
+                rarity = item_data[3]
+                sprite_file = f"{item_name}_{skin_name}.png"
+                sprite_path = os.path.join(sprites_folder, sprite_file) if sprite_file in sprite_files else None
+                
+                items.append({
+                    'case': case_name,
+                    'index': len(items),
+                    'item': item_name,
+                    'skin': skin_name,
+                    'price': item_price,
+                    'rarity': rarity,
+                    'sprite': sprite_path
+                })
+        return items
+
+class CaseCatalog:
+    # Loads the cases folder on a thread pool. Parsed cases are kept in a
+    # manifest file together with the mtimes of their files, so unchanged
+    # cases come back from one JSON read. For changed or new cases only
+    # case.txt is read up front; items are parsed in the background, or
+    # without preload_items only for the cases that are actually used
+    def __init__(self, cases_folder, manifest_path=None, workers=CATALOG_WORKERS, preload_items=True):
+        self.cases_folder = cases_folder
+        self.preload_items = preload_items
+        self.manifest_path = manifest_path or os.path.join(cases_folder, CATALOG_MANIFEST)
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.manifest_lock = threading.Lock()
+        # Lookups used to resolve compact inventory entries
+        self.cases_by_name = {}
+        self.item_keys = {}  # case name -> {(item, skin): item}, built on first lookup
+        # Loaded cases by folder or pack path, and what the manifest holds for them
+        self.cases_by_path = {}
+        self.manifest_entries = {}
+    
+    def list_cases(self):
+        return list(self.cases_by_path.values())
+    
+    def add_case(self, case):
+        # The first case with a given name wins, like the first folder listed
+        self.cases_by_path[case.folder_path] = case
+        self.cases_by_name.setdefault(case.name, case)
+        self.item_keys.pop(case.name, None)
+    
+    def remove_case(self, case):
+        self.cases_by_path.pop(case.folder_path, None)
+        self.item_keys.pop(case.name, None)
+        if self.cases_by_name.get(case.name) is case:
+            del self.cases_by_name[case.name]
+            # Another loaded case with the same name takes over
+            for other in self.cases_by_path.values():
+                if other.name == case.name:
+                    self.cases_by_name[case.name] = other
+                    break
+    
+    def find_item(self, case_name, item_name, skin_name):
+        # Items are looked up by name, so editing items.txt can't turn an
+        # owned item into another one; the first line with a name wins
+        keys = self.item_keys.get(case_name)
+        if keys is None:
+            case = self.cases_by_name.get(case_name)
+            if case is None:
+                return None
+            keys = {}
+            for item in case.items:
+                keys.setdefault((item['item'], item['skin']), item)
+            self.item_keys[case_name] = keys
+        return keys.get((item_name, skin_name))
+    
+    def item_at(self, case_name, index):
+        # Only for entries written before items were stored by name
+        case = self.cases_by_name.get(case_name)
+        if case is None:
+            return None
+        items = case.items
+        return items[index] if 0 <= index < len(items) else None
+    
+    def folder_signature(self, folder_path):
+        signature = []
+        for name in ("", "case.txt", "items.txt", "case.png", "sprites"):
+            try:
+                st = os.stat(os.path.join(folder_path, name))
+                signature.append([st.st_mtime_ns, st.st_size])
+            except OSError:
+                signature.append(None)
+        return signature
+    
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == CATALOG_VERSION:
+                return manifest['cases']
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Error reading case manifest: {str(e)}")
+        return {}
+    
+    def load(self):
+        if not os.path.exists(self.cases_folder):
+            return []
+        
+        # The manifest holds every case's items; when those are only parsed
+        # on use, reading the case.txt headers is quicker than parsing it
+        manifest = self.read_manifest() if self.preload_items else {}
+        folders = []
+        for entry in os.scandir(self.cases_folder):
+            if entry.is_dir():
+                folders.append(entry.path)
+            elif (entry.name.endswith(casepack.PACK_EXTENSION)
+                  and not os.path.isdir(entry.path[:-len(casepack.PACK_EXTENSION)])):
+                # A pack next to its source folder is skipped, the folder wins
+                folders.append(entry.path)
+        # Without items a case is one small read, less than handing it to a
+        # worker costs, so lazy catalogs read their headers right here
+        load_map = self.pool.map if self.preload_items else map
+        results = load_map(lambda folder: self.load_case(folder, manifest), folders)
+        
+        cases = []
+        entries = {}
+        loaders = []
+        for folder_path, (case, signature, loader) in zip(folders, results):
+            if case is not None:
+                cases.append(case)
+                self.add_case(case)
+                loaders.append(loader)
+                # Packs are already compiled and stay out of the manifest
+                if signature is not None:
+                    entries[os.path.basename(folder_path)] = (case, signature)
+        
+        # Items are only parsed once every header is in, so the background
+        # work doesn't hold up the cases the window needs first
+        for case, (future, loader) in zip(cases, loaders):
+            if self.preload_items:
+                self.pool.submit(self.run_loader, future, loader)
+            else:
+                case.item_loader = lambda future=future, loader=loader: self.run_loader(future, loader)
+        
+        # Write the manifest once every case has its items, unless nothing
+        # changed. It needs every case parsed, so it is left to full loads
+        self.manifest_entries = entries
+        unchanged = entries.keys() == manifest.keys() and all(
+            manifest[folder]['signature'] == signature for folder, (_, signature) in entries.items())
+        if not unchanged and self.preload_items:
+            threading.Thread(target=self.save_manifest, args=(dict(entries),), daemon=True).start()
+        return cases
+    
+    def reload(self, names):
+        # Reparses only the given entries of the cases folder (folder or
+        # pack file names). Returns (added, removed) cases; a changed case
+        # shows up in both
+        added = []
+        removed = []
+        bases = {name[:-len(casepack.PACK_EXTENSION)] if name.endswith(casepack.PACK_EXTENSION) else name
+                 for name in names}
+        for base in bases:
+            folder_path = os.path.join(self.cases_folder, base)
+            pack_path = folder_path + casepack.PACK_EXTENSION
+            for path in (folder_path, pack_path):
+                case = self.cases_by_path.get(path)
+                if case is not None:
+                    self.remove_case(case)
+                    removed.append(case)
+            self.manifest_entries.pop(base, None)
+            casepack.forget_pack(pack_path)
+            
+            # Same precedence as load(): the folder wins over its pack
+            if os.path.isdir(folder_path):
+                path = folder_path
+            elif os.path.isfile(pack_path):
+                path = pack_path
+            else:
+                continue
+            case, signature, loader = self.load_case(path, {})
+            if case is None:
+                continue
+            self.add_case(case)
+            added.append(case)
+            self.pool.submit(self.run_loader, *loader)
+            if signature is not None:
+                self.manifest_entries[base] = (case, signature)
+        
+        if added or removed:
+            threading.Thread(target=self.save_manifest, args=(dict(self.manifest_entries),),
+                             daemon=True).start()
+        return added, removed
+    
+    def load_case(self, folder_path, manifest):
+        if folder_path.endswith(casepack.PACK_EXTENSION):
+            return self.load_pack(folder_path)
+        
+        signature = self.folder_signature(folder_path)
+        entry = manifest.get(os.path.basename(folder_path))
+        items = Future()
+        if entry is not None and entry['signature'] == signature:
+            # Items are kept as compact text in the manifest
+            loader = lambda: Case.parse_items(folder_path, entry['name'],
+                                              entry['items'].split('\n'), set(entry['sprites']))
+            case = Case(entry['name'], entry['price'], entry['image'], items, entry['weights'])
+        else:
+            try:
+                name, price, image_path, rarity_weights = Case.read_case_info(folder_path)
+            except Exception as e:
+                print(f"Error loading case from {folder_path}: {str(e)}")
+                return None, signature, None
+            loader = lambda: Case.read_items(folder_path, name)
+            case = Case(name, price, image_path, items, rarity_weights)
+        case.folder_path = folder_path
+        return case, signature, (items, loader)
+    
+    def load_pack(self, pack_path):
+        try:
+            pack = casepack.open_pack(pack_path)
+        except Exception as e:
+            print(f"Error loading case from {pack_path}: {str(e)}")
+            return None, None, None
+        items = Future()
+        case = Case(pack.name, pack.price, casepack.sprite_ref(pack_path, 0), items, pack.rarity_weights)
+        case.folder_path = pack_path
+        return case, None, (items, lambda: Case.read_pack_items(pack))
+    
+    def run_loader(self, future, loader):
+        try:
+            future.set_result(loader())
+        except Exception as e:
+            future.set_exception(e)
+    
+    def save_manifest(self, entries):
+        with self.manifest_lock:
+            self.write_manifest(entries)
+    
+    def write_manifest(self, entries):
+        try:
+            manifest = {
+                'version': CATALOG_VERSION,
+                'cases': {
+                    folder: {
+                        'signature': signature,
+                        'name': case.name,
+                        'price': case.price,
+                        'image': case.image_path,
+                        'weights': case.rarity_weights,
+                        'items': '\n'.join(f"{item['item']};{item['skin']};{item['price']!r};{item['rarity']}"
+                                           for item in case.items),
+                        'sprites': [os.path.basename(item['sprite']) for item in case.items if item['sprite']]
+                    }
+                    for folder, (case, signature) in entries.items()
+                }
+            }
+            temp_path = self.manifest_path + ".tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Error saving case manifest: {str(e)}")
+
+class CaseIndex:
+    # In-memory search and sort over the case list. Every order is sorted
+    # once up front, a query is then a single scan over lowercase names
+    def __init__(self, cases):
+        by_name = sorted(((case.name.lower(), case) for case in cases), key=lambda entry: entry[0])
+        self.orders = {
+            'name': by_name,
+            'price': sorted(by_name, key=lambda entry: entry[1].price),
+            'price_desc': sorted(by_name, key=lambda entry: -entry[1].price)
+        }
+    
+    def __len__(self):
+        return len(self.orders['name'])
+    
+    def search(self, query="", order='name'):
+        query = query.strip().lower()
+        return [case for name, case in self.orders[order] if query in name]
+
+def item_filter(rarity=None, max_price=None, case=None, min_price=None, name=None):
+    # Builds a predicate over inventory items; None means "any" for every field.
+    # max_price is exclusive ("everything under $X"), min_price inclusive
+    rarity = rarity.lower() if rarity else None
+    name = name.lower() if name else None
+    
+    def predicate(item):
+        item = item_fields(item)
+        if rarity is not None and item['rarity'].lower() != rarity:
+            return False
+        if case is not None and item.get('case') != case:
+            return False
+        price = item['price']
+        if max_price is not None and price >= max_price:
+            return False
+        if min_price is not None and price < min_price:
+            return False
+        if name is not None and name not in f"{item['item']} | {item['skin']}".lower():
+            return False
+        return True
+    return predicate
+
+class InventoryItem:
+    # Compact inventory entry: a reference to an item of a loaded case, by
+    # case, item and skin name, plus when it was acquired. Display fields
+    # are looked up in the catalog, so rarity, price and sprite paths aren't
+    # copied into every entry
+    __slots__ = ('case', 'item', 'skin', 'acquired', 'catalog')
+    
+    def __init__(self, case, item, skin, acquired, catalog):
+        self.case = case
+        self.item = item
+        self.skin = skin
+        self.acquired = acquired
+        self.catalog = catalog
+    
+    def resolve(self):
+        item = self.catalog.find_item(self.case, self.item, self.skin)
+        if item is None:
+            # The case was removed or the item taken out of it since it dropped
+            item = {'case': self.case, 'item': self.item, 'skin': self.skin,
+                    'price': 0.0, 'rarity': 'common', 'sprite': None}
+        return item
+    
+    def __getitem__(self, key):
+        if key == 'acquired':
+            return self.acquired
+        return self.resolve()[key]
+    
+    def get(self, key, default=None):
+        if key == 'acquired':
+            return self.acquired
+        return self.resolve().get(key, default)
+    
+    def encode(self):
+        return [self.case, self.item, self.skin, self.acquired]
+    
+    def to_dict(self):
+        return dict(self.resolve(), acquired=self.acquired)
+
+class SortedIds:
+    # Sorted list of item ids kept in chunks of a few hundred entries, so an
+    # insert or delete only shifts one chunk instead of the whole list.
+    # key orders the ids (e.g. by price); without it they are sorted as-is
+    CHUNK_SIZE = 512
+    
+    def __init__(self, ids=(), key=None):
+        # ids must already be in order
+        ids = list(ids)
+        self.key = key
+        self.chunks = [ids[i:i + self.CHUNK_SIZE] for i in range(0, len(ids), self.CHUNK_SIZE)]
+        self.maxes = [self.key_of(chunk[-1]) for chunk in self.chunks]
+        self.length = len(ids)
+        self.offsets = None  # position of each chunk's first id, rebuilt after changes
+    
+    def key_of(self, item_id):
+        return self.key(item_id) if self.key else item_id
+    
+    def __len__(self):
+        return self.length
+    
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+    
+    def __reversed__(self):
+        for chunk in reversed(self.chunks):
+            yield from reversed(chunk)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("SortedIds index out of range")
+        if self.offsets is None:
+            self.offsets = [0]
+            for chunk in self.chunks[:-1]:
+                self.offsets.append(self.offsets[-1] + len(chunk))
+        pos = bisect.bisect_right(self.offsets, index) - 1
+        return self.chunks[pos][index - self.offsets[pos]]
+    
+    def add(self, item_id):
+        key = self.key_of(item_id)
+        if not self.chunks:
+            self.chunks.append([item_id])
+            self.maxes.append(key)
+        else:
+            pos = bisect.bisect_left(self.maxes, key)
+            if pos == len(self.chunks):
+                # Past the end, the common case for new ids
+                pos -= 1
+                self.chunks[pos].append(item_id)
+                self.maxes[pos] = key
+            else:
+                bisect.insort(self.chunks[pos], item_id, key=self.key)
+            chunk = self.chunks[pos]
+            if len(chunk) > 2 * self.CHUNK_SIZE:
+                self.chunks[pos:pos + 1] = [chunk[:self.CHUNK_SIZE], chunk[self.CHUNK_SIZE:]]
+                self.maxes[pos:pos + 1] = [self.key_of(chunk[self.CHUNK_SIZE - 1]), self.maxes[pos]]
+        self.length += 1
+        self.offsets = None
+    
+    def remove(self, item_id):
+        key = self.key_of(item_id)
+        pos = bisect.bisect_left(self.maxes, key)
+        chunk = self.chunks[pos]
+        index = bisect.bisect_left(chunk, key, key=self.key)
+        del chunk[index]
+        self.length -= 1
+        self.offsets = None
+        if not chunk:
+            del self.chunks[pos]
+            del self.maxes[pos]
+        elif index == len(chunk):
+            self.maxes[pos] = self.key_of(chunk[-1])
+
+class IdView:
+    # Read-only sequence of item ids over one or more sorted lists, walked
+    # in order (or backwards) without copying them. VirtualList only needs
+    # len() and [i], so even the full inventory is shown without a list
+    def __init__(self, lists, descending=False):
+        self.lists = lists
+        self.descending = descending
+    
+    def __len__(self):
+        return sum(len(ids) for ids in self.lists)
+    
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        lists = reversed(self.lists) if self.descending else self.lists
+        for ids in lists:
+            if index < len(ids):
+                return ids[-1 - index] if self.descending else ids[index]
+            index -= len(ids)
+        raise IndexError("IdView index out of range")
+    
+    def __iter__(self):
+        if self.descending:
+            for ids in reversed(self.lists):
+                yield from reversed(ids)
+        else:
+            for ids in self.lists:
+                yield from ids
+
+class InventoryIndex:
+    # Secondary indexes over an inventory, updated per added or removed item:
+    # ids in acquisition order (ids only grow) and ids ordered by (price, id),
+    # for everything, per rarity, per case and per (rarity, case).
+    # A query picks the list that already has the requested order, so
+    # nothing is sorted after the initial build
+    def __init__(self, items=None):
+        self.fields = {}  # id -> (price, rarity, case, item fields)
+        self.ids = {}  # group -> SortedIds by id; groups: None, rarity, case, (rarity, case)
+        self.by_price = {}  # group -> SortedIds by (price, id)
+        self.rarities = Counter()
+        if items:
+            for item_id, item in items.items():
+                item = item_fields(item)
+                self.fields[item_id] = (item['price'], item['rarity'].lower(), item.get('case'), item)
+            self.rarities.update(fields[1] for fields in self.fields.values())
+            # Sort everything once and deal the ids out to the groups in
+            # that order, instead of sorting every group on its own
+            for index, key in ((self.ids, None), (self.by_price, self.price_key)):
+                ids = sorted(self.fields, key=key)
+                rarities, cases, pairs = {}, {}, {}
+                for item_id in ids:
+                    _, rarity, case, _ = self.fields[item_id]
+                    rarities.setdefault(rarity, []).append(item_id)
+                    cases.setdefault(case, []).append(item_id)
+                    pairs.setdefault((rarity, case), []).append(item_id)
+                index[None] = SortedIds(ids, key)
+                for rarity, group_ids in rarities.items():
+                    index[('rarity', rarity)] = SortedIds(group_ids, key)
+                for case, group_ids in cases.items():
+                    index[('case', case)] = SortedIds(group_ids, key)
+                for (rarity, case), group_ids in pairs.items():
+                    index[('pair', rarity, case)] = SortedIds(group_ids, key)
+    
+    @staticmethod
+    def groups(fields):
+        _, rarity, case, _ = fields
+        return (None, ('rarity', rarity), ('case', case), ('pair', rarity, case))
+    
+    def price_key(self, item_id):
+        return (self.fields[item_id][0], item_id)
+    
+    def add(self, item_id, item):
+        fields = self.fields[item_id] = (item['price'], item['rarity'].lower(), item.get('case'), item)
+        self.rarities[fields[1]] += 1
+        for group in self.groups(fields):
+            ids = self.ids.get(group)
+            if ids is None:
+                ids = self.ids[group] = SortedIds()
+                self.by_price[group] = SortedIds(key=self.price_key)
+            ids.add(item_id)
+            self.by_price[group].add(item_id)
+    
+    def remove(self, item_id):
+        fields = self.fields.get(item_id)
+        if fields is None:
+            return
+        self.rarities[fields[1]] -= 1
+        for group in self.groups(fields):
+            self.ids[group].remove(item_id)
+            self.by_price[group].remove(item_id)
+        del self.fields[item_id]
+    
+    def rarity_order(self):
+        # Commonest first, by the default weights; unknown rarities go last
+        ranks = {rarity: rank for rank, rarity in enumerate(RARITY_WEIGHTS)}
+        return sorted((rarity for rarity, count in self.rarities.items() if count),
+                      key=lambda rarity: (ranks.get(rarity, len(ranks)), rarity))
+    
+    def query(self, sort='acquired', descending=False, rarity=None, case=None, name=None):
+        # Sequence of ids, sorted by 'acquired', 'price' or 'rarity'
+        rarity = rarity.lower() if rarity else None
+        index = self.by_price if sort == 'price' else self.ids
+        empty = SortedIds()
+        if sort == 'rarity' and rarity is None:
+            # Rarity buckets one after another, each in acquisition order
+            if case is None:
+                lists = [self.ids.get(('rarity', r), empty) for r in self.rarity_order()]
+            else:
+                lists = [self.ids.get(('pair', r, case), empty) for r in self.rarity_order()]
+        elif rarity is not None and case is not None:
+            lists = [index.get(('pair', rarity, case), empty)]
+        elif rarity is not None:
+            lists = [index.get(('rarity', rarity), empty)]
+        elif case is not None:
+            lists = [index.get(('case', case), empty)]
+        else:
+            lists = [index.get(None, empty)]
+        
+        view = IdView(lists, descending)
+        if name:
+            # Substring search has to look at every candidate; names are
+            # lowered once per distinct item, not once per owned copy
+            name = name.lower()
+            names = {}
+            matches = []
+            for item_id in view:
+                item = self.fields[item_id][3]
+                text = names.get(id(item))
+                if text is None:
+                    text = names[id(item)] = f"{item['item']} | {item['skin']}".lower()
+                if name in text:
+                    matches.append(item_id)
+            view = matches
+        return view
+
+def item_fields(item):
+    # Plain dict of an item's fields; references are looked up once instead of per field
+    return item.resolve() if isinstance(item, InventoryItem) else item
+
+# Header line that marks an inventory file written in journal format, then
+# the format version and the next free item id. v1 files referred to items
+# by their line in items.txt, v2 files had no end record; both are
+# rewritten when loaded
+JOURNAL_HEADER = "#casepy-journal"
+JOURNAL_VERSION = "v3"
+# Compact the journal once it holds this many dead records (and more dead than live ones)
+COMPACT_MIN_RECORDS = 1000
+# Records verified and handed over together while loading; the first block
+# is on screen before the rest of the file is read
+LOAD_BLOCK_RECORDS = 1000
+# Line closing each block of a plain inventory file, followed by its MD5
+BLOCK_CHECKSUM = "#md5 "
+
+class Inventory:
+    def __init__(self, file_path, journal=True, ledger=None, catalog=None, load=True, read_only=False):
+        self.file_path = file_path
+        self.backup_path = file_path + ".bak"
+        self.temp_path = file_path + ".tmp"
+        # Journal mode appends one record per change instead of rewriting the file
+        self.journal = journal
+        # With a ledger, changes go to the shared log and the file is only
+        # rewritten at checkpoints
+        self.ledger = ledger
+        # With a catalog, items are stored as compact InventoryItem references
+        self.catalog = catalog
+        # Read-only inventories are loaded as they are: an old-format or
+        # damaged file is neither converted nor restored, nothing is written
+        self.read_only = read_only
+        # Numbers used in the journal's case and key tables, by case name and (case, item, skin)
+        self.case_numbers = {}
+        self.key_numbers = {}
+        # Items keyed by stable id; dicts keep insertion order and give O(1) add/remove
+        self.items = {}
+        self.next_id = 1
+        self.dead_records = 0
+        # Records of the last load that failed their checksum, not counting a torn last one
+        self.skipped_records = 0
+        self._journal_file = None
+        # Running aggregates, updated on every add/remove
+        self.total_value = 0.0
+        self.rarity_counts = Counter()
+        self.case_counts = Counter()
+        self._index = None
+        # Callbacks told about every change as (added, removed) lists of (id, item)
+        self.listeners = []
+        # Without load, the caller runs load() or steps through load_blocks()
+        if load:
+            self.load()
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def get(self, item_id):
+        return self.items.get(item_id)
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def notify_listeners(self, added=(), removed=()):
+        for callback in self.listeners:
+            callback(added, removed)
+    
+    def reset_aggregates(self):
+        fields = [item_fields(item) for item in self.items.values()]
+        self.total_value = sum(item['price'] for item in fields)
+        self.rarity_counts = Counter(item['rarity'].lower() for item in fields)
+        self.case_counts = Counter(item.get('case') for item in fields)
+        # Rebuilt from the new state the next time it is used
+        self._index = None
+    
+    @property
+    def index(self):
+        # Sorted and bucketed views for browsing; only built once something
+        # asks for them, then kept up to date on every add and remove
+        if self._index is None:
+            self._index = InventoryIndex(self.items)
+        return self._index
+    
+    def track_added(self, item_id, item):
+        item = item_fields(item)
+        self.total_value += item['price']
+        self.rarity_counts[item['rarity'].lower()] += 1
+        self.case_counts[item.get('case')] += 1
+        if self._index is not None:
+            self._index.add(item_id, item)
+    
+    def track_block(self, added):
+        # track_added for a whole block of (id, item), counted in bulk
+        fields = [item_fields(item) for _, item in added]
+        self.total_value += sum(item['price'] for item in fields)
+        self.rarity_counts.update(item['rarity'].lower() for item in fields)
+        self.case_counts.update(item.get('case') for item in fields)
+        if self._index is not None:
+            for (item_id, _), item in zip(added, fields):
+                self._index.add(item_id, item)
+    
+    def track_removed(self, item_id, item):
+        item = item_fields(item)
+        self.total_value -= item['price']
+        self.rarity_counts[item['rarity'].lower()] -= 1
+        self.case_counts[item.get('case')] -= 1
+        if self._index is not None:
+            self._index.remove(item_id)
+        if not self.items:
+            # Avoid float drift piling up once everything is sold
+            self.total_value = 0.0
+    
+    def calculate_checksum(self, data):
+        return hashlib.md5(data.encode('utf-8')).hexdigest()
+    
+    def record_checksum(self, payload):
+        return f"{zlib.crc32(payload.encode('utf-8')):08x}"
+    
+    def make_record(self, payload):
+        return f"{self.record_checksum(payload)} {payload}\n"
+    
+    def load(self):
+        for _ in self.load_blocks():
+            pass
+    
+    def load_blocks(self):
+        # Loads the file one verified block at a time and yields after each,
+        # so a caller can show the first items before the rest is read.
+        # Listeners are told about every block as it is added
+        self.discard_items()
+        self.skipped_records = 0
+        
+        source = self.file_path
+        if not os.path.exists(source):
+            # A crash in the middle of a compaction leaves only the backup behind
+            if not os.path.exists(self.backup_path):
+                return
+            source = self.backup_path
+        
+        try:
+            try:
+                version, damaged = yield from self.load_file(source)
+                keep_damaged = self.skipped_records > 0
+            except ValueError:
+                # A block of a plain file failed to verify. Every save of a
+                # plain file rewrites it, so the backup is one save older
+                self.discard_items()
+                loaded = False
+                if source != self.backup_path and os.path.exists(self.backup_path):
+                    try:
+                        version, _ = yield from self.load_file(self.backup_path)
+                        loaded = True
+                    except ValueError:
+                        self.discard_items()
+                if not loaded:
+                    # No usable backup, keep every block that still verifies
+                    version, _ = yield from self.load_file(source, strict=False)
+                damaged = keep_damaged = True
+            
+            if self.read_only:
+                return
+            if keep_damaged:
+                self.keep_damaged_file()
+            # Restore main file or convert it to the configured format
+            if damaged or source != self.file_path or version != (JOURNAL_VERSION if self.journal else None):
+                self.save()
+        except Exception as e:
+            print(f"Error loading inventory: {str(e)}")
+            self.discard_items()
+    
+    def keep_damaged_file(self):
+        # The damaged file is moved aside under its own name before the
+        # rewrite, so neither it nor the older backup gets overwritten
+        if not os.path.exists(self.file_path):
+            return
+        path = self.file_path + ".damaged"
+        number = 1
+        while os.path.exists(path):
+            path = f"{self.file_path}.damaged{number}"
+            number += 1
+        os.replace(self.file_path, path)
+        print(f"Inventory file was damaged, {self.skipped_records} records skipped; "
+              f"the damaged file is kept as {path}")
+    
+    def discard_items(self):
+        removed = list(self.items.items())
+        self.items = {}
+        self.next_id = 1
+        self.dead_records = 0
+        self.reset_aggregates()
+        if self.listeners and removed:
+            self.notify_listeners(removed=removed)
+    
+    def load_file(self, path, strict=True):
+        # Adds the blocks of one file as they are read, yielding after each;
+        # returns (journal version or None for a plain file, damaged)
+        blocks = self.read_file(path, strict)
+        while True:
+            try:
+                added, removed = next(blocks)
+            except StopIteration as done:
+                return done.value
+            
+            if self.catalog is not None:
+                # Full item copies from older files become compact references
+                added = [(item_id, self.make_entry(item) if isinstance(item, dict) else item)
+                         for item_id, item in added]
+            self.items.update(added)
+            self.track_block(added)
+            removed_items = []
+            for item_id in removed:
+                item = self.items.pop(item_id, None)
+                if item is not None:
+                    self.dead_records += 2
+                    self.track_removed(item_id, item)
+                    removed_items.append((item_id, item))
+            if self.listeners:
+                self.notify_listeners(added, removed_items)
+            yield len(self.items)
+    
+    def read_file(self, path, strict=True):
+        # Generator of verified blocks as (added [(id, item)], removed [id]);
+        # returns (journal version or None, damaged). strict only applies to
+        # plain files, a journal always skips just the records that fail their CRC
+        with open(path, 'r', encoding='utf-8') as f:
+            first_line = f.readline()
+            if first_line.startswith(JOURNAL_HEADER):
+                header = first_line.split()
+                if len(header) > 2:
+                    self.next_id = max(self.next_id, int(header[2]))
+                damaged = yield from self.replay_journal(f)
+                return header[1], damaged
+            
+            damaged = yield from self.read_lines(itertools.chain([first_line], f), path, strict)
+            return None, damaged
+    
+    def read_lines(self, lines, path, strict=True):
+        # JSON lines, closed every LOAD_BLOCK_RECORDS lines by a
+        # "#md5 <checksum of the block>" line; lines are only parsed once
+        # their block verifies. Older files end with one MD5 of all lines
+        # instead, so their items are handed over after the whole file has
+        # been checked
+        block = []
+        has_blocks = False
+        damaged = False
+        # The old checksum covers everything before the last newline, which
+        # is held back until the next chunk is hashed
+        file_hash = hashlib.md5()
+        newline = ''
+        old_entries = []
+        last_line = None
+        for line in lines:
+            if line.startswith(BLOCK_CHECKSUM):
+                has_blocks = True
+                if self.calculate_checksum(''.join(block)) == line[len(BLOCK_CHECKSUM):].strip():
+                    yield self.number_items(block), ()
+                elif strict:
+                    raise ValueError(f"Invalid checksum in {path}")
+                else:
+                    damaged = True
+                block = []
+                continue
+            if not line.endswith('\n'):
+                # Only the last line has no newline: the old checksum
+                last_line = line
+                break
+            block.append(line)
+            if len(block) > LOAD_BLOCK_RECORDS and not has_blocks:
+                # Longer than any block, so an old file: hash and parse as it streams
+                file_hash.update((newline + ''.join(block)[:-1]).encode('utf-8'))
+                newline = '\n'
+                old_entries.extend(self.number_items(block))
+                block = []
+        
+        if has_blocks:
+            if block or last_line:
+                # Lines after the last checksum, from a write that didn't finish
+                if strict:
+                    raise ValueError(f"Incomplete block in {path}")
+                damaged = True
+            return damaged
+        
+        if block:
+            file_hash.update((newline + ''.join(block)[:-1]).encode('utf-8'))
+        if last_line and file_hash.hexdigest() != last_line.strip():
+            raise ValueError(f"Invalid checksum in {path}")
+        old_entries.extend(self.number_items(block))
+        if old_entries:
+            yield old_entries, ()
+        return damaged
+    
+    def number_items(self, lines):
+        # A block of lines is decoded as one JSON array, one call instead of one per line
+        items = json.loads(f"[{','.join(line for line in lines if line.strip())}]")
+        first_id = self.next_id
+        self.next_id += len(items)
+        return list(zip(range(first_id, self.next_id), items))
+    
+    def replay_journal(self, f):
+        # Every record carries its own CRC, so records are verified as they
+        # are read and handed over LOAD_BLOCK_RECORDS at a time. A record
+        # that fails is skipped on its own; the rest of the file still counts
+        added = []
+        removed = []
+        keys = {}
+        case_names = {}
+        self.case_numbers = {}
+        self.key_numbers = {}
+        damaged = False
+        records = 0
+        for line in f:
+            checksum, _, payload = line.rstrip('\n').partition(' ')
+            if not line.endswith('\n'):
+                # A torn last record is expected after a crash
+                damaged = True
+                continue
+            try:
+                if checksum != self.record_checksum(payload):
+                    raise ValueError("bad checksum")
+                op, _, rest = payload.partition(' ')
+                if op == 'R':
+                    fields = rest.split(' ')
+                    item_id = int(fields[0])
+                    if len(fields) == 3:
+                        case, item, skin = keys[fields[1]]
+                        entry = InventoryItem(case, item, skin, int(fields[2]), self.catalog)
+                    else:
+                        # v1: "R id case index acquired"
+                        entry = self.decode_item([case_names[fields[1]], int(fields[2]), int(fields[3])])
+                    added.append((item_id, entry))
+                elif op == 'K':
+                    key_number, case_number, names = rest.split(' ', 2)
+                    item, _, skin = names.partition(';')
+                    keys[key_number] = (case_names[case_number], item, skin)
+                    self.key_numbers[keys[key_number]] = key_number
+                    continue
+                elif op == 'C':
+                    case_number, _, name = rest.partition(' ')
+                    case_names[case_number] = json.loads(name)
+                    self.case_numbers[case_names[case_number]] = case_number
+                    continue
+                elif op == 'A':
+                    item_id, _, data = rest.partition(' ')
+                    item_id = int(item_id)
+                    added.append((item_id, json.loads(data)))
+                elif op == 'D':
+                    # Ids are never reused, so removals can be applied after the
+                    # additions of the same block
+                    item_id = int(rest)
+                    removed.append(item_id)
+                elif op == 'E':
+                    # Closes a compaction; only appended records follow it
+                    self.next_id = max(self.next_id, int(rest))
+                    continue
+                else:
+                    raise ValueError(f"unknown record {op}")
+            except (ValueError, KeyError):
+                # A record in the middle went bad, or refers to one that did
+                damaged = True
+                self.skipped_records += 1
+                continue
+            self.next_id = max(self.next_id, item_id + 1)
+            records += 1
+            if records >= LOAD_BLOCK_RECORDS:
+                yield added, removed
+                added = []
+                removed = []
+                records = 0
+        if added or removed:
+            yield added, removed
+        return damaged
+    
+    def open_compacted(self):
+        # The file mapped into memory with the span of its records, when it
+        # was written by compact() and nothing was appended since: one
+        # header, records in id order, then the end record. Returns
+        # (mmap, start, end, next id), or None when only a full load can tell
+        try:
+            f = open(self.file_path, 'rb')
+        except FileNotFoundError:
+            return None
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return None
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header = data.readline().split()
+        if len(header) < 3 or header[0] != JOURNAL_HEADER.encode() or header[1] != JOURNAL_VERSION.encode():
+            data.close()
+            return None
+        end = data.rfind(b'\n', 0, len(data) - 1) + 1
+        record = self.parse_record(data[end:])
+        if record is None or record[0] != 'E' or not record[1].isdigit():
+            data.close()
+            return None
+        return data, data.tell(), end, int(record[1])
+    
+    def parse_record(self, line):
+        # (op, rest) of one journal record, or None when it is damaged
+        try:
+            checksum, _, payload = line.decode('utf-8').partition(' ')
+        except UnicodeDecodeError:
+            return None
+        if not payload.endswith('\n') or checksum != self.record_checksum(payload[:-1]):
+            return None
+        op, _, rest = payload[:-1].partition(' ')
+        return op, rest
+    
+    def peek_next_id(self):
+        # Next free id without loading anything, from the end record of a
+        # compacted file; 1 when there is no inventory yet, None when it
+        # takes a full load to tell
+        if not os.path.exists(self.file_path) and not os.path.exists(self.backup_path):
+            return 1
+        compacted = self.open_compacted()
+        if compacted is None:
+            return None
+        data, _, _, next_id = compacted
+        data.close()
+        return next_id
+    
+    def peek_items(self, item_ids):
+        # {id: item} for those of item_ids in the file, without loading the
+        # rest: a compacted file holds its records in id order, so each one
+        # is found by bisecting it. None when it takes a full load
+        if not os.path.exists(self.file_path) and not os.path.exists(self.backup_path):
+            return {}
+        compacted = self.open_compacted()
+        if compacted is None:
+            return None
+        data, start, end, _ = compacted
+        definitions = {}
+        try:
+            found = {}
+            for item_id in set(item_ids):
+                position = self.find_record(data, start, end, item_id)
+                if position is None:
+                    continue
+                record = self.parse_record(data[position:data.find(b'\n', position) + 1])
+                if record is None:
+                    return None
+                op, rest = record
+                if op == 'A':
+                    found[item_id] = json.loads(rest.partition(' ')[2])
+                    continue
+                _, key_number, acquired = rest.split(' ')
+                # A key and its case are written before the first record using them
+                _, case_number, names = self.find_definition(data, start, position, 'K', key_number,
+                                                             definitions).split(' ', 2)
+                case_name = json.loads(self.find_definition(data, start, position, 'C', case_number,
+                                                            definitions).partition(' ')[2])
+                item, _, skin = names.partition(';')
+                found[item_id] = InventoryItem(case_name, item, skin, int(acquired), self.catalog)
+            return found
+        except (ValueError, KeyError, TypeError):
+            # Damaged records are left to a full load, which skips them
+            return None
+        finally:
+            data.close()
+    
+    def find_record(self, data, start, end, item_id):
+        # Offset of the R or A record of item_id in data[start:end], or None
+        low, high = start, end
+        while low < high:
+            middle = self.next_line(data, (low + high) // 2, low)
+            if middle >= high:
+                # The line at low reaches past the middle
+                middle = low
+            found = self.next_entry(data, middle, high)
+            if found is None or found[1] > item_id:
+                high = middle
+            elif found[1] < item_id:
+                low = data.find(b'\n', found[0]) + 1
+            else:
+                return found[0]
+        return None
+    
+    def next_line(self, data, position, start):
+        # Start of the first line at or after position
+        if position == start or data[position - 1] == 10:
+            return position
+        return data.find(b'\n', position) + 1
+    
+    def next_entry(self, data, position, end):
+        # (offset, id) of the first R or A record from position on, skipping
+        # the C and K records between them; None when there is none before end
+        while position < end:
+            if data[position + 9] in b'RA':
+                return position, int(data[position + 11:data.find(b' ', position + 11)])
+            position = data.find(b'\n', position) + 1
+        return None
+    
+    def find_definition(self, data, start, end, op, number, definitions):
+        # The rest of the C or K record defining number, looked for at line
+        # starts; kept in definitions for the next item using it
+        if (op, number) in definitions:
+            return definitions[op, number]
+        marker = f" {op} {number} ".encode()
+        position = data.find(marker, start, end)
+        while position != -1:
+            line_start = position - 8
+            if line_start == start or (line_start > start and data[line_start - 1] == 10):
+                record = self.parse_record(data[line_start:data.find(b'\n', position) + 1])
+                if record is None:
+                    raise ValueError(f"damaged {op} record")
+                definitions[op, number] = record[1]
+                return record[1]
+            position = data.find(marker, position + 1, end)
+        raise KeyError(f"{op} {number}")
+    
+    def snapshot(self):
+        # Items and next id as they are now, for save() to write from
+        # another thread while this inventory keeps changing. Entries are
+        # never changed in place, so a shallow copy is enough
+        return dict(self.items), self.next_id
+    
+    def save(self, snapshot=None):
+        # Writes the live items, or a snapshot() taken earlier; returns
+        # whether the file was written
+        if self.read_only:
+            raise RuntimeError("Inventory is read-only")
+        items, next_id = snapshot or (self.items, self.next_id)
+        if self.journal:
+            return self.compact(items, next_id)
+        
+        try:
+            # Create backup
+            if os.path.exists(self.file_path):
+                os.replace(self.file_path, self.backup_path)
+            
+            # Save data with a checksum after every block, so loading can
+            # verify and hand over items block by block
+            items = list(items.values())
+            with open(self.file_path, 'w', encoding='utf-8') as f:
+                for start in range(0, len(items), LOAD_BLOCK_RECORDS):
+                    data = ''.join(json.dumps(self.export_item(item), ensure_ascii=False) + '\n'
+                                   for item in items[start:start + LOAD_BLOCK_RECORDS])
+                    f.write(f"{data}{BLOCK_CHECKSUM}{self.calculate_checksum(data)}\n")
+            return True
+        except Exception as e:
+            print(f"Error saving inventory: {str(e)}")
+            # Try to restore from backup
+            if os.path.exists(self.backup_path):
+                os.replace(self.backup_path, self.file_path)
+            return False
+    
+    def compact(self, items=None, next_id=None):
+        # Rewrite the journal with only the live items. The new file is fully
+        # written next to the old one before it takes its place, and the old
+        # one is kept as the backup
+        if items is None:
+            items, next_id = self.items, self.next_id
+        try:
+            self.close()
+            old_numbers = self.case_numbers, self.key_numbers
+            self.case_numbers = {}
+            self.key_numbers = {}
+            with open(self.temp_path, 'w', encoding='utf-8') as f:
+                f.write(f"{JOURNAL_HEADER} {JOURNAL_VERSION} {next_id}\n")
+                f.writelines(self.journal_records(items.items()))
+                f.write(self.make_record(f"E {next_id}"))
+                f.flush()
+                os.fsync(f.fileno())
+            
+            if os.path.exists(self.file_path):
+                os.replace(self.file_path, self.backup_path)
+            os.replace(self.temp_path, self.file_path)
+            self.dead_records = 0
+            return True
+        except Exception as e:
+            print(f"Error saving inventory: {str(e)}")
+            if not os.path.exists(self.file_path) and os.path.exists(self.backup_path):
+                os.replace(self.backup_path, self.file_path)
+            # Keep appending against the tables of the file that is still in place
+            self.case_numbers, self.key_numbers = old_numbers
+            return False
+    
+    def make_entry(self, item):
+        # Items of loaded cases are kept as references, anything else as a full dict
+        if isinstance(item, InventoryItem) or self.catalog is None:
+            return item
+        case_name = item.get('case')
+        catalog_item = self.catalog.find_item(case_name, item.get('item'), item.get('skin'))
+        if catalog_item is None:
+            return item
+        # Names are taken from the catalog, so every entry of an item shares them
+        return InventoryItem(case_name, catalog_item['item'], catalog_item['skin'],
+                             item.get('acquired', int(time.time())), self.catalog)
+    
+    def decode_item(self, data):
+        if not isinstance(data, list):
+            return data
+        if len(data) == 4:
+            return InventoryItem(data[0], data[1], data[2], data[3], self.catalog)
+        # Older entries name the item by its line in items.txt, which is
+        # only trusted once to find its name
+        case_name, index, acquired = data
+        item = self.catalog.item_at(case_name, index) if self.catalog is not None else None
+        if item is None:
+            return {'case': case_name, 'item': "Unknown item", 'skin': "?", 'price': 0.0,
+                    'rarity': 'common', 'sprite': None, 'acquired': acquired}
+        return InventoryItem(case_name, item['item'], item['skin'], acquired, self.catalog)
+    
+    def encode_item(self, item):
+        return item.encode() if isinstance(item, InventoryItem) else item
+    
+    def export_item(self, item):
+        return item.to_dict() if isinstance(item, InventoryItem) else item
+    
+    def journal_records(self, entries):
+        # References are written as "R id key acquired". The first time an
+        # item is used its key is stored as "K number case item;skin" (names
+        # from items.txt can't hold a ';'), and the first time a case is used
+        # its name as "C number name"
+        for item_id, item in entries:
+            if isinstance(item, InventoryItem):
+                key = (item.case, item.item, item.skin)
+                key_number = self.key_numbers.get(key)
+                if key_number is None:
+                    case_number = self.case_numbers.get(item.case)
+                    if case_number is None:
+                        case_number = str(len(self.case_numbers))
+                        self.case_numbers[item.case] = case_number
+                        yield self.make_record(f"C {case_number} {json.dumps(item.case, ensure_ascii=False)}")
+                    key_number = str(len(self.key_numbers))
+                    self.key_numbers[key] = key_number
+                    yield self.make_record(f"K {key_number} {case_number} {item.item};{item.skin}")
+                yield self.make_record(f"R {item_id} {key_number} {item.acquired}")
+            else:
+                yield self.make_record(f"A {item_id} {json.dumps(item, ensure_ascii=False)}")
+    
+    def append_records(self, records):
+        if self.read_only:
+            raise RuntimeError("Inventory is read-only")
+        instrument.count("inventory.records_appended", len(records))
+        try:
+            if self._journal_file is None:
+                new_file = not os.path.exists(self.file_path)
+                self._journal_file = open(self.file_path, 'a', encoding='utf-8')
+                if new_file:
+                    self._journal_file.write(f"{JOURNAL_HEADER} {JOURNAL_VERSION} {self.next_id}\n")
+            self._journal_file.write(''.join(records))
+            self._journal_file.flush()
+        except Exception as e:
+            print(f"Error saving inventory: {str(e)}")
+            self.close()
+            return
+        
+        if self.dead_records > max(COMPACT_MIN_RECORDS, len(self.items)):
+            self.compact()
+    
+    def close(self):
+        if self._journal_file is not None:
+            self._journal_file.close()
+            self._journal_file = None
+    
+    def add_item(self, item):
+        return self.add_items([item])[0]
+    
+    def add_items(self, items):
+        # Batched variant: one write for any number of new items
+        if not items:
+            return []
+        
+        items = [self.make_entry(item) for item in items]
+        first_id = self.next_id
+        self.next_id += len(items)
+        new_ids = range(first_id, self.next_id)
+        for item_id, item in zip(new_ids, items):
+            self.items[item_id] = item
+            self.track_added(item_id, item)
+        
+        if self.ledger:
+            self.ledger.record_items(added=[(item_id, self.encode_item(item))
+                                            for item_id, item in zip(new_ids, items)])
+        elif self.journal:
+            if self._journal_file is None and not os.path.exists(self.file_path):
+                self.case_numbers = {}
+                self.key_numbers = {}
+            self.append_records(list(self.journal_records(zip(new_ids, items))))
+        else:
+            self.save()
+        if self.listeners:
+            self.notify_listeners(added=list(zip(new_ids, items)))
+        return list(new_ids)
+    
+    def apply_changes(self, added, removed):
+        # Replays logged changes without logging them again
+        added_items = []
+        removed_items = []
+        for item_id, item in added:
+            item = self.decode_item(item)
+            old = self.items.pop(item_id, None)
+            if old is not None:
+                self.track_removed(item_id, old)
+                removed_items.append((item_id, old))
+            self.items[item_id] = item
+            self.track_added(item_id, item)
+            added_items.append((item_id, item))
+            self.next_id = max(self.next_id, item_id + 1)
+        for item_id in removed:
+            item = self.items.pop(item_id, None)
+            if item is not None:
+                self.track_removed(item_id, item)
+                removed_items.append((item_id, item))
+        if self.listeners and (added_items or removed_items):
+            self.notify_listeners(added_items, removed_items)
+    
+    def remove_item(self, item_id):
+        removed_items = self.remove_items([item_id])
+        return removed_items[0] if removed_items else None
+    
+    def find_where(self, predicate):
+        return [item_id for item_id, item in self.items.items() if predicate(item)]
+    
+    def remove_items(self, item_ids):
+        removed_items = []
+        removed_ids = []
+        for item_id in item_ids:
+            item = self.items.pop(item_id, None)
+            if item is not None:
+                self.track_removed(item_id, item)
+                removed_items.append(item)
+                removed_ids.append(item_id)
+        if removed_items:
+            if self.ledger:
+                self.ledger.record_items(removed=removed_ids)
+            elif self.journal:
+                self.dead_records += 2 * len(removed_ids)
+                self.append_records([self.make_record(f"D {item_id}") for item_id in removed_ids])
+            else:
+                self.save()
+            if self.listeners:
+                self.notify_listeners(removed=list(zip(removed_ids, removed_items)))
+        return removed_items
+
+class MoneyManager:
+    def __init__(self, file_path, ledger=None):
+        self.file_path = file_path
+        self.balance = 0.0
+        # With a ledger, changes go to the shared log and the file is only
+        # rewritten at checkpoints
+        self.ledger = ledger
+        # Callbacks called with the new balance after every change
+        self.listeners = []
+        self.load()
+    
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+    
+    def notify_listeners(self):
+        for callback in self.listeners:
+            callback(self.balance)
+    
+    def load(self):
+        if os.path.exists(self.file_path):
+            try:
+                with open(self.file_path, 'r') as f:
+                    self.balance = float(f.read())
+            except Exception as e:
+                print(f"Error loading balance: {str(e)}")
+                self.balance = 1000.0
+        else:
+            self.balance = 1000.0  # Starting balance
+            self.save()
+    
+    def save(self):
+        if self.ledger:
+            self.ledger.record_balance(self.balance)
+        else:
+            self.write_file()
+    
+    def write_file(self, durable=False, balance=None):
+        # Writes the current balance, or one taken earlier; returns whether it worked
+        if balance is None:
+            balance = self.balance
+        try:
+            if durable:
+                temp_path = self.file_path + ".tmp"
+                with open(temp_path, 'w') as f:
+                    f.write(str(balance))
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_path, self.file_path)
+            else:
+                with open(self.file_path, 'w') as f:
+                    f.write(str(balance))
+            return True
+        except Exception as e:
+            print(f"Error saving balance: {str(e)}")
+            return False
+    
+    def add_money(self, amount):
+        self.balance += amount
+        self.save()
+        self.notify_listeners()
+    
+    def deduct_money(self, amount):
+        if self.balance >= amount:
+            self.balance -= amount
+            self.save()
+            self.notify_listeners()
+            return True
+        return False
+
+# Held next to an account's ledger by the process writing to it
+LOCK_SUFFIX = ".lock"
+
+class AccountLockedError(RuntimeError):
+    pass
+
+class AccountLock:
+    # Exclusive lock on a file next to the ledger, so two processes (the
+    # window and the command line, say) never write the same account. The
+    # OS drops it when the process ends, a crash leaves no stale lock behind
+    def __init__(self, ledger_path):
+        self.path = ledger_path + LOCK_SUFFIX
+        self.file = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            self.file.close()
+            raise AccountLockedError(f"The account in {ledger_path} is in use by another CasePy "
+                                     f"window or command, close it and try again")
+    
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+class Account:
+    # Balance and inventory of one player, persisted together through one
+    # ledger so a crash can never leave money.txt and inventory.txt out of
+    # step. The state files are rewritten only at checkpoints; on startup
+    # any records newer than the last checkpoint are replayed onto them
+    def __init__(self, money_path, inventory_path, ledger_path, catalog=None, ledger=None, load=True,
+                 eager_checkpoints=True):
+        # Taken before anything is read or written; raises AccountLockedError
+        # while another process has the account open. An already open ledger
+        # is locked by whoever opened it
+        self.lock = AccountLock(ledger_path) if ledger is None else None
+        self.money_manager = MoneyManager(money_path)
+        self.inventory = Inventory(inventory_path, catalog=catalog, load=False)
+        # An already open ledger (e.g. one shared by several accounts) can be
+        # passed in instead of a path; its owner takes care of checkpoints
+        self.ledger = ledger or Ledger(ledger_path, on_checkpoint=self.checkpoint_in_background)
+        # Checkpoints asked for by the ledger are written by this thread, so
+        # the caller (the Tk loop, say) never waits for a compaction
+        self.checkpoint_pool = None
+        self.checkpointing = None
+        # Set by load_partial: only some items are in memory, so the state
+        # files must not be written from here
+        self.partial = False
+        # Without eager checkpoints the ledger is only folded into the state
+        # files once it reaches its size limit, not after every load and
+        # close; short runs like a CLI command then don't rewrite the inventory
+        self.eager_checkpoints = eager_checkpoints
+        
+        # Without load, the caller steps through the loader (e.g. from the
+        # Tk loop) and must not change anything until loaded is set
+        self.loaded = False
+        self.loader = self.load_steps()
+        if load:
+            self.finish_loading()
+    
+    def load_steps(self):
+        # Inventory blocks first, then the ledger records newer than the
+        # last checkpoint; yields after every block
+        yield from self.inventory.load_blocks()
+        if self.ledger.records:
+            self.replay(self.ledger.records)
+            if self.eager_checkpoints:
+                self.checkpoint()
+            self.money_manager.notify_listeners()
+        
+        self.money_manager.ledger = self.ledger
+        self.inventory.ledger = self.ledger
+        self.loaded = True
+    
+    def finish_loading(self):
+        for _ in self.loader:
+            pass
+    
+    def load_partial(self, item_ids=()):
+        # Instead of loading: the balance and the next free id come from the
+        # ends of the files and the ledger, and of the inventory only the
+        # items in item_ids are read. For short runs that add items or sell
+        # ones they know by id (cli.py open and sell). Returns False, with
+        # nothing loaded, when the inventory file needs a full load or the
+        # ledger is due for a checkpoint; after True, checkpoints are left
+        # to the next full load
+        if self.loaded or self.ledger.record_count + 1 >= self.ledger.checkpoint_records:
+            return False
+        next_id = self.inventory.peek_next_id()
+        found = self.inventory.peek_items(item_ids) if next_id is not None else None
+        if found is None:
+            return False
+        
+        self.partial = True
+        self.inventory.items = dict(sorted(found.items()))
+        self.inventory.next_id = next_id
+        self.inventory.reset_aggregates()
+        wanted = set(item_ids)
+        for record in self.ledger.records:
+            if 'b' in record:
+                self.money_manager.balance = record['b']
+            added = record.get('a', ())
+            if added:
+                self.inventory.next_id = max(self.inventory.next_id, max(entry[0] for entry in added) + 1)
+            self.inventory.apply_changes([entry for entry in added if entry[0] in wanted], record.get('d', ()))
+        self.money_manager.ledger = self.ledger
+        self.inventory.ledger = self.ledger
+        self.loader = iter(())
+        self.loaded = True
+        return True
+    
+    def replay(self, records):
+        for record in records:
+            if 'b' in record:
+                self.money_manager.balance = record['b']
+            self.inventory.apply_changes(record.get('a', ()), record.get('d', ()))
+    
+    def transaction(self):
+        # Changes made inside are written as a single ledger record
+        return self.ledger.transaction()
+    
+    def sell_items(self, item_ids):
+        # Removal and payment are committed together; returns (sold items, total)
+        with self.transaction():
+            sold_items = self.inventory.remove_items(item_ids)
+            total = sum(item['price'] for item in sold_items)
+            if sold_items:
+                self.money_manager.add_money(total)
+        return sold_items, total
+    
+    def sell_where(self, predicate):
+        # e.g. account.sell_where(item_filter(rarity='common'))
+        return self.sell_items(self.inventory.find_where(predicate))
+    
+    def checkpoint(self):
+        if self.partial:
+            raise RuntimeError("Account is only partly loaded")
+        self.wait_for_checkpoint()
+        self.ledger.flush()
+        self.money_manager.write_file(durable=True)
+        self.inventory.save()
+        self.ledger.reset()
+    
+    def checkpoint_in_background(self):
+        # Called by the ledger when it gets long. Only a snapshot is taken
+        # here; the ledger is rotated by its commit thread and the state files
+        # are written by the checkpoint thread. While one checkpoint is
+        # still being written the next one waits, the ledger keeps growing
+        if self.partial or (self.checkpointing is not None and not self.checkpointing.done()):
+            return
+        balance = self.money_manager.balance
+        snapshot = self.inventory.snapshot()
+        rotation = self.ledger.rotate()
+        if self.checkpoint_pool is None:
+            self.checkpoint_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint")
+        self.checkpointing = self.checkpoint_pool.submit(self.write_checkpoint, rotation, balance, snapshot)
+    
+    def write_checkpoint(self, rotation, balance, snapshot):
+        # Runs on the checkpoint thread. The rotated part of the ledger holds
+        # exactly the changes in the snapshot, so it goes once both files are
+        # written; until then startup replays it
+        try:
+            self.ledger.wait_for(rotation)
+            if self.money_manager.write_file(durable=True, balance=balance) and self.inventory.save(snapshot):
+                self.ledger.drop_rotated()
+        except Exception as e:
+            print(f"Error writing checkpoint: {str(e)}")
+    
+    def wait_for_checkpoint(self):
+        if self.checkpointing is not None:
+            self.checkpointing.result()
+            self.checkpointing = None
+    
+    def close(self):
+        # A checkpoint of a half-loaded inventory would lose the rest of it
+        self.finish_loading()
+        self.wait_for_checkpoint()
+        if self.checkpoint_pool is not None:
+            self.checkpoint_pool.shutdown()
+        if self.eager_checkpoints and not self.partial:
+            self.checkpoint()
+        else:
+            self.ledger.flush()
+        self.ledger.close()
+        self.inventory.close()
+        if self.lock is not None:
+            self.lock.release()
@@ -0,0 +1,125 @@
+import argparse
+import os
+import time
+from contextlib import nullcontext
+
+import numpy as np
+
+from core import Account, AccountLockedError, CaseCatalog
+
+# Draws are generated in chunks so that huge batches don't need
+# several arrays of the full size at the same time
+CHUNK_SIZE = 1_000_000
+
+class BulkOpener:
+    # Headless case opening: no Tk, no animation, one debit and one
+    # inventory write per batch no matter how many cases are opened
+    def __init__(self, money_manager, inventory, seed=None):
+        self.money_manager = money_manager
+        self.inventory = inventory
+        self.rng = np.random.default_rng(seed)
+        self._tables = {}
+
+    def _table(self, case):
+        # NumPy copy of the case's alias table, built once per case
+        sampler = case.sampler
+        table = self._tables.get(id(case))
+        if table is None or table[0] is not sampler:
+            table = (sampler,
+                     np.asarray(sampler.prob, dtype=np.float64),
+                     np.asarray(sampler.alias, dtype=np.intp))
+            self._tables[id(case)] = table
+        return table
+
+    def draw_indices(self, case, count):
+        sampler, prob, alias = self._table(case)
+        if not sampler.drawable:
+            raise ValueError(f"Case {case.name} has no items to draw")
+
+        n = len(sampler)
+        result = np.empty(count, dtype=np.intp)
+        for start in range(0, count, CHUNK_SIZE):
+            size = min(CHUNK_SIZE, count - start)
+            columns = self.rng.integers(0, n, size=size)
+            coins = self.rng.random(size)
+            result[start:start + size] = np.where(coins < prob[columns], columns, alias[columns])
+        return result
+
+    def open_cases(self, case, count, store=True):
+        if count <= 0:
+            raise ValueError("Count must be positive")
+
+        cost = case.price * count
+        if self.money_manager.balance < cost:
+            return None
+
+        indices = self.draw_indices(case, count)
+        counts = np.bincount(indices, minlength=len(case.items))
+        prices = np.fromiter((item['price'] for item in case.items), dtype=np.float64,
+                             count=len(case.items))
+        value = float(counts @ prices)
+
+        # Payment and drops are committed together when a ledger is attached
+        ledger = self.money_manager.ledger
+        ids = []
+        with ledger.transaction() if ledger else nullcontext():
+            self.money_manager.deduct_money(cost)
+            if store:
+                items = case.items
+                ids = self.inventory.add_items([items[i] for i in indices.tolist()])
+
+        return {
+            'case': case.name,
+            'count': count,
+            'cost': cost,
+            'value': value,
+            'counts': {f"{item['item']} | {item['skin']}": int(n)
+                       for item, n in zip(case.items, counts)},
+            'indices': indices,
+            'ids': ids
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Open cases in bulk without the GUI")
+    parser.add_argument("case_folder", help="Path to a case folder, e.g. 'cases/Test Case'")
+    parser.add_argument("count", type=int, help="Number of cases to open")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible draws")
+    parser.add_argument("--money", default="money.txt", help="Balance file")
+    parser.add_argument("--inventory", default="inventory.txt", help="Inventory file")
+    parser.add_argument("--ledger", default="ledger.log", help="Ledger file")
+    parser.add_argument("--no-store", action="store_true",
+                        help="Don't add the drops to the inventory")
+    args = parser.parse_args()
+
+    # The whole catalog is loaded so existing inventory entries resolve
+    catalog = CaseCatalog(os.path.dirname(os.path.abspath(args.case_folder)))
+    case = next((c for c in catalog.load()
+                 if os.path.abspath(c.folder_path) == os.path.abspath(args.case_folder)), None)
+    if case is None:
+        print(f"Case {args.case_folder} not found")
+        return 1
+
+    try:
+        account = Account(args.money, args.inventory, args.ledger, catalog)
+    except AccountLockedError as e:
+        print(str(e))
+        return 1
+    opener = BulkOpener(account.money_manager, account.inventory, seed=args.seed)
+    start = time.perf_counter()
+    result = opener.open_cases(case, args.count, store=not args.no_store)
+    elapsed = time.perf_counter() - start
+    account.close()
+    if result is None:
+        print("Not enough funds!")
+        return 1
+
+    print(f"Opened {result['count']} x {result['case']} for ${result['cost']:.2f}")
+    for name, n in result['counts'].items():
+        print(f"  {name}: {n}")
+    print(f"Total value: ${result['value']:.2f}")
+    print(f"Balance: ${opener.money_manager.balance:.2f}")
+    print(f"{result['count'] / elapsed:,.0f} openings/s ({elapsed:.3f}s)")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,228 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+import casepack
+import instrument
+
+# Default memory budget for decoded images
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# Default size limit of the thumbnail folder; pruning goes down to
+# DISK_PRUNE_TARGET of it so the next few writes don't prune again
+DEFAULT_MAX_DISK_BYTES = 256 * 1024 * 1024
+DISK_PRUNE_TARGET = 0.75
+# Temporary files older than this were left by a write that never finished
+STALE_TEMP_SECONDS = 3600
+# Tk keeps 4 bytes per pixel for a PhotoImage, on top of the PIL image
+PHOTO_BYTES_PER_PIXEL = 4
+
+class ImageCache:
+    # Resized case and item images shared by every screen.
+    # Entries are keyed by (path, size, mtime, placeholder) so an edited file
+    # is picked up automatically, and the least recently used ones are
+    # dropped once the decoded pixels (PIL and Tk copies) exceed max_bytes.
+    # Resized copies are also written to cache_dir so later launches can
+    # skip decoding the full-size file; prune_disk keeps that folder under
+    # max_disk_bytes
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None, max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.current_bytes = 0
+        self.entries = OrderedDict()  # key -> [PIL image, PhotoImage or None, size in bytes]
+        self.lock = threading.Lock()
+        # Size of the thumbnail folder, unknown until prune_disk has run once
+        self.disk_bytes = None
+        self.disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def make_key(self, path, size, placeholder):
+        if path:
+            try:
+                # Sprites inside a case pack follow the pack file's mtime
+                stat_path = casepack.parse_ref(path)[0] if casepack.is_pack_ref(path) else path
+                return (path, size, os.stat(stat_path).st_mtime_ns, placeholder)
+            except OSError:
+                pass
+        # Missing files share one placeholder per size and color
+        return (None, size, None, placeholder)
+
+    def get(self, path, size, placeholder='gray'):
+        # Returns a resized PIL image, safe to call from worker threads
+        return self.get_by_key(self.make_key(path, size, placeholder))
+
+    def get_by_key(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        img = self.load(key)
+        self.store(key, img)
+        return img
+
+    def contains(self, key):
+        # True when the image is decoded already, so photo() won't block on disk
+        with self.lock:
+            return key in self.entries
+
+    def photo(self, path, size, placeholder='gray'):
+        return self.photo_by_key(self.make_key(path, size, placeholder))
+
+    def photo_by_key(self, key):
+        # Tk PhotoImage for the same entry; must be called from the Tk thread
+        from PIL import ImageTk
+
+        img = self.get_by_key(key)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is not None:
+                return entry[1]
+        photo = ImageTk.PhotoImage(img)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] is None:
+                entry[1] = photo
+                photo_bytes = img.width * img.height * PHOTO_BYTES_PER_PIXEL
+                entry[2] += photo_bytes
+                self.current_bytes += photo_bytes
+                self.evict()
+        return photo
+
+    def load(self, key):
+        path, size, _, placeholder = key
+        if path is None:
+            return Image.new('RGB', size, color=placeholder)
+
+        disk_path = self.disk_path(key)
+        if disk_path and os.path.exists(disk_path):
+            try:
+                with Image.open(disk_path) as img:
+                    img.load()
+                    instrument.count("images.thumbnail_hits")
+                # Recently used thumbnails are the last ones prune_disk removes
+                os.utime(disk_path)
+                return img
+            except Exception as e:
+                print(f"Error loading cached thumbnail: {str(e)}")
+
+        try:
+            # Full-size decode and resize, the part the thumbnails save
+            with instrument.timer("images.decode"):
+                source = casepack.open_sprite(path) if casepack.is_pack_ref(path) else Image.open(path)
+                with source as img:
+                    img = img.resize(size, Image.LANCZOS)
+        except Exception as e:
+            print(f"Error loading image {path}: {str(e)}")
+            return Image.new('RGB', size, color=placeholder)
+
+        if disk_path:
+            try:
+                # Write under a temporary name so readers never see half a file
+                temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+                img.save(temp_path, format='PNG')
+                written = os.path.getsize(temp_path)
+                os.replace(temp_path, disk_path)
+                self.count_disk_bytes(written)
+            except Exception as e:
+                print(f"Error saving thumbnail: {str(e)}")
+        return img
+
+    def count_disk_bytes(self, written):
+        with self.disk_lock:
+            if self.disk_bytes is None:
+                return
+            self.disk_bytes += written
+            over = self.disk_bytes > self.max_disk_bytes
+        if over:
+            self.prune_disk()
+
+    def prune_disk(self):
+        # Deletes the least recently used thumbnails (a hit refreshes the
+        # mtime) until the folder is back under its budget, and temporary
+        # files left by interrupted writes. Returns the number of files removed
+        if not self.cache_dir:
+            return 0
+        with self.disk_lock:
+            files = []
+            removed = 0
+            now = time.time()
+            try:
+                with os.scandir(self.cache_dir) as entries:
+                    for entry in entries:
+                        try:
+                            stat = entry.stat()
+                            if entry.name.endswith(".tmp"):
+                                if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                                    os.remove(entry.path)
+                                    removed += 1
+                                continue
+                        except OSError:
+                            continue
+                        files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            except OSError as e:
+                print(f"Error pruning thumbnails: {str(e)}")
+                return removed
+
+            total = sum(size for _, size, _ in files)
+            if total > self.max_disk_bytes:
+                target = self.max_disk_bytes * DISK_PRUNE_TARGET
+                files.sort()
+                for _, size, path in files:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(path)
+                        total -= size
+                        removed += 1
+                    except OSError:
+                        pass
+            self.disk_bytes = total
+            return removed
+
+    def disk_path(self, key):
+        if not self.cache_dir:
+            return None
+        path, size, mtime, _ = key
+        if not casepack.is_pack_ref(path):
+            path = os.path.abspath(path)
+        name = f"{path}|{size[0]}x{size[1]}|{mtime}"
+        return os.path.join(self.cache_dir, hashlib.sha1(name.encode('utf-8')).hexdigest() + ".png")
+
+    def store(self, key, img):
+        nbytes = img.width * img.height * len(img.getbands())
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[2]
+            self.entries[key] = [img, None, nbytes]
+            self.current_bytes += nbytes
+            self.evict()
+
+    def evict(self):
+        # Drops least recently used entries, always keeping the newest one;
+        # must be called with the lock held
+        while self.current_bytes > self.max_bytes and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.current_bytes -= evicted[2]
+
+    def invalidate(self, path):
+        # Drops every size of the images at or under path (a file, a case
+        # folder or a pack); returns the number of entries removed
+        prefixes = (os.path.join(path, ""), f"{casepack.PACK_PREFIX}{path}#")
+        with self.lock:
+            keys = [key for key in self.entries
+                    if key[0] is not None and (key[0] == path or key[0].startswith(prefixes))]
+            for key in keys:
+                self.current_bytes -= self.entries.pop(key)[2]
+        return len(keys)
@@ -0,0 +1,213 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# Instrumentation is off unless CASEPY_PROFILE is set (or enable() is called).
+# When off nothing is wrapped, so the instrumented code runs unchanged.
+#   CASEPY_PROFILE=1              turn on timers, counters and Tk lag probes
+#   CASEPY_PROFILE_OUT=stats.json where to dump stats (.json or .csv)
+#   CASEPY_PROFILE_INTERVAL=10    seconds between dumps
+#   CASEPY_CPROFILE=app.prof      also capture a cProfile of the whole run
+SAMPLE_SIZE = 1000
+DEFAULT_OUTPUT = "casepy_stats.json"
+DEFAULT_INTERVAL = 10.0
+LAG_PROBE_MS = 100
+
+enabled = False
+_lock = threading.Lock()
+_timers = {}  # name -> [count, total seconds, max seconds, recent samples]
+_counters = {}
+_gauges = {}
+_output = None
+_profiler = None
+_profile_path = None
+_dump_thread = None
+_stop = threading.Event()
+
+def enable(output=None, interval=DEFAULT_INTERVAL, profile_path=None):
+    global enabled, _output, _profiler, _profile_path, _dump_thread
+    if enabled:
+        return
+    enabled = True
+    _output = output or DEFAULT_OUTPUT
+    if profile_path:
+        import cProfile
+
+        _profile_path = profile_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    if interval:
+        _dump_thread = threading.Thread(target=_dump_loop, args=(interval,), name="stats-dump",
+                                        daemon=True)
+        _dump_thread.start()
+    atexit.register(shutdown)
+
+def enable_from_env(argv=()):
+    # Returns True when instrumentation was switched on
+    if os.environ.get("CASEPY_PROFILE", "") in ("", "0") and "--profile" not in argv:
+        return False
+    enable(os.environ.get("CASEPY_PROFILE_OUT"),
+           float(os.environ.get("CASEPY_PROFILE_INTERVAL", DEFAULT_INTERVAL)),
+           os.environ.get("CASEPY_CPROFILE"))
+    return True
+
+def record(name, seconds):
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = [0, 0.0, 0.0, deque(maxlen=SAMPLE_SIZE)]
+        timer[0] += 1
+        timer[1] += seconds
+        if seconds > timer[2]:
+            timer[2] = seconds
+        timer[3].append(seconds)
+
+def count(name, amount=1):
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+def gauge(name, getter):
+    # Value read only when stats are dumped, so it costs nothing in between
+    _gauges[name] = getter
+
+class timer:
+    # Context manager for timing a block: with instrument.timer("name"): ...
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            record(self.name, time.perf_counter() - self.start)
+
+def wrap(func, name):
+    # Only called with instrumentation on, so inspect isn't imported otherwise
+    import inspect
+
+    if inspect.isgeneratorfunction(func):
+        # Timed from the first step to the last, including the time the
+        # caller spends between steps (e.g. the inventory loading in slices)
+        @functools.wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return (yield from func(*args, **kwargs))
+            finally:
+                record(name, time.perf_counter() - start)
+        return generator_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+def instrument_methods(cls, names, prefix=None):
+    # Replaces the given methods with timed versions; a no-op while disabled
+    if not enabled:
+        return
+    prefix = prefix or cls.__name__
+    for name in names:
+        setattr(cls, name, wrap(getattr(cls, name), f"{prefix}.{name}"))
+
+def watch_tk(root):
+    # Measures how late root.after callbacks run compared to when they were
+    # due, times the callbacks themselves, and keeps a heartbeat probe
+    # running so lag is also visible while the app is idle
+    if not enabled:
+        return
+    original_after = root.after
+
+    def after(ms, func=None, *args):
+        if func is None:
+            return original_after(ms)
+        due = time.perf_counter() + ms / 1000
+        name = f"tk.after.{getattr(func, '__name__', 'callback')}"
+
+        def callback(*callback_args):
+            start = time.perf_counter()
+            record("tk.after_lag", max(0.0, start - due))
+            try:
+                return func(*callback_args)
+            finally:
+                record(name, time.perf_counter() - start)
+        return original_after(ms, callback, *args)
+
+    root.after = after
+
+    def probe(due):
+        now = time.perf_counter()
+        record("tk.loop_lag", max(0.0, now - due))
+        original_after(LAG_PROBE_MS, probe, now + LAG_PROBE_MS / 1000)
+
+    original_after(LAG_PROBE_MS, probe, time.perf_counter() + LAG_PROBE_MS / 1000)
+
+def snapshot():
+    with _lock:
+        timers = {name: (t[0], t[1], t[2], sorted(t[3])) for name, t in _timers.items()}
+        counters = dict(_counters)
+    rows = []
+    for name, (calls, total, worst, samples) in sorted(timers.items()):
+        rows.append({
+            'name': name,
+            'calls': calls,
+            'total_ms': total * 1000,
+            'mean_ms': total / calls * 1000,
+            'p50_ms': samples[len(samples) // 2] * 1000,
+            'p99_ms': samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+            'max_ms': worst * 1000
+        })
+    for name, getter in _gauges.items():
+        try:
+            counters[name] = getter()
+        except Exception as e:
+            counters[name] = f"error: {e}"
+    return {'timestamp': time.time(), 'timers': rows, 'counters': counters}
+
+def dump(path=None):
+    path = path or _output
+    data = snapshot()
+    temp_path = path + ".tmp"
+    try:
+        with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+            if path.endswith(".csv"):
+                import csv
+
+                writer = csv.writer(f)
+                writer.writerow(['name', 'calls', 'total_ms', 'mean_ms', 'p50_ms', 'p99_ms', 'max_ms'])
+                for row in data['timers']:
+                    writer.writerow([row['name'], row['calls'], f"{row['total_ms']:.3f}",
+                                     f"{row['mean_ms']:.3f}", f"{row['p50_ms']:.3f}",
+                                     f"{row['p99_ms']:.3f}", f"{row['max_ms']:.3f}"])
+                for name, value in sorted(data['counters'].items()):
+                    writer.writerow([name, value, '', '', '', '', ''])
+            else:
+                json.dump(data, f, indent=2)
+        os.replace(temp_path, path)
+    except Exception as e:
+        print(f"Error writing stats: {str(e)}")
+
+def _dump_loop(interval):
+    while not _stop.wait(interval):
+        dump()
+
+def shutdown():
+    if not enabled or _stop.is_set():
+        return
+    _stop.set()
+    dump()
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_profile_path)
@@ -0,0 +1,286 @@
+import json
+import os
+import shutil
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+
+import instrument
+
+# How long the commit thread waits for more records before writing a batch
+GROUP_COMMIT_WINDOW = 0.005
+# Fold the ledger into the state files after this many records
+CHECKPOINT_RECORDS = 1000
+# Records moved out of the way by rotate() until the state files hold them
+ROTATED_SUFFIX = ".old"
+# Queued by rotate() in place of a record; the commit thread rotates the
+# file once everything queued before it is written
+ROTATE = object()
+
+def merge_change(record, change):
+    # Folds one change into the record of the transaction it belongs to
+    if 'b' in change:
+        record['b'] = change['b']
+    if 'a' in change:
+        record.setdefault('a', []).extend(change['a'])
+    if 'd' in change:
+        # An item added and removed in the same transaction never reaches the disk
+        added_here = {entry[0] for entry in record.get('a', ())}
+        dropped = {item_id for item_id in change['d'] if item_id in added_here}
+        if dropped:
+            record['a'] = [entry for entry in record['a'] if entry[0] not in dropped]
+        removed = [item_id for item_id in change['d'] if item_id not in dropped]
+        if removed:
+            record.setdefault('d', []).extend(removed)
+
+def read_records(path):
+    # Valid records from the start of the log, stopping at the first bad one.
+    # Returns (records, size of the valid part); only reads, so tools can
+    # look at the log without opening it for writing
+    records = []
+    valid_size = 0
+    if not os.path.exists(path):
+        return records, valid_size
+    with open(path, 'rb') as f:
+        for line in f:
+            checksum, _, payload = line.rstrip(b'\n').partition(b' ')
+            if not line.endswith(b'\n') or checksum != f"{zlib.crc32(payload):08x}".encode():
+                print(f"Ignoring damaged ledger record in {path}")
+                break
+            records.append(json.loads(payload))
+            valid_size += len(line)
+    return records, valid_size
+
+class Ledger:
+    # Write-ahead log shared by the balance and the inventory. Every change
+    # (or every transaction, for grouped changes) becomes one checksummed
+    # record holding the new balance, added items and removed item ids.
+    # Records are written by a background thread: whatever arrives within
+    # the commit window goes to disk with a single write and fsync.
+    #
+    # Records only hold absolute values and ids, so replaying them on top
+    # of any newer checkpoint gives the same state. One thread at a time
+    # is expected to change the state behind a ledger.
+    def __init__(self, path, window=GROUP_COMMIT_WINDOW, checkpoint_records=CHECKPOINT_RECORDS,
+                 on_checkpoint=None):
+        self.path = path
+        self.window = window
+        self.checkpoint_records = checkpoint_records
+        self.on_checkpoint = on_checkpoint
+        self.records = self.read()
+        self.record_count = len(self.records)
+
+        self.condition = threading.Condition()
+        self.pending = []
+        self.submitted = 0
+        self.flushed = 0
+        self.error = None
+        self.closed = False
+        self.writes = 0
+        self.local = threading.local()
+        self.callbacks = []  # (sequence, callback) waiting for their record to be written
+
+        # Drop a torn record left by a crash before appending after it
+        self.file = open(path, 'ab')
+        self.file.truncate(self.valid_size)
+        self.thread = threading.Thread(target=self.run, name="ledger-commit", daemon=True)
+        self.thread.start()
+
+    def read(self):
+        # Records of a rotated part that was never dropped come first
+        rotated, _ = read_records(self.path + ROTATED_SUFFIX)
+        records, self.valid_size = read_records(self.path)
+        return rotated + records
+
+    @contextmanager
+    def transaction(self):
+        # Changes made inside are committed as one record
+        if getattr(self.local, 'record', None) is not None:
+            yield
+            return
+        self.local.record = {}
+        try:
+            yield
+        finally:
+            # Whatever was changed in memory is committed, even on errors,
+            # so the log never falls behind the live state
+            record = self.local.record
+            self.local.record = None
+            if record:
+                self.submit(record)
+
+    def record_balance(self, balance):
+        self.stage({'b': balance})
+
+    def record_items(self, added=(), removed=()):
+        change = {}
+        if added:
+            change['a'] = [[item_id, item] for item_id, item in added]
+        if removed:
+            change['d'] = list(removed)
+        if change:
+            self.stage(change)
+
+    def stage(self, change):
+        record = getattr(self.local, 'record', None)
+        if record is None:
+            self.submit(change)
+        else:
+            merge_change(record, change)
+
+    def submit(self, record, wait=False):
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        line = f"{zlib.crc32(payload):08x} ".encode() + payload + b'\n'
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Ledger is closed")
+            self.pending.append(line)
+            self.submitted += 1
+            sequence = self.submitted
+            self.condition.notify_all()
+        self.record_count += 1
+        if wait:
+            self.wait_for(sequence)
+        if self.on_checkpoint and self.record_count >= self.checkpoint_records:
+            self.on_checkpoint()
+
+    def wait_for(self, sequence):
+        with self.condition:
+            while self.flushed < sequence and self.error is None:
+                self.condition.wait()
+            if self.error is not None:
+                raise self.error
+
+    def on_flushed(self, sequence, callback):
+        # Calls callback(error) once record `sequence` is on disk, from the
+        # commit thread, or right away when it already is
+        with self.condition:
+            if self.flushed < sequence and self.error is None:
+                self.callbacks.append((sequence, callback))
+                return
+            error = self.error
+        callback(error)
+    
+    def flush(self):
+        with self.condition:
+            sequence = self.submitted
+        self.wait_for(sequence)
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending and self.closed:
+                    return
+            # Give other changes a moment to join this batch
+            if self.window:
+                time.sleep(self.window)
+            with self.condition:
+                batch = self.pending
+                self.pending = []
+                sequence = self.submitted
+            try:
+                self.write_batch(batch)
+            except Exception as e:
+                print(f"Error writing ledger: {str(e)}")
+                with self.condition:
+                    self.error = e
+                    self.condition.notify_all()
+                    callbacks = self.callbacks
+                    self.callbacks = []
+                for _, callback in callbacks:
+                    callback(e)
+                return
+            with self.condition:
+                self.flushed = sequence
+                self.condition.notify_all()
+                due = [callback for waiting, callback in self.callbacks if waiting <= sequence]
+                if due:
+                    self.callbacks = [entry for entry in self.callbacks if entry[0] > sequence]
+            for callback in due:
+                callback(None)
+
+    def write_batch(self, batch):
+        # Lines up to each rotation go to the file being rotated
+        lines = []
+        for entry in batch:
+            if entry is ROTATE:
+                self.write_lines(lines)
+                lines = []
+                self.rotate_file()
+            else:
+                lines.append(entry)
+        self.write_lines(lines)
+
+    def write_lines(self, lines):
+        if not lines:
+            return
+        data = b''.join(lines)
+        instrument.count("ledger.records", len(lines))
+        instrument.count("ledger.bytes", len(data))
+        self.file.write(data)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.writes += 1
+
+    def reset(self):
+        # Called once the state files hold everything in the log
+        self.flush()
+        with self.condition:
+            self.file.truncate(0)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.records = []
+            self.record_count = 0
+        self.drop_rotated()
+
+    def rotate(self):
+        # Moves everything submitted so far to path + ROTATED_SUFFIX and goes
+        # on with an empty log, so state files can be written while new
+        # records keep coming. Like reset(), only called by the thread
+        # submitting records, but it doesn't wait: the commit thread does the
+        # move after the records queued before it, without holding up the
+        # caller. Returns a sequence to pass to wait_for() or on_flushed();
+        # the rotated part is replayed on startup until drop_rotated()
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Ledger is closed")
+            self.pending.append(ROTATE)
+            self.submitted += 1
+            sequence = self.submitted
+            self.condition.notify_all()
+        self.records = []
+        self.record_count = 0
+        return sequence
+
+    def rotate_file(self):
+        # Runs on the commit thread
+        rotated = self.path + ROTATED_SUFFIX
+        self.file.close()
+        if os.path.exists(rotated):
+            # The last rotated part was never dropped: keep both, in order
+            with open(self.path, 'rb') as source, open(rotated, 'ab') as target:
+                shutil.copyfileobj(source, target)
+                target.flush()
+                os.fsync(target.fileno())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, rotated)
+        self.file = open(self.path, 'ab')
+
+    def drop_rotated(self):
+        try:
+            os.remove(self.path + ROTATED_SUFFIX)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self.condition:
+            if self.closed:
+                return
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        self.file.close()
@@ -1,196 +1,128 @@
 import os
+import sys
 import random
-import json
-import hashlib
+import time
+import queue
+from concurrent.futures import ThreadPoolExecutor
 from tkinter import *
 from tkinter import messagebox, ttk
-from PIL import Image, ImageTk
+import instrument
+from core import (RARITY_WEIGHTS, Account, AccountLockedError, CaseCatalog, CaseIndex, Inventory,
+                  InventoryIndex, MoneyManager, item_filter)
+from ledger import Ledger
+from image_cache import ImageCache
+from watcher import CaseWatcher
 
-class Case:
-    def __init__(self, name, price, image_path, items):
-        self.name = name
-        self.price = price
-        self.image_path = image_path
-        self.items = items
-        
-    @classmethod
-    def load_from_folder(cls, folder_path):
-        try:
-            # Load case information
-            case_txt = os.path.join(folder_path, "case.txt")
-            if not os.path.exists(case_txt):
-                raise FileNotFoundError(f"File {case_txt} not found")
-            
-            with open(case_txt, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                if len(lines) < 2:
-                    raise ValueError("Not enough data in case.txt")
-                
-                name = lines[0].strip()
-                price = float(lines[1].strip())
-            
-            # Load case image
-            image_path = os.path.join(folder_path, "case.png")
-            if not os.path.exists(image_path):
-                raise FileNotFoundError(f"Image {image_path} not found")
-            
-            # Load items
-            items_txt = os.path.join(folder_path, "items.txt")
-            if not os.path.exists(items_txt):
-                raise FileNotFoundError(f"File {items_txt} not found")
-            
-            items = []
-            with open(items_txt, 'r', encoding='utf-8') as f:
-                for line in f:
-                    if line.strip():
-                        item_data = line.strip().split(';')
-                        if len(item_data) < 4:
-                            continue
-                            
-                        item_name = item_data[0]
-                        skin_name = item_data[1]
-                        item_price = float(item_data[2])
-                        rarity = item_data[3]
-                        sprite_path = os.path.join(folder_path, "sprites", f"{item_name}_{skin_name}.png")
-                        
-                        if not os.path.exists(sprite_path):
-                            sprite_path = None
-                        
-                        items.append({
-                            'item': item_name,
-                            'skin': skin_name,
-                            'price': item_price,
-                            'rarity': rarity,
-                            'sprite': sprite_path
-                        })
-            
-            return cls(name, price, image_path, items)
-            
-        except Exception as e:
-            print(f"Error loading case from {folder_path}: {str(e)}")
-            return None
+# Memory budget and on-disk location of the shared image cache
+IMAGE_CACHE_BYTES = 64 * 1024 * 1024
+THUMBNAIL_DIR = ".thumbnails"
+THUMBNAIL_DIR_BYTES = 256 * 1024 * 1024
+IMAGE_WORKERS = 4
 
-class Inventory:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.backup_path = file_path + ".bak"
-        self.items = []
-        self.load()
-    
-    def calculate_checksum(self, data):
-        return hashlib.md5(data.encode('utf-8')).hexdigest()
-    
-    def load(self):
-        if os.path.exists(self.file_path):
-            try:
-                # Verify file integrity
-                with open(self.file_path, 'r', encoding='utf-8') as f:
-                    data = f.read()
-                    stored_checksum = data.split('\n')[-1] if '\n' in data else ''
-                    clean_data = data.rsplit('\n', 1)[0] if '\n' in data else data
-                    
-                    if stored_checksum and self.calculate_checksum(clean_data) != stored_checksum:
-                        # Try loading from backup
-                        if os.path.exists(self.backup_path):
-                            with open(self.backup_path, 'r', encoding='utf-8') as backup:
-                                data = backup.read()
-                                stored_checksum = data.split('\n')[-1] if '\n' in data else ''
-                                clean_data = data.rsplit('\n', 1)[0] if '\n' in data else data
-                                
-                                if stored_checksum and self.calculate_checksum(clean_data) != stored_checksum:
-                                    raise ValueError("Invalid checksum in backup file")
-                                
-                                for line in clean_data.split('\n'):
-                                    if line.strip():
-                                        self.items.append(json.loads(line.strip()))
-                            # Restore main file
-                            self.save()
-                            return
-                        raise ValueError("Invalid checksum in inventory file")
-                    
-                    # Load main file
-                    for line in clean_data.split('\n'):
-                        if line.strip():
-                            self.items.append(json.loads(line.strip()))
-            except Exception as e:
-                print(f"Error loading inventory: {str(e)}")
-                self.items = []
-    
-    def save(self):
-        try:
-            # Create backup
-            if os.path.exists(self.file_path):
-                os.replace(self.file_path, self.backup_path)
-            
-            # Save data with checksum
-            data = '\n'.join(json.dumps(item, ensure_ascii=False) for item in self.items)
-            checksum = self.calculate_checksum(data)
-            full_data = f"{data}\n{checksum}"
-            
-            with open(self.file_path, 'w', encoding='utf-8') as f:
-                f.write(full_data)
-        except Exception as e:
-            print(f"Error saving inventory: {str(e)}")
-            # Try to restore from backup
-            if os.path.exists(self.backup_path):
-                os.replace(self.backup_path, self.file_path)
-    
-    def add_item(self, item):
-        self.items.append(item)
-        self.save()
-    
-    def remove_item(self, index):
-        if 0 <= index < len(self.items):
-            item = self.items.pop(index)
-            self.save()
-            return item
-        return None
-    
-    def remove_items(self, indices):
-        # Remove in reverse order to prevent index shifting
-        removed_items = []
-        for index in sorted(indices, reverse=True):
-            if 0 <= index < len(self.items):
-                removed_items.append(self.items.pop(index))
-        if removed_items:
-            self.save()
-        return removed_items
+# Case browser layout; only the rows in view have widgets
+CASE_COLUMNS = 3
+CASE_ROW_HEIGHT = 260
+CASE_IMAGE_SIZE = (150, 150)
+CASE_SEARCH_DELAY_MS = 150
+CASE_SORTS = {
+    "Name": 'name',
+    "Price: low to high": 'price',
+    "Price: high to low": 'price_desc'
+}
 
-class MoneyManager:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.balance = 0.0
-        self.load()
-    
-    def load(self):
-        if os.path.exists(self.file_path):
-            try:
-                with open(self.file_path, 'r') as f:
-                    self.balance = float(f.read())
-            except Exception as e:
-                print(f"Error loading balance: {str(e)}")
-                self.balance = 1000.0
+# Inventory orders: (index sort, descending)
+INVENTORY_SORTS = {
+    "Newest first": ('acquired', True),
+    "Oldest first": ('acquired', False),
+    "Price: high to low": ('price', True),
+    "Price: low to high": ('price', False),
+    "Rarest first": ('rarity', True),
+    "Commonest first": ('rarity', False)
+}
+
+# "Any" choices of the inventory filters and sell-by-query controls
+ANY_RARITY = "any rarity"
+ANY_CASE = "any case"
+
+# How often changes found by the case folder watcher are applied
+CASE_RELOAD_POLL_MS = 500
+# Time the inventory loader may hold the Tk loop before letting it draw
+INVENTORY_LOAD_SLICE_MS = 10
+
+# Number of random items shown before the drop, and how often decoded frames are collected
+ANIMATION_FRAMES = 20
+FRAME_POLL_MS = 15
+
+class VirtualList:
+    # Scrollable list on a Canvas that only keeps enough row widgets to fill
+    # the visible area. Rows are moved and rebound to other keys as the user
+    # scrolls, so the widget count doesn't depend on the number of keys
+    def __init__(self, parent, row_height, create_row, bind_row):
+        self.row_height = row_height
+        self.create_row = create_row
+        self.bind_row = bind_row
+        self.keys = []
+        self.rows = []  # [window id, row handle, bound key]
+        
+        self.canvas = Canvas(parent, highlightthickness=0, yscrollincrement=row_height // 4)
+        self.scrollbar = Scrollbar(parent, orient="vertical", command=self.yview)
+        self.canvas.configure(yscrollcommand=self.scrollbar.set)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        
+        self.canvas.bind("<Configure>", lambda e: self.refresh(force=True))
+        # Rows are children of the canvas, so the wheel is bound globally
+        # and filtered by widget path; add="+" keeps other lists' handlers
+        self.canvas.bind_all("<MouseWheel>", self.on_mousewheel, add="+")
+        self.canvas.bind_all("<Button-4>", self.on_mousewheel, add="+")
+        self.canvas.bind_all("<Button-5>", self.on_mousewheel, add="+")
+    
+    def on_mousewheel(self, event):
+        if not str(event.widget).startswith(str(self.canvas)):
+            return
+        if event.num == 4 or event.delta > 0:
+            self.yview("scroll", -1, "units")
         else:
-            self.balance = 1000.0  # Starting balance
-            self.save()
+            self.yview("scroll", 1, "units")
     
-    def save(self):
-        try:
-            with open(self.file_path, 'w') as f:
-                f.write(str(self.balance))
-        except Exception as e:
-            print(f"Error saving balance: {str(e)}")
-    
-    def add_money(self, amount):
-        self.balance += amount
-        self.save()
-    
-    def deduct_money(self, amount):
-        if self.balance >= amount:
-            self.balance -= amount
-            self.save()
-            return True
-        return False
+    def yview(self, *args):
+        self.canvas.yview(*args)
+        self.refresh()
+    
+    def set_keys(self, keys):
+        self.keys = keys
+        self.canvas.configure(scrollregion=(0, 0, self.canvas.winfo_width(), len(keys) * self.row_height))
+        self.refresh(force=True)
+    
+    def refresh(self, force=False):
+        width = self.canvas.winfo_width()
+        height = max(self.canvas.winfo_height(), self.row_height)
+        first = int(self.canvas.canvasy(0) // self.row_height)
+        visible = height // self.row_height + 2
+        
+        # Grow the pool when the window gets taller, never per key
+        while len(self.rows) < visible:
+            instrument.count("rows.created")
+            handle = self.create_row(self.canvas)
+            window = self.canvas.create_window(0, -self.row_height, window=handle['frame'],
+                                               anchor="nw", height=self.row_height)
+            self.rows.append([window, handle, None])
+        
+        for slot, row in enumerate(self.rows):
+            window, handle, bound_key = row
+            index = first + slot
+            if index < len(self.keys):
+                key = self.keys[index]
+                self.canvas.coords(window, 0, index * self.row_height)
+                self.canvas.itemconfigure(window, width=width)
+                if force or key != bound_key:
+                    instrument.count("rows.bound")
+                    self.bind_row(handle, key)
+                    row[2] = key
+            else:
+                # Park unused rows above the scroll region
+                self.canvas.coords(window, 0, -self.row_height)
+                row[2] = None
 
 class CaseApp:
     def __init__(self, root):
@@ -198,244 +130,426 @@ class CaseApp:
         self.root.title("CasePy")
         self.root.geometry("1000x700")
         
-        # Initialize components
-        self.money_manager = MoneyManager("money.txt")
-        self.inventory = Inventory("inventory.txt")
-        
         # Create cases folder if it doesn't exist
         if not os.path.exists("cases"):
             os.makedirs("cases")
             messagebox.showinfo("Information", "The 'cases' folder has been created. Please add cases to this folder.")
         
+        # Cases are loaded first, inventory entries refer to their items
         self.cases = self.load_cases("cases")
+        self.case_index = CaseIndex(self.cases)
+        
+        # Initialize components
+        self.account = Account("money.txt", "inventory.txt", "ledger.log", self.catalog, load=False)
+        self.money_manager = self.account.money_manager
+        self.inventory = self.account.inventory
+        # Resized images shared by all screens, with thumbnails kept on disk between launches
+        self.images = ImageCache(IMAGE_CACHE_BYTES, THUMBNAIL_DIR, THUMBNAIL_DIR_BYTES)
+        # Worker threads decode images, finished ones come back through frame_queue
+        self.image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS)
+        # The thumbnail folder is trimmed to its budget in the background
+        self.image_pool.submit(self.images.prune_disk)
+        self.frame_queue = queue.Queue()
+        # Case images decoded for the case browser, collected the same way
+        self.case_image_queue = queue.Queue()
+        self.pending_case_images = set()
+        self.case_images_polling = False
+        self.animation_token = 0
+        self.animation_photos = {}
+        
+        # Screens are kept alive between visits and updated through listeners
+        self.screens = {}
+        self.current_screen = None
+        self.balance_labels = []
+        self.case_grid = None
+        self.case_filter_job = None
+        self.inventory_filter_job = None
+        # Selected item ids and their total price, kept up to date on every toggle
+        self.selected_items = set()
+        self.selected_total = 0.0
+        self.inventory_dirty = True
+        self.inventory_refresh_pending = False
+        self.money_manager.add_listener(self.on_balance_changed)
+        self.inventory.add_listener(self.on_inventory_changed)
+        # The inventory streams in block by block from the Tk loop, so the
+        # menu and the first items show up before a large file is read
+        self.root.after_idle(self.load_inventory_step)
+        
+        # Case folders changed on disk are reloaded while the app runs; the
+        # watcher thread hands their names over through case_change_queue
+        self.case_change_queue = queue.Queue()
+        self.case_watcher = CaseWatcher("cases", self.case_change_queue.put)
+        self.root.after(CASE_RELOAD_POLL_MS, self.collect_case_changes)
         
         # Create interface
         self.create_main_menu()
     
+    def load_inventory_step(self):
+        deadline = time.perf_counter() + INVENTORY_LOAD_SLICE_MS / 1000
+        for _ in self.account.loader:
+            if time.perf_counter() >= deadline:
+                self.root.after(1, self.load_inventory_step)
+                return
+        # Done: the summary stops saying "loading"
+        self.on_inventory_changed((), ())
+    
+    def still_loading(self):
+        # Nothing may be bought or sold until the whole inventory is in
+        if self.account.loaded:
+            return False
+        messagebox.showinfo("Information", "Your inventory is still loading, try again in a moment")
+        return True
+    
     def load_cases(self, cases_folder):
-        cases = []
-        if not os.path.exists(cases_folder):
-            return cases
-            
-        for case_folder in os.listdir(cases_folder):
-            folder_path = os.path.join(cases_folder, case_folder)
-            if os.path.isdir(folder_path):
-                case = Case.load_from_folder(folder_path)
-                if case:
-                    cases.append(case)
-        return cases
+        # Cases come back with name, price and image right away, their
+        # items finish loading in the background
+        self.catalog = CaseCatalog(cases_folder)
+        return self.catalog.load()
     
-    def create_main_menu(self):
-        # Clear current interface
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def collect_case_changes(self):
+        names = set()
+        while True:
+            try:
+                names.update(self.case_change_queue.get_nowait())
+            except queue.Empty:
+                break
+        if names:
+            self.reload_cases(names)
+        self.root.after(CASE_RELOAD_POLL_MS, self.collect_case_changes)
+    
+    def reload_cases(self, names):
+        added, removed = self.catalog.reload(names)
+        if not added and not removed:
+            return
         
+        # Images of changed or deleted cases are dropped, not left to age out
+        for case in removed:
+            self.images.invalidate(case.folder_path)
+        self.cases = self.catalog.list_cases()
+        self.case_index = CaseIndex(self.cases)
+        if self.case_grid is not None:
+            self.apply_case_filter(keep_position=True)
+        
+        # Inventory entries point into the catalog, their prices may have changed
+        self.inventory.reset_aggregates()
+        self.inventory_dirty = True
+        if self.current_screen is self.screens.get('inventory'):
+            self.refresh_inventory_view()
+    
+    def show_screen(self, name, build):
+        # Screens are built on first use and kept; switching only repacks frames
+        screen = self.screens.get(name)
+        if screen is None:
+            screen = Frame(self.root)
+            self.screens[name] = screen
+            build(screen)
+        if self.current_screen is not screen:
+            if self.current_screen is not None:
+                self.current_screen.pack_forget()
+            screen.pack(expand=True, fill=BOTH)
+            self.current_screen = screen
+        return screen
+    
+    def create_balance_label(self, parent):
+        label = Label(parent, text=f"Balance: ${self.money_manager.balance:.2f}", 
+                     font=("Arial", 14))
+        self.balance_labels.append(label)
+        return label
+    
+    def on_balance_changed(self, balance):
+        for label in self.balance_labels:
+            label.config(text=f"Balance: ${balance:.2f}")
+        # Only the visible tiles exist, rebinding them updates their Open buttons
+        if self.case_grid is not None:
+            self.case_grid.refresh(force=True)
+    
+    def on_inventory_changed(self, added, removed):
+        for item_id, item in removed:
+            if item_id in self.selected_items:
+                self.selected_items.discard(item_id)
+                self.selected_total -= item['price']
+        # The list is refreshed once per burst of changes, and only while visible
+        self.inventory_dirty = True
+        if self.current_screen is not None and self.current_screen is self.screens.get('inventory') \
+                and not self.inventory_refresh_pending:
+            self.inventory_refresh_pending = True
+            self.root.after_idle(self.refresh_inventory_view)
+    
+    def create_main_menu(self):
+        self.show_screen('menu', self.build_main_menu)
+    
+    def build_main_menu(self, screen):
         # Display balance
-        self.balance_label = Label(self.root, text=f"Balance: ${self.money_manager.balance:.2f}", 
-                                 font=("Arial", 14))
-        self.balance_label.pack(pady=10)
+        self.create_balance_label(screen).pack(pady=10)
         
         # Menu buttons
-        Button(self.root, text="Open Cases", command=self.show_cases, 
+        Button(screen, text="Open Cases", command=self.show_cases, 
               font=("Arial", 12), width=20).pack(pady=5)
-        Button(self.root, text="Inventory", command=self.show_inventory, 
+        Button(screen, text="Inventory", command=self.show_inventory, 
               font=("Arial", 12), width=20).pack(pady=5)
-        Button(self.root, text="Exit", command=self.root.quit, 
+        Button(screen, text="Exit", command=self.root.quit, 
               font=("Arial", 12), width=20).pack(pady=5)
     
     def show_cases(self):
-        # Clear current interface
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
+        self.show_screen('cases', self.build_cases_screen)
+    
+    def build_cases_screen(self, screen):
         # Back button
-        Button(self.root, text="Back", command=self.create_main_menu, 
+        Button(screen, text="Back", command=self.create_main_menu, 
               font=("Arial", 10)).pack(anchor=NW, padx=10, pady=10)
         
         # Display balance
-        self.balance_label = Label(self.root, text=f"Balance: ${self.money_manager.balance:.2f}", 
-                                 font=("Arial", 14))
-        self.balance_label.pack(pady=10)
+        self.create_balance_label(screen).pack(pady=10)
         
         # Title
-        Label(self.root, text="Available Cases", font=("Arial", 16)).pack(pady=10)
-        
-        # Frame for cases
-        cases_frame = Frame(self.root)
-        cases_frame.pack(pady=10)
-        
-        # Display all cases
-        for i, case in enumerate(self.cases):
-            case_frame = Frame(cases_frame, bd=2, relief=RAISED, padx=10, pady=10)
-            case_frame.grid(row=i//3, column=i%3, padx=10, pady=10)
+        Label(screen, text="Available Cases", font=("Arial", 16)).pack(pady=10)
+        
+        # Search and sort controls
+        controls = Frame(screen)
+        controls.pack(fill=X, padx=10, pady=5)
+        Label(controls, text="Search:").pack(side=LEFT)
+        self.case_search = StringVar()
+        self.case_search.trace_add("write", lambda *args: self.schedule_case_filter())
+        Entry(controls, textvariable=self.case_search, width=30).pack(side=LEFT, padx=5)
+        Label(controls, text="Sort by:").pack(side=LEFT, padx=(10, 0))
+        self.case_sort = StringVar(value=next(iter(CASE_SORTS)))
+        sort_box = ttk.Combobox(controls, textvariable=self.case_sort, values=list(CASE_SORTS),
+                                state="readonly", width=20)
+        sort_box.pack(side=LEFT, padx=5)
+        sort_box.bind("<<ComboboxSelected>>", lambda e: self.apply_case_filter())
+        self.case_count_label = Label(controls, font=("Arial", 10))
+        self.case_count_label.pack(side=RIGHT)
+        
+        # Scrollable grid, each list row holds up to CASE_COLUMNS tiles
+        grid_frame = Frame(screen)
+        grid_frame.pack(fill=BOTH, expand=True)
+        self.case_grid = VirtualList(grid_frame, CASE_ROW_HEIGHT, self.create_case_row,
+                                     self.bind_case_row)
+        self.apply_case_filter()
+    
+    def schedule_case_filter(self):
+        # Typing only filters once the user pauses
+        if self.case_filter_job is not None:
+            self.root.after_cancel(self.case_filter_job)
+        self.case_filter_job = self.root.after(CASE_SEARCH_DELAY_MS, self.apply_case_filter)
+    
+    def apply_case_filter(self, keep_position=False):
+        self.case_filter_job = None
+        cases = self.case_index.search(self.case_search.get(), CASE_SORTS[self.case_sort.get()])
+        rows = [tuple(cases[i:i + CASE_COLUMNS]) for i in range(0, len(cases), CASE_COLUMNS)]
+        if not keep_position:
+            self.case_grid.canvas.yview_moveto(0)
+        self.case_grid.set_keys(rows)
+        self.case_count_label.config(text=f"{len(cases)} of {len(self.case_index)} cases")
+    
+    def create_case_row(self, parent):
+        frame = Frame(parent)
+        row = {'frame': frame, 'tiles': []}
+        for column in range(CASE_COLUMNS):
+            frame.columnconfigure(column, weight=1, uniform="case")
+            tile_frame = Frame(frame, bd=2, relief=RAISED, padx=10, pady=10)
+            tile = {'frame': tile_frame, 'case': None}
+            tile['image'] = Label(tile_frame)
+            tile['image'].pack()
+            tile['name'] = Label(tile_frame, font=("Arial", 12))
+            tile['name'].pack()
+            tile['price'] = Label(tile_frame, font=("Arial", 10))
+            tile['price'].pack()
+            tile['button'] = Button(tile_frame, text="Open",
+                                    command=lambda tile=tile: self.open_case(tile['case']))
+            tile['button'].pack()
+            row['tiles'].append(tile)
+        return row
+    
+    def bind_case_row(self, row, cases):
+        for column, tile in enumerate(row['tiles']):
+            if column >= len(cases):
+                tile['case'] = None
+                tile['frame'].grid_remove()
+                continue
             
+            case = cases[column]
+            tile['case'] = case
+            tile['frame'].grid(row=0, column=column, padx=10, pady=10)
+            tile['name'].config(text=case.name)
+            tile['price'].config(text=f"${case.price:.2f}")
+            tile['button'].config(state=NORMAL if self.money_manager.balance >= case.price else DISABLED)
+            
+            photo = self.case_image(case)
+            tile['image'].config(image=photo)
+            tile['image'].image = photo
+    
+    def case_image(self, case):
+        # Decoded images are used right away; others get a placeholder and
+        # are decoded by a worker, the tile is rebound once that finishes
+        key = self.images.make_key(case.image_path, CASE_IMAGE_SIZE, 'gray')
+        if self.images.contains(key):
+            return self.images.photo_by_key(key)
+        
+        if key not in self.pending_case_images:
+            self.pending_case_images.add(key)
+            self.image_pool.submit(self.decode_case_image, key)
+            if not self.case_images_polling:
+                self.case_images_polling = True
+                self.root.after(FRAME_POLL_MS, self.collect_case_images)
+        return self.images.photo(None, CASE_IMAGE_SIZE, 'lightgray')
+    
+    def decode_case_image(self, key):
+        # Runs in a worker thread, like decode_opening_image
+        try:
+            self.images.get_by_key(key)
+        except Exception as e:
+            print(f"Error loading case image: {str(e)}")
+        self.case_image_queue.put(key)
+    
+    def collect_case_images(self):
+        finished = False
+        while True:
             try:
-                img = Image.open(case.image_path)
-                img = img.resize((150, 150), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                
-                img_label = Label(case_frame, image=photo)
-                img_label.image = photo
-                img_label.pack()
-                
-                Label(case_frame, text=case.name, font=("Arial", 12)).pack()
-                Label(case_frame, text=f"${case.price:.2f}", font=("Arial", 10)).pack()
-                
-                Button(case_frame, text="Open", 
-                      command=lambda case_obj=case: self.open_case(case_obj),
-                      state=NORMAL if self.money_manager.balance >= case.price else DISABLED).pack()
-            except Exception as e:
-                print(f"Error loading case image: {str(e)}")
-                # Placeholder for missing image
-                img = Image.new('RGB', (150, 150), color='gray')
-                photo = ImageTk.PhotoImage(img)
-                
-                img_label = Label(case_frame, image=photo)
-                img_label.image = photo
-                img_label.pack()
-                
-                Label(case_frame, text=case.name, font=("Arial", 12)).pack()
-                Label(case_frame, text=f"${case.price:.2f}", font=("Arial", 10)).pack()
-                
-                Button(case_frame, text="Open", 
-                      command=lambda case_obj=case: self.open_case(case_obj),
-                      state=NORMAL if self.money_manager.balance >= case.price else DISABLED).pack()
+                key = self.case_image_queue.get_nowait()
+            except queue.Empty:
+                break
+            self.pending_case_images.discard(key)
+            finished = True
+        
+        # One rebind of the visible tiles per batch of finished images
+        if finished:
+            self.case_grid.refresh(force=True)
+        if self.pending_case_images:
+            self.root.after(FRAME_POLL_MS, self.collect_case_images)
+        else:
+            self.case_images_polling = False
     
     def open_case(self, case):
-        if not self.money_manager.deduct_money(case.price):
+        if self.still_loading():
+            return
+        if self.money_manager.balance < case.price:
             messagebox.showerror("Error", "Not enough funds!")
             return
         
-        self.balance_label.config(text=f"Balance: ${self.money_manager.balance:.2f}")
-        self.show_case_opening_animation(case)
+        # Decide the whole opening up front so its images can be decoded
+        # in the background while the animation is running. The payment
+        # and the drop are saved together
+        frames = [random.choice(case.items) for _ in range(ANIMATION_FRAMES)]
+        final_item = self.select_item_with_rarity(case)
+        with self.account.transaction():
+            self.money_manager.deduct_money(case.price)
+            self.inventory.add_item(final_item)
+        
+        self.prefetch_opening_images(frames, final_item)
+        self.show_case_opening_animation(case, frames, final_item)
     
-    def show_case_opening_animation(self, case):
-        # Clear current interface
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        # Create main frame for animation
-        self.animation_frame = Frame(self.root)
-        self.animation_frame.pack(expand=True, fill=BOTH)
-        
-        # Back button (initially disabled)
-        self.back_button = Button(self.animation_frame, text="Back", 
-                                command=lambda: self.finish_case_opening(case),
-                                state=DISABLED)
-        self.back_button.pack(anchor=NW, padx=10, pady=10)
-        
-        # Display case image
+    def prefetch_opening_images(self, frames, final_item):
+        # Results of an older opening are ignored by their token
+        self.animation_token += 1
+        self.animation_photos = {}
+        requests = {(item['sprite'], (200, 200), 'darkgray') for item in frames}
+        requests.add((final_item['sprite'], (300, 300), 'darkgray'))
+        self.animation_pending = len(requests)
+        
+        for request in requests:
+            self.image_pool.submit(self.decode_opening_image, self.animation_token, request)
+        self.root.after(FRAME_POLL_MS, self.collect_opening_images, self.animation_token)
+    
+    def decode_opening_image(self, token, request):
+        # Runs in a worker thread: decode and resize only, Tk objects are built on the main thread
         try:
-            img = Image.open(case.image_path)
-            img = img.resize((300, 300), Image.LANCZOS)
-            self.case_photo = ImageTk.PhotoImage(img)
-            self.case_label = Label(self.animation_frame, image=self.case_photo)
-            self.case_label.image = self.case_photo
-            self.case_label.pack(pady=20)
+            self.images.get(*request)
         except Exception as e:
-            print(f"Error loading case image: {str(e)}")
-            img = Image.new('RGB', (300, 300), color='gray')
-            self.case_photo = ImageTk.PhotoImage(img)
-            self.case_label = Label(self.animation_frame, image=self.case_photo)
-            self.case_label.image = self.case_photo
-            self.case_label.pack(pady=20)
+            print(f"Error loading item image: {str(e)}")
+        self.frame_queue.put((token, request))
+    
+    def collect_opening_images(self, token):
+        if token != self.animation_token:
+            return
+        while True:
+            try:
+                result_token, request = self.frame_queue.get_nowait()
+            except queue.Empty:
+                break
+            if result_token == token:
+                self.animation_photos[request] = self.images.photo(*request)
+        if len(self.animation_photos) < self.animation_pending:
+            self.root.after(FRAME_POLL_MS, self.collect_opening_images, token)
+    
+    def show_case_opening_animation(self, case, frames, final_item):
+        self.show_screen('opening', self.build_opening_screen)
         
-        # Status label
-        self.status_label = Label(self.animation_frame, text="Opening case...", 
-                                font=("Arial", 14))
-        self.status_label.pack(pady=10)
+        # Back button stays disabled until the final item is shown
+        self.back_button.config(command=lambda: self.finish_case_opening(case), state=DISABLED)
         
-        # Frame for displaying items
-        self.item_frame = Frame(self.animation_frame)
-        self.item_frame.pack(pady=20)
+        # Display case image
+        self.case_photo = self.images.photo(case.image_path, (300, 300), 'gray')
+        self.case_label.config(image=self.case_photo)
+        self.case_label.image = self.case_photo
+        
+        self.status_label.config(text="Opening case...")
+        self.item_label.config(image="")
+        self.item_label.image = None
         
         # Prepare for animation
-        self.animation_items = case.items.copy()
+        self.animation_sequence = frames
+        self.final_item = final_item
         self.animation_counter = 0
         self.is_animation_running = True
         
         # Start animation
         self.animate_case_opening(case)
     
+    def build_opening_screen(self, screen):
+        self.back_button = Button(screen, text="Back", state=DISABLED)
+        self.back_button.pack(anchor=NW, padx=10, pady=10)
+        
+        self.case_label = Label(screen)
+        self.case_label.pack(pady=20)
+        
+        # Status label
+        self.status_label = Label(screen, font=("Arial", 14))
+        self.status_label.pack(pady=10)
+        
+        # Frame for displaying items, one label reused by every frame
+        self.item_frame = Frame(screen)
+        self.item_frame.pack(pady=20)
+        self.item_label = Label(self.item_frame)
+        self.item_label.pack()
+    
     def animate_case_opening(self, case):
         if not self.is_animation_running:
             return
         
-        if self.animation_counter < 20:
-            # Select random item for animation
-            item = random.choice(self.animation_items)
+        if self.animation_counter < len(self.animation_sequence):
+            item = self.animation_sequence[self.animation_counter]
             
-            # Create new frame for current item
-            for widget in self.item_frame.winfo_children():
-                widget.destroy()
-            
-            try:
-                if item['sprite'] and os.path.exists(item['sprite']):
-                    img = Image.open(item['sprite'])
-                else:
-                    img = Image.new('RGB', (200, 200), color='darkgray')
-                
-                img = img.resize((200, 200), Image.LANCZOS)
-                self.current_item_photo = ImageTk.PhotoImage(img)
-                
-                item_label = Label(self.item_frame, image=self.current_item_photo)
-                item_label.image = self.current_item_photo
-                item_label.pack()
-                
-            except Exception as e:
-                print(f"Error loading item image: {str(e)}")
+            # Only swap in frames that are already decoded, a late one just
+            # keeps the previous image on screen
+            photo = self.animation_photos.get((item['sprite'], (200, 200), 'darkgray'))
+            if photo is not None:
+                self.current_item_photo = photo
+                self.item_label.config(image=photo)
+                self.item_label.image = photo
             
             self.animation_counter += 1
             self.root.after(100 + self.animation_counter * 20, lambda: self.animate_case_opening(case))
         else:
             # Animation complete, show final item
             self.is_animation_running = False
-            self.final_item = self.select_item_with_rarity(case.items)
             self.show_final_item(self.final_item)
     
-    def select_item_with_rarity(self, items):
-        rarity_weights = {
-            'common': 50,
-            'uncommon': 30,
-            'rare': 15,
-            'mythical': 4,
-            'legendary': 1
-        }
-        
-        weighted_items = []
-        for item in items:
-            weight = rarity_weights.get(item['rarity'].lower(), 1)
-            weighted_items.extend([item] * weight)
-        
-        return random.choice(weighted_items)
+    def select_item_with_rarity(self, case):
+        return case.sampler.draw()
     
     def show_final_item(self, item):
-        # Clear item frame
-        for widget in self.item_frame.winfo_children():
-            widget.destroy()
+        request = (item['sprite'], (300, 300), 'darkgray')
+        self.final_item_photo = self.animation_photos.get(request)
+        if self.final_item_photo is None:
+            self.final_item_photo = self.images.photo(*request)
+        self.item_label.config(image=self.final_item_photo)
+        self.item_label.image = self.final_item_photo
         
-        try:
-            if item['sprite'] and os.path.exists(item['sprite']):
-                img = Image.open(item['sprite'])
-            else:
-                img = Image.new('RGB', (300, 300), color='darkgray')
-            
-            img = img.resize((300, 300), Image.LANCZOS)
-            self.final_item_photo = ImageTk.PhotoImage(img)
-            
-            final_label = Label(self.item_frame, image=self.final_item_photo)
-            final_label.image = self.final_item_photo
-            final_label.pack()
-            
-            self.status_label.config(text=f"You received: {item['item']} | {item['skin']}\nPrice: ${item['price']:.2f}\nRarity: {item['rarity']}")
-            
-            # Add item to inventory
-            self.inventory.add_item(item)
-            
-            # Enable back button
-            self.back_button.config(state=NORMAL)
-        except Exception as e:
-            print(f"Error loading item image: {str(e)}")
+        self.status_label.config(text=f"You received: {item['item']} | {item['skin']}\nPrice: ${item['price']:.2f}\nRarity: {item['rarity']}")
+        
+        # Enable back button
+        self.back_button.config(state=NORMAL)
     
     def finish_case_opening(self, case):
         # Stop animation if still running
@@ -444,129 +558,290 @@ class CaseApp:
         self.create_main_menu()
     
     def show_inventory(self):
-        for widget in self.root.winfo_children():
-            widget.destroy()
-        
-        Button(self.root, text="Back", command=self.create_main_menu, 
+        self.show_screen('inventory', self.build_inventory_screen)
+        if self.inventory_dirty:
+            self.refresh_inventory_view()
+    
+    def build_inventory_screen(self, screen):
+        Button(screen, text="Back", command=self.create_main_menu, 
               font=("Arial", 10)).pack(anchor=NW, padx=10, pady=10)
         
-        self.balance_label = Label(self.root, text=f"Balance: ${self.money_manager.balance:.2f}", 
-                                 font=("Arial", 14))
-        self.balance_label.pack(pady=10)
+        self.create_balance_label(screen).pack(pady=10)
         
-        Label(self.root, text="Your Inventory", font=("Arial", 16)).pack(pady=10)
+        Label(screen, text="Your Inventory", font=("Arial", 16)).pack(pady=10)
+        self.inventory_summary_label = Label(screen, font=("Arial", 10))
+        self.inventory_summary_label.pack()
         
         # Frame for bulk actions
-        bulk_frame = Frame(self.root)
+        bulk_frame = Frame(screen)
         bulk_frame.pack(fill=X, padx=10, pady=5)
-        
-        self.selected_items = []
         Button(bulk_frame, text="Select All", command=self.select_all_items).pack(side=LEFT)
         Button(bulk_frame, text="Deselect All", command=self.deselect_all_items).pack(side=LEFT, padx=5)
         Button(bulk_frame, text="Sell Selected", command=self.sell_selected_items).pack(side=LEFT)
         
-        if not self.inventory.items:
-            Label(self.root, text="Inventory is empty", font=("Arial", 12)).pack()
+        # Sell by query: every item matching rarity, price limit and case at once
+        query_frame = Frame(screen)
+        query_frame.pack(fill=X, padx=10, pady=5)
+        Label(query_frame, text="Sell all").pack(side=LEFT)
+        self.sell_rarity = StringVar(value=ANY_RARITY)
+        ttk.Combobox(query_frame, textvariable=self.sell_rarity, state="readonly", width=12,
+                     values=[ANY_RARITY] + list(RARITY_WEIGHTS)).pack(side=LEFT, padx=5)
+        Label(query_frame, text="under $").pack(side=LEFT)
+        self.sell_max_price = StringVar()
+        Entry(query_frame, textvariable=self.sell_max_price, width=8).pack(side=LEFT, padx=5)
+        Label(query_frame, text="from").pack(side=LEFT)
+        self.sell_case = StringVar(value=ANY_CASE)
+        self.sell_case_box = ttk.Combobox(query_frame, textvariable=self.sell_case, state="readonly",
+                                          width=24, postcommand=self.update_sell_cases)
+        self.sell_case_box.pack(side=LEFT, padx=5)
+        Button(query_frame, text="Sell Matching", command=self.sell_matching_items).pack(side=LEFT)
+        
+        # Sort and filter controls, answered from the inventory indexes
+        view_frame = Frame(screen)
+        view_frame.pack(fill=X, padx=10, pady=5)
+        Label(view_frame, text="Sort by:").pack(side=LEFT)
+        self.inventory_sort = StringVar(value=next(iter(INVENTORY_SORTS)))
+        sort_box = ttk.Combobox(view_frame, textvariable=self.inventory_sort, state="readonly",
+                                width=18, values=list(INVENTORY_SORTS))
+        sort_box.pack(side=LEFT, padx=5)
+        sort_box.bind("<<ComboboxSelected>>", lambda e: self.apply_inventory_filter())
+        Label(view_frame, text="Show").pack(side=LEFT, padx=(10, 0))
+        self.inventory_rarity = StringVar(value=ANY_RARITY)
+        rarity_box = ttk.Combobox(view_frame, textvariable=self.inventory_rarity, state="readonly",
+                                  width=12, values=[ANY_RARITY] + list(RARITY_WEIGHTS))
+        rarity_box.pack(side=LEFT, padx=5)
+        rarity_box.bind("<<ComboboxSelected>>", lambda e: self.apply_inventory_filter())
+        Label(view_frame, text="from").pack(side=LEFT)
+        self.inventory_case = StringVar(value=ANY_CASE)
+        self.inventory_case_box = ttk.Combobox(view_frame, textvariable=self.inventory_case,
+                                               state="readonly", width=24,
+                                               postcommand=self.update_inventory_cases)
+        self.inventory_case_box.pack(side=LEFT, padx=5)
+        self.inventory_case_box.bind("<<ComboboxSelected>>", lambda e: self.apply_inventory_filter())
+        Label(view_frame, text="Name:").pack(side=LEFT, padx=(10, 0))
+        self.inventory_search = StringVar()
+        self.inventory_search.trace_add("write", lambda *args: self.schedule_inventory_filter())
+        Entry(view_frame, textvariable=self.inventory_search, width=20).pack(side=LEFT, padx=5)
+        
+        list_frame = Frame(screen)
+        list_frame.pack(fill=BOTH, expand=True)
+        self.inventory_list = VirtualList(list_frame, 130, self.create_inventory_row,
+                                          self.bind_inventory_row)
+    
+    def update_sell_cases(self):
+        # Filled when the list opens, so reloaded cases show up
+        self.sell_case_box.config(values=[ANY_CASE] + sorted(self.catalog.cases_by_name))
+    
+    def update_inventory_cases(self):
+        # Only cases something is owned from
+        cases = sorted(case for case, count in self.inventory.case_counts.items() if count and case)
+        self.inventory_case_box.config(values=[ANY_CASE] + cases)
+    
+    def schedule_inventory_filter(self):
+        # Name search scans the inventory, so it waits for the user to pause
+        if self.inventory_filter_job is not None:
+            self.root.after_cancel(self.inventory_filter_job)
+        self.inventory_filter_job = self.root.after(CASE_SEARCH_DELAY_MS, self.apply_inventory_filter)
+    
+    def apply_inventory_filter(self):
+        self.inventory_filter_job = None
+        self.inventory_list.canvas.yview_moveto(0)
+        self.refresh_inventory_view()
+    
+    def inventory_query(self):
+        sort, descending = INVENTORY_SORTS[self.inventory_sort.get()]
+        rarity = self.inventory_rarity.get()
+        case = self.inventory_case.get()
+        return self.inventory.index.query(sort, descending,
+                                          rarity=None if rarity == ANY_RARITY else rarity,
+                                          case=None if case == ANY_CASE else case,
+                                          name=self.inventory_search.get().strip())
+    
+    def create_inventory_row(self, parent):
+        frame = Frame(parent, bd=2, relief=RAISED, padx=10, pady=10)
+        var = BooleanVar(value=False)
+        row = {'frame': frame, 'var': var, 'item_id': None, 'hidden': False}
+        
+        Checkbutton(frame, variable=var,
+                   command=lambda: self.toggle_item_selection(row['item_id'], var.get())
+                   ).grid(row=0, column=0, rowspan=3)
+        
+        row['image'] = Label(frame)
+        row['image'].grid(row=0, column=1, rowspan=3, padx=10)
+        row['name'] = Label(frame, font=("Arial", 12))
+        row['name'].grid(row=0, column=2, sticky=W)
+        row['price'] = Label(frame, font=("Arial", 10))
+        row['price'].grid(row=1, column=2, sticky=W)
+        row['rarity'] = Label(frame, font=("Arial", 10))
+        row['rarity'].grid(row=2, column=2, sticky=W)
+        
+        Button(frame, text="Sell", command=lambda: self.sell_item(row['item_id'])
+              ).grid(row=0, column=3, rowspan=3, padx=10)
+        frame.columnconfigure(2, weight=1)
+        return row
+    
+    def bind_inventory_row(self, row, item_id):
+        item = self.inventory.get(item_id)
+        if item is None:
+            # Gone since the keys were set: the row must not keep acting on
+            # the item it showed before, so it is emptied until rebound
+            row['item_id'] = None
+            row['var'].set(False)
+            if not row['hidden']:
+                row['hidden'] = True
+                for widget in row['frame'].winfo_children():
+                    widget.grid_remove()
             return
         
-        canvas = Canvas(self.root)
-        scrollbar = Scrollbar(self.root, orient="vertical", command=canvas.yview)
-        scrollable_frame = Frame(canvas)
-        
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(
-                scrollregion=canvas.bbox("all")
-            )
-        )
-        
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
-        
-        self.item_vars = []
-        for i, item in enumerate(self.inventory.items):
-            item_frame = Frame(scrollable_frame, bd=2, relief=RAISED, padx=10, pady=10)
-            item_frame.pack(fill=X, padx=10, pady=5)
-            
-            # Checkbox variable
-            var = BooleanVar(value=False)
-            self.item_vars.append(var)
-            
-            Checkbutton(item_frame, variable=var, 
-                       command=lambda idx=i: self.toggle_item_selection(idx)).grid(row=0, column=0, rowspan=3)
-            
-            try:
-                if item['sprite'] and os.path.exists(item['sprite']):
-                    img = Image.open(item['sprite'])
-                else:
-                    img = Image.new('RGB', (100, 100), color='gray')
-                
-                img = img.resize((100, 100), Image.LANCZOS)
-                photo = ImageTk.PhotoImage(img)
-                
-                img_label = Label(item_frame, image=photo)
-                img_label.image = photo
-                img_label.grid(row=0, column=1, rowspan=3, padx=10)
-                
-                Label(item_frame, text=f"{item['item']} | {item['skin']}", 
-                     font=("Arial", 12)).grid(row=0, column=2, sticky=W)
-                Label(item_frame, text=f"Price: ${item['price']:.2f}", 
-                     font=("Arial", 10)).grid(row=1, column=2, sticky=W)
-                Label(item_frame, text=f"Rarity: {item['rarity']}", 
-                     font=("Arial", 10)).grid(row=2, column=2, sticky=W)
-                
-                Button(item_frame, text="Sell", 
-                      command=lambda idx=i: self.sell_item(idx)).grid(row=0, column=3, rowspan=3, padx=10)
-            except Exception as e:
-                print(f"Error loading inventory item: {str(e)}")
-    
-    def toggle_item_selection(self, index):
-        if 0 <= index < len(self.item_vars):
-            if self.item_vars[index].get():
-                if index not in self.selected_items:
-                    self.selected_items.append(index)
-            else:
-                if index in self.selected_items:
-                    self.selected_items.remove(index)
+        if row['hidden']:
+            row['hidden'] = False
+            for widget in row['frame'].winfo_children():
+                widget.grid()
+        row['item_id'] = item_id
+        row['var'].set(item_id in self.selected_items)
+        row['name'].config(text=f"{item['item']} | {item['skin']}")
+        row['price'].config(text=f"Price: ${item['price']:.2f}")
+        row['rarity'].config(text=f"Rarity: {item['rarity']}")
+        
+        photo = self.images.photo(item.get('sprite'), (100, 100), 'gray')
+        row['image'].config(image=photo)
+        row['image'].image = photo
+    
+    def refresh_inventory_view(self):
+        self.inventory_refresh_pending = False
+        self.inventory_dirty = False
+        item_ids = self.inventory_query()
+        if not self.account.loaded:
+            self.inventory_summary_label.config(
+                text=f"Loading inventory... {len(self.inventory)} items so far", font=("Arial", 10))
+        elif not self.inventory.items:
+            self.inventory_summary_label.config(text="Inventory is empty", font=("Arial", 12))
+        elif len(item_ids) < len(self.inventory):
+            self.inventory_summary_label.config(
+                text=f"Showing {len(item_ids)} of {len(self.inventory)} items "
+                     f"worth ${self.inventory.total_value:.2f}",
+                font=("Arial", 10))
+        else:
+            self.inventory_summary_label.config(
+                text=f"{len(self.inventory)} items worth ${self.inventory.total_value:.2f}",
+                font=("Arial", 10))
+        self.inventory_list.set_keys(item_ids)
+    
+    def toggle_item_selection(self, item_id, selected):
+        item = self.inventory.get(item_id)
+        if item is None:
+            return
+        if selected:
+            if item_id not in self.selected_items:
+                self.selected_items.add(item_id)
+                self.selected_total += item['price']
+        elif item_id in self.selected_items:
+            self.selected_items.discard(item_id)
+            self.selected_total -= item['price']
     
     def select_all_items(self):
-        self.selected_items = list(range(len(self.inventory.items)))
-        for var in self.item_vars:
-            var.set(True)
+        # Selects what is shown, so a filter narrows what gets sold
+        item_ids = self.inventory_list.keys
+        if len(item_ids) == len(self.inventory):
+            self.selected_items = set(self.inventory.items)
+            self.selected_total = self.inventory.total_value
+        else:
+            self.selected_items = set(item_ids)
+            self.selected_total = sum(self.inventory.index.fields[item_id][0] for item_id in item_ids)
+        self.inventory_list.refresh(force=True)
     
     def deselect_all_items(self):
-        self.selected_items = []
-        for var in self.item_vars:
-            var.set(False)
+        self.selected_items = set()
+        self.selected_total = 0.0
+        self.inventory_list.refresh(force=True)
     
     def sell_selected_items(self):
+        if self.still_loading():
+            return
         if not self.selected_items:
             messagebox.showwarning("Warning", "No items selected!")
             return
         
-        total_price = sum(self.inventory.items[i]['price'] for i in self.selected_items)
         if messagebox.askyesno("Confirmation", 
-                             f"Are you sure you want to sell {len(self.selected_items)} items for ${total_price:.2f}?"):
-            sold_items = self.inventory.remove_items(self.selected_items)
+                             f"Are you sure you want to sell {len(self.selected_items)} items for ${self.selected_total:.2f}?"):
+            # The inventory listener drops sold items from the selection
+            sold_items, total = self.account.sell_items(list(self.selected_items))
             if sold_items:
-                total = sum(item['price'] for item in sold_items)
-                self.money_manager.add_money(total)
-                self.balance_label.config(text=f"Balance: ${self.money_manager.balance:.2f}")
                 messagebox.showinfo("Success", f"Sold {len(sold_items)} items for ${total:.2f}")
-                self.show_inventory()  # Refresh interface
-    
-    def sell_item(self, index):
-        item = self.inventory.remove_item(index)
-        if item:
-            self.money_manager.add_money(item['price'])
-            self.balance_label.config(text=f"Balance: ${self.money_manager.balance:.2f}")
-            self.show_inventory()
-            messagebox.showinfo("Success", f"Item sold for ${item['price']:.2f}")
+    
+    def sell_matching_items(self):
+        if self.still_loading():
+            return
+        rarity = self.sell_rarity.get()
+        case = self.sell_case.get()
+        try:
+            max_price = float(self.sell_max_price.get()) if self.sell_max_price.get().strip() else None
+        except ValueError:
+            messagebox.showerror("Error", "Price must be a number!")
+            return
+        predicate = item_filter(rarity=None if rarity == ANY_RARITY else rarity,
+                                max_price=max_price,
+                                case=None if case == ANY_CASE else case)
+        
+        item_ids = self.inventory.find_where(predicate)
+        if not item_ids:
+            messagebox.showinfo("Information", "No items match")
+            return
+        total = sum(self.inventory.get(item_id)['price'] for item_id in item_ids)
+        if messagebox.askyesno("Confirmation",
+                             f"Are you sure you want to sell {len(item_ids)} items for ${total:.2f}?"):
+            sold_items, total = self.account.sell_items(item_ids)
+            messagebox.showinfo("Success", f"Sold {len(sold_items)} items for ${total:.2f}")
+    
+    def sell_item(self, item_id):
+        if self.still_loading():
+            return
+        sold_items, total = self.account.sell_items([item_id])
+        if sold_items:
+            messagebox.showinfo("Success", f"Item sold for ${total:.2f}")
 
-if __name__ == "__main__":
+def instrument_hot_paths():
+    # Wraps the methods worth watching with timers; only called when
+    # instrumentation is on, so they run unwrapped otherwise
+    instrument.instrument_methods(CaseApp, ['load_cases', 'create_main_menu', 'show_cases',
+                                            'open_case', 'show_case_opening_animation',
+                                            'show_final_item', 'show_inventory',
+                                            'refresh_inventory_view', 'sell_selected_items',
+                                            'sell_matching_items', 'load_inventory_step'])
+    instrument.instrument_methods(InventoryIndex, ['query'])
+    instrument.instrument_methods(VirtualList, ['refresh'])
+    instrument.instrument_methods(CaseIndex, ['search'])
+    instrument.instrument_methods(CaseCatalog, ['load'])
+    # load() goes through load_blocks() too, which the window steps through directly
+    instrument.instrument_methods(Inventory, ['load_blocks', 'save', 'compact', 'append_records'])
+    instrument.instrument_methods(MoneyManager, ['save', 'write_file'])
+    instrument.instrument_methods(Account, ['checkpoint', 'sell_items'])
+    instrument.instrument_methods(Ledger, ['write_batch'])
+    instrument.instrument_methods(ImageCache, ['load', 'photo_by_key'])
+
+def run_app(argv=()):
+    # CASEPY_PROFILE=1 or --profile turns on timing, see instrument.py
+    profiling = instrument.enable_from_env(argv)
+    if profiling:
+        instrument_hot_paths()
     root = Tk()
-    app = CaseApp(root)
+    try:
+        app = CaseApp(root)
+    except AccountLockedError as e:
+        # Another window or a command line run has the account open
+        messagebox.showerror("Error", str(e))
+        root.destroy()
+        return
+    if profiling:
+        instrument.watch_tk(root)
+        instrument.gauge("images.hits", lambda: app.images.hits)
+        instrument.gauge("images.misses", lambda: app.images.misses)
+        instrument.gauge("ledger.writes", lambda: app.account.ledger.writes)
+        instrument.gauge("inventory.items", lambda: len(app.inventory))
     root.mainloop()
+    app.case_watcher.close()
+    # Fold the ledger into money.txt and inventory.txt on a clean exit
+    app.account.close()
+
+if __name__ == "__main__":
+    run_app(sys.argv[1:])
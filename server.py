@@ -0,0 +1,618 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import re
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import parse_qs, urlsplit
+
+from engine import BulkOpener
+from ledger import Ledger, merge_change
+from core import Account, AccountLock, AccountLockedError, CaseCatalog, item_filter
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Accounts kept loaded at once; the least recently used ones are closed
+DEFAULT_MAX_OPEN = 4096
+# Records in the shared ledger before every changed account is written out
+CHECKPOINT_RECORDS = 50000
+# Threads loading and closing accounts
+IO_WORKERS = 8
+# Opening more cases than this at once returns counts instead of every item
+MAX_ITEMS_IN_RESPONSE = 100
+# Openings are drawn and logged on the event loop, so one request is kept
+# to a few milliseconds of it; bigger batches belong to engine.py
+MAX_OPEN_COUNT = 10_000
+MAX_BODY_SIZE = 1024 * 1024
+DEFAULT_PAGE_SIZE = 100
+USER_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")
+SELL_QUERY_FIELDS = ('rarity', 'max_price', 'min_price', 'case', 'name')
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    409: "Conflict",
+    413: "Payload Too Large",
+    500: "Internal Server Error"
+}
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class UserLedger:
+    # Stands in for an account's own Ledger. Changes are tagged with the
+    # user and go to the ledger shared by every account on the server, so
+    # one write and fsync commits the requests of all users in a batch.
+    # The shared log is only emptied by AccountPool.checkpoint
+    def __init__(self, ledger, user, on_change, records=()):
+        self.ledger = ledger
+        self.user = user
+        self.on_change = on_change
+        self.records = list(records)
+        self.record = None
+
+    @contextmanager
+    def transaction(self):
+        # Requests run on the event loop thread, so no thread-local is needed
+        if self.record is not None:
+            yield
+            return
+        self.record = {}
+        try:
+            yield
+        finally:
+            record = self.record
+            self.record = None
+            if record:
+                self.submit(record)
+
+    def record_balance(self, balance):
+        self.stage({'b': balance})
+
+    def record_items(self, added=(), removed=()):
+        change = {}
+        if added:
+            change['a'] = [[item_id, item] for item_id, item in added]
+        if removed:
+            change['d'] = list(removed)
+        if change:
+            self.stage(change)
+
+    def stage(self, change):
+        if self.record is None:
+            self.submit(change)
+        else:
+            merge_change(self.record, change)
+
+    def submit(self, record):
+        record['u'] = self.user
+        self.on_change(self.user)
+        self.ledger.submit(record)
+
+    def flush(self):
+        self.ledger.flush()
+
+    def reset(self):
+        self.records = []
+
+    def close(self):
+        pass
+
+class UserSession:
+    # One loaded account: its balance and inventory plus the opener that
+    # draws its cases
+    def __init__(self, user, folder, catalog, ledger, seed=None):
+        self.user = user
+        self.account = Account(os.path.join(folder, "money.txt"),
+                               os.path.join(folder, "inventory.txt"),
+                               None, catalog, ledger=ledger)
+        self.opener = BulkOpener(self.account.money_manager, self.account.inventory, seed)
+
+class AccountPool:
+    # Per-user state for the server. Every user has a folder under data_dir
+    # with the same money.txt and inventory.txt the desktop app uses, and an
+    # asyncio lock so only one request at a time changes their account.
+    # Changes of all users go through one ledger in data_dir. At most
+    # max_open accounts are loaded; idle ones are checkpointed and closed in
+    # a worker thread, and a user coming back waits for that first
+    def __init__(self, data_dir, catalog, max_open=DEFAULT_MAX_OPEN, seed=None,
+                 checkpoint_records=CHECKPOINT_RECORDS):
+        self.data_dir = data_dir
+        self.catalog = catalog
+        self.max_open = max_open
+        self.seed = seed
+        self.sessions = OrderedDict()  # user -> UserSession, least recently used first
+        self.locks = {}
+        self.closing = {}  # user -> concurrent future of the close still running
+        self.dirty = set()  # users changed since the last checkpoint
+        self.checkpointing = None  # task writing the accounts of the last checkpoint
+        self.executor = ThreadPoolExecutor(max_workers=IO_WORKERS)
+        os.makedirs(data_dir, exist_ok=True)
+        # Accounts share the pool's ledger, so one lock covers all of them;
+        # a second server on the same data_dir stops here
+        ledger_path = os.path.join(data_dir, "ledger.log")
+        self.file_lock = AccountLock(ledger_path)
+        self.ledger = Ledger(ledger_path,
+                             checkpoint_records=checkpoint_records, on_checkpoint=self.checkpoint)
+        self.recover()
+
+    def recover(self):
+        # Applies what a crash left in the shared ledger to the users' files
+        pending = {}
+        for record in self.ledger.records:
+            pending.setdefault(record.get('u'), []).append(record)
+        for user, records in pending.items():
+            if user is None or not USER_NAME.fullmatch(user):
+                continue
+            folder = os.path.join(self.data_dir, user)
+            os.makedirs(folder, exist_ok=True)
+            ledger = UserLedger(self.ledger, user, self.dirty.add, records)
+            UserSession(user, folder, self.catalog, ledger).account.close()
+        if pending:
+            print(f"Recovered changes of {len(pending)} users from the ledger")
+        self.ledger.reset()
+        self.dirty.clear()
+
+    def lock(self, user):
+        lock = self.locks.get(user)
+        if lock is None:
+            lock = self.locks[user] = asyncio.Lock()
+        return lock
+
+    def open_session(self, user):
+        folder = os.path.join(self.data_dir, user)
+        os.makedirs(folder, exist_ok=True)
+        # Every user gets their own stream of draws, reproducible with a seed
+        seed = None if self.seed is None else [self.seed, zlib.crc32(user.encode('utf-8'))]
+        return UserSession(user, folder, self.catalog,
+                           UserLedger(self.ledger, user, self.dirty.add), seed)
+
+    async def get(self, user):
+        # Must be called with the user's lock held
+        session = self.sessions.get(user)
+        if session is not None:
+            self.sessions.move_to_end(user)
+            return session
+
+        loop = asyncio.get_running_loop()
+        closing = self.closing.pop(user, None)
+        if closing is not None:
+            await asyncio.wrap_future(closing)
+        session = await loop.run_in_executor(self.executor, self.open_session, user)
+        self.sessions[user] = session
+        self.evict()
+        return session
+
+    def evict(self):
+        for user in list(self.sessions):
+            if len(self.sessions) <= self.max_open:
+                break
+            if self.locks[user].locked():
+                continue
+            session = self.sessions.pop(user)
+            self.closing[user] = self.executor.submit(session.account.close)
+
+    def flushed(self, loop):
+        # Future resolved once everything submitted so far is on disk
+        future = loop.create_future()
+
+        def done(error):
+            loop.call_soon_threadsafe(self.finish, future, error)
+
+        self.ledger.on_flushed(self.ledger.submitted, done)
+        return future
+
+    @staticmethod
+    def finish(future, error):
+        if future.done():
+            return
+        if error is None:
+            future.set_result(None)
+        else:
+            future.set_exception(error)
+
+    def checkpoint(self):
+        # Called by the ledger, on the event loop, when it gets long. Only a
+        # rotation is queued here, the commit thread moves the log; the
+        # accounts changed since the last checkpoint are written out by
+        # write_files in the worker threads. While one checkpoint is still
+        # running the next one waits, the log keeps growing
+        if self.checkpointing is not None:
+            return
+        rotation = self.ledger.rotate()
+        self.closing = {user: future for user, future in self.closing.items() if not future.done()}
+        users = self.dirty
+        self.dirty = set()
+        self.checkpointing = asyncio.ensure_future(self.write_files(users, rotation))
+
+    async def write_files(self, users, rotation):
+        # Every account is written under its user's lock, so only that user's
+        # requests wait; the rotated log goes once all of them are on disk
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self.executor, self.ledger.wait_for, rotation)
+            for user in users:
+                async with self.lock(user):
+                    closing = self.closing.pop(user, None)
+                    if closing is not None:
+                        # Being closed, which writes its files anyway
+                        await asyncio.wrap_future(closing)
+                        continue
+                    session = self.sessions.get(user)
+                    if session is not None:
+                        await loop.run_in_executor(self.executor, session.account.checkpoint)
+            self.ledger.drop_rotated()
+        except Exception as e:
+            print(f"Error writing accounts: {str(e)}")
+            # Written again by the next checkpoint, the rotated log stays until then
+            self.dirty |= users
+        finally:
+            self.checkpointing = None
+
+    async def close(self):
+        loop = asyncio.get_running_loop()
+        if self.checkpointing is not None:
+            await self.checkpointing
+        sessions = list(self.sessions.values())
+        self.sessions.clear()
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in self.closing.values()),
+                             *(loop.run_in_executor(self.executor, session.account.close)
+                               for session in sessions))
+        self.closing = {}
+        self.ledger.reset()
+        self.ledger.close()
+        self.executor.shutdown()
+        self.file_lock.release()
+
+class CaseServer:
+    # HTTP/1.1 + JSON front end over AccountPool. Keep-alive connections are
+    # served one request at a time; requests of different users run
+    # concurrently and only wait for each other on disk, inside the ledgers
+    #
+    #   GET  /cases                          names, prices and item counts
+    #   GET  /users/<user>                   balance and inventory summary
+    #   GET  /users/<user>/inventory?offset=&limit=
+    #   POST /users/<user>/open              {"case": name, "count": n}
+    #   POST /users/<user>/sell              {"ids": [...]} or {"rarity": "common", "max_price": 5}
+    #
+    # Replies to changing requests are sent once the change is on disk
+    def __init__(self, catalog, pool):
+        self.catalog = catalog
+        self.pool = pool
+        self.requests = 0
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except RequestError as e:
+                    # The body is left unread, so the connection can't be reused
+                    await self.respond(writer, e.status, {'error': str(e)}, False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                try:
+                    status, payload = 200, await self.dispatch(method, path, body)
+                except RequestError as e:
+                    status, payload = e.status, {'error': str(e)}
+                except Exception as e:
+                    print(f"Error handling {method} {path}: {str(e)}")
+                    status, payload = 500, {'error': str(e)}
+                self.requests += 1
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer, status, payload, keep_alive):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                     f"Content-Type: application/json\r\n"
+                     f"Content-Length: {len(data)}\r\n"
+                     f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode()
+                     + data)
+        await writer.drain()
+
+    async def read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split(' ', 2)
+        except ValueError:
+            return None
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            length = -1
+        if length < 0:
+            raise RequestError(400, "Invalid Content-Length")
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, f"Body is larger than {MAX_BODY_SIZE} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method, target, headers, body
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+
+        if parts == ['cases']:
+            self.require(method, 'GET')
+            return {'cases': [{'name': case.name, 'price': case.price, 'items': len(case.items)}
+                              for case in self.catalog.list_cases()]}
+
+        if len(parts) in (2, 3) and parts[0] == 'users':
+            user = parts[1]
+            if not USER_NAME.fullmatch(user):
+                raise RequestError(400, "Invalid user name")
+            action = parts[2] if len(parts) == 3 else 'summary'
+            handler = {
+                'summary': ('GET', self.summary),
+                'inventory': ('GET', self.list_inventory),
+                'open': ('POST', self.open_cases),
+                'sell': ('POST', self.sell_items)
+            }.get(action)
+            if handler is None:
+                raise RequestError(404, f"Unknown action {action}")
+            self.require(method, handler[0])
+            data = self.parse_body(body) if method == 'POST' else query
+            return await self.run_for_user(user, handler[1], data)
+
+        raise RequestError(404, f"Unknown path {url.path}")
+
+    @staticmethod
+    def require(method, expected):
+        if method != expected:
+            raise RequestError(405, f"Use {expected}")
+
+    @staticmethod
+    def parse_body(body):
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            raise RequestError(400, "Body must be JSON")
+        if not isinstance(data, dict):
+            raise RequestError(400, "Body must be a JSON object")
+        return data
+
+    async def run_for_user(self, user, handler, data):
+        # The account is changed under the user's lock; the reply waits for
+        # the ledger outside it, so the user's next request can already run
+        # and join the same group commit
+        async with self.pool.lock(user):
+            session = await self.pool.get(user)
+            result, changed = handler(session, data)
+            durable = self.pool.flushed(asyncio.get_running_loop()) if changed else None
+        if durable is not None:
+            await durable
+        return result
+
+    def summary(self, session, data):
+        inventory = session.account.inventory
+        return {
+            'balance': session.account.money_manager.balance,
+            'items': len(inventory),
+            'value': inventory.total_value,
+            'rarities': dict(inventory.rarity_counts)
+        }, False
+
+    def list_inventory(self, session, data):
+        try:
+            offset = max(0, int(data.get('offset', 0)))
+            limit = max(0, min(int(data.get('limit', DEFAULT_PAGE_SIZE)), 10 * DEFAULT_PAGE_SIZE))
+        except ValueError:
+            raise RequestError(400, "offset and limit must be integers")
+        inventory = session.account.inventory
+        page = itertools.islice(inventory.items.items(), offset, offset + limit)
+        return {
+            'total': len(inventory),
+            'offset': offset,
+            'items': [self.export_item(item_id, item) for item_id, item in page]
+        }, False
+
+    def open_cases(self, session, data):
+        case = self.catalog.cases_by_name.get(data.get('case'))
+        if case is None:
+            raise RequestError(404, f"Unknown case {data.get('case')!r}")
+        count = data.get('count', 1)
+        # JSON true and false arrive as bool, which is an int subclass
+        if isinstance(count, bool) or not isinstance(count, int) or not 0 < count <= MAX_OPEN_COUNT:
+            raise RequestError(400, f"count must be between 1 and {MAX_OPEN_COUNT}")
+
+        result = session.opener.open_cases(case, count)
+        if result is None:
+            raise RequestError(409, "Not enough funds")
+        response = {
+            'case': case.name,
+            'count': count,
+            'cost': result['cost'],
+            'value': result['value'],
+            'balance': session.account.money_manager.balance
+        }
+        if count <= MAX_ITEMS_IN_RESPONSE:
+            inventory = session.account.inventory
+            response['items'] = [self.export_item(item_id, inventory.get(item_id))
+                                 for item_id in result['ids']]
+        else:
+            response['counts'] = {name: n for name, n in result['counts'].items() if n}
+        return response, True
+
+    def sell_items(self, session, data):
+        # Either explicit ids or a query: {"rarity": ..., "max_price": ..., "case": ...}
+        account = session.account
+        if 'ids' in data:
+            ids = data['ids']
+            if not isinstance(ids, list) or not all(isinstance(item_id, int) and not isinstance(item_id, bool)
+                                                    for item_id in ids):
+                raise RequestError(400, "ids must be a list of item ids")
+            sold, total = account.sell_items(ids)
+        else:
+            query = {key: data.get(key) for key in SELL_QUERY_FIELDS}
+            if all(value is None for value in query.values()):
+                raise RequestError(400, "Give ids or at least one of " + ", ".join(SELL_QUERY_FIELDS))
+            try:
+                sold, total = account.sell_where(item_filter(**query))
+            except (TypeError, AttributeError):
+                raise RequestError(400, "Invalid sell query")
+        return {'sold': len(sold), 'total': total, 'balance': account.money_manager.balance}, bool(sold)
+
+    @staticmethod
+    def export_item(item_id, item):
+        return {
+            'id': item_id,
+            'case': item['case'],
+            'item': item['item'],
+            'skin': item['skin'],
+            'price': item['price'],
+            'rarity': item['rarity']
+        }
+
+async def serve(args):
+    catalog = CaseCatalog(args.cases)
+    cases = catalog.load()
+    for case in cases:
+        case.sampler  # Compile every drop table before the first request
+    pool = AccountPool(args.data, catalog, args.max_open, args.seed)
+    app = CaseServer(catalog, pool)
+    server = await asyncio.start_server(app.handle_connection, args.host, args.port,
+                                        backlog=1024)
+    print(f"Serving {len(cases)} cases on http://{args.host}:{args.port}, user data in {args.data}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await pool.close()
+
+# Load harness
+
+async def request(reader, writer, host, method, path, payload=None):
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode()
+                 + body)
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    return status, json.loads(await reader.readexactly(length))
+
+async def run_load(args):
+    from bench import print_results, summarize
+
+    connection = await asyncio.open_connection(args.host, args.port)
+    status, data = await request(*connection, args.host, 'GET', '/cases')
+    connection[1].close()
+    cases = [case['name'] for case in data['cases']]
+    if not cases:
+        print("The server has no cases")
+        return 1
+
+    rng = random.Random(args.seed)
+    users = [f"{args.user_prefix}{i}" for i in range(args.users)]
+    latencies = []
+    statuses = {}
+    sold = 0
+
+    async def client(client_id, requests):
+        nonlocal sold
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        try:
+            for _ in range(requests):
+                user = rng.choice(users)
+                start = time.perf_counter()
+                status, data = await request(reader, writer, args.host, 'POST', f'/users/{user}/open',
+                                             {'case': rng.choice(cases), 'count': args.count})
+                latencies.append(time.perf_counter() - start)
+                statuses[status] = statuses.get(status, 0) + 1
+                # Sell now and then so balances don't run out
+                if status == 200 and rng.random() < args.sell_ratio:
+                    start = time.perf_counter()
+                    status, data = await request(reader, writer, args.host, 'POST', f'/users/{user}/sell',
+                                                 {'ids': [item['id'] for item in data.get('items', ())]})
+                    latencies.append(time.perf_counter() - start)
+                    statuses[status] = statuses.get(status, 0) + 1
+                    sold += data.get('sold', 0)
+        finally:
+            writer.close()
+
+    per_client, extra = divmod(args.requests, args.connections)
+    start = time.perf_counter()
+    await asyncio.gather(*(client(i, per_client + (i < extra)) for i in range(args.connections)))
+    elapsed = time.perf_counter() - start
+
+    # Throughput over wall time, the latencies overlap across connections
+    result = summarize("server.requests", latencies)
+    result['ops_per_s'] = len(latencies) / elapsed
+    print_results([result])
+    print(f"{len(latencies)} requests in {elapsed:.2f}s over {args.connections} connections, "
+          f"{args.users} users; status codes {statuses}; {sold} items sold back")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-user case opening server (HTTP/JSON)")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Run the server")
+    serve_parser.add_argument("--cases", default="cases", help="Cases folder")
+    serve_parser.add_argument("--data", default="users", help="Folder for per-user balances and inventories")
+    serve_parser.add_argument("--max-open", type=int, default=DEFAULT_MAX_OPEN,
+                              help="Accounts kept loaded at once")
+    serve_parser.add_argument("--seed", type=int, default=None, help="Seed for reproducible draws")
+
+    load_parser = commands.add_parser("load", help="Drive a running server with concurrent clients")
+    load_parser.add_argument("--users", type=int, default=100)
+    load_parser.add_argument("--user-prefix", default="load")
+    load_parser.add_argument("--connections", type=int, default=50)
+    load_parser.add_argument("--requests", type=int, default=10000)
+    load_parser.add_argument("--count", type=int, default=1, help="Cases opened per request")
+    load_parser.add_argument("--sell-ratio", type=float, default=0.5,
+                             help="Share of openings whose drops are sold right away")
+    load_parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        if args.command == "serve":
+            asyncio.run(serve(args))
+            return 0
+        return asyncio.run(run_load(args))
+    except KeyboardInterrupt:
+        return 0
+    except AccountLockedError as e:
+        print(str(e))
+        return 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,47 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+CASES = {
+    "Alpha Case": ("5.00", ["AK-47;Redline;12.50;rare", "Glock;Sand;0.50;common",
+                            "AWP;Dragon Lore;2500.00;legendary"]),
+    "Beta Case": ("2.50", ["M4A4;Howl;1000.00;mythical", "P90;Grim;1.25;uncommon"])
+}
+
+def write_case(folder, name, price, lines):
+    from PIL import Image
+
+    os.makedirs(os.path.join(folder, "sprites"), exist_ok=True)
+    with open(os.path.join(folder, "case.txt"), 'w', encoding='utf-8') as f:
+        f.write(f"{name}\n{price}\n")
+    with open(os.path.join(folder, "items.txt"), 'w', encoding='utf-8') as f:
+        f.write("\n".join(lines) + "\n")
+    Image.new('RGB', (8, 8), color=(90, 120, 200)).save(os.path.join(folder, "case.png"))
+    for line in lines:
+        item, skin = line.split(';')[:2]
+        Image.new('RGB', (4, 4), color=(200, 90, 90)).save(
+            os.path.join(folder, "sprites", f"{item}_{skin}.png"))
+
+@pytest.fixture
+def cases_folder(tmp_path):
+    folder = tmp_path / "cases"
+    for name, (price, lines) in CASES.items():
+        write_case(str(folder / name), name, price, lines)
+    return str(folder)
+
+@pytest.fixture
+def catalog(cases_folder):
+    from core import CaseCatalog
+
+    catalog = CaseCatalog(cases_folder)
+    catalog.load()
+    return catalog
+
+def drop(catalog, case_name, item_name, skin_name, acquired=1700000000):
+    # An opened item as the app adds it to the inventory
+    item = dict(catalog.find_item(case_name, item_name, skin_name))
+    item['acquired'] = acquired
+    return item
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from analyzer import analyze_case, case_statistics, simulate_sessions
+from core import Case
+
+def make_case(price, drops):
+    items = [{'case': "Test Case", 'item': f"Item{number}", 'skin': "Plain", 'price': item_price,
+              'rarity': rarity, 'sprite': None}
+             for number, (item_price, rarity) in enumerate(drops)]
+    return Case("Test Case", price, None, items)
+
+def test_case_statistics_are_exact():
+    case = make_case(5.0, [(12.5, 'rare'), (0.5, 'common'), (2500.0, 'legendary')])
+    stats = case_statistics(case)
+    ev = (15 * 12.5 + 50 * 0.5 + 1 * 2500.0) / 66
+    assert stats['expected_value'] == pytest.approx(ev)
+    assert stats['house_edge'] == pytest.approx(5.0 - ev)
+    assert stats['return_to_player'] == pytest.approx(ev / 5.0)
+    assert stats['profit_chance'] == pytest.approx(16 / 66)
+    assert (stats['worst_drop'], stats['best_drop']) == (0.5, 2500.0)
+    # Half the openings or more lose 4.50
+    assert stats['net_quantiles']['p50'] == -4.5
+    assert stats['net_quantiles']['p99'] == 2495.0
+
+def test_case_without_drops():
+    assert case_statistics(make_case(1.0, [])) is None
+
+def test_sure_loss_is_ruined_on_time():
+    # Every drop is worth nothing: ten openings use up the bankroll
+    prices = np.zeros(2)
+    prob = np.ones(2)
+    alias = np.arange(2)
+    balances, ruin_times, trajectory = simulate_sessions(prices, prob, alias, 1.0, 10.0, 50, 20,
+                                                         np.random.SeedSequence(1), [25, 50])
+    assert (ruin_times == 10).all()
+    assert (balances == 0.0).all()
+    assert (trajectory == 0.0).all()
+
+def test_break_even_is_never_ruined():
+    prices = np.full(3, 2.0)
+    balances, ruin_times, trajectory = simulate_sessions(prices, np.ones(3), np.arange(3), 2.0, 2.0,
+                                                         2500, 5, np.random.SeedSequence(2),
+                                                         [1000, 2500])
+    assert (ruin_times == -1).all()
+    assert (balances == 2.0).all()
+
+def test_results_depend_on_the_seed_only():
+    case = make_case(5.0, [(12.5, 'rare'), (0.5, 'common'), (40.0, 'mythical')])
+
+    def run(pool, seed=7):
+        with pool:
+            session = analyze_case(case, pool, 2500, 300, 100.0, seed)['session']
+        del session['seconds']
+        return session
+
+    single = run(ThreadPoolExecutor(1))
+    assert run(ProcessPoolExecutor(2)) == single
+    assert run(ThreadPoolExecutor(1), seed=8) != single
+    assert single['sessions'] == 2500
+    assert 0.0 < single['ruin_chance'] < 1.0
+    assert single['expected_loss'] == pytest.approx(300 * case_statistics(case)['house_edge'])
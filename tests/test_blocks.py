@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+
+from core import BLOCK_CHECKSUM, Inventory, LOAD_BLOCK_RECORDS
+
+def make_items(count, start=0):
+    return [{'case': "Alpha Case", 'item': f"Item{number}", 'skin': "Plain", 'price': 1.0,
+             'rarity': 'common', 'sprite': None, 'acquired': 1700000000 + number}
+            for number in range(start, start + count)]
+
+def write_inventory(path, count):
+    inventory = Inventory(path, journal=False)
+    inventory.add_items(make_items(count))
+    return inventory
+
+def read_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+def item_names(inventory):
+    return [item['item'] for item in inventory.items.values()]
+
+def test_blocks_round_trip(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    write_inventory(path, 2500)
+    lines = read_lines(path)
+    assert [number for number, line in enumerate(lines) if line.startswith(BLOCK_CHECKSUM)] == \
+        [1000, 2001, 2502]
+
+    inventory = Inventory(path, journal=False, load=False)
+    # One step per verified block, so the first items show up early
+    assert list(inventory.load_blocks()) == [1000, 2000, 2500]
+    assert item_names(inventory) == [item['item'] for item in make_items(2500)]
+    assert list(inventory.items) == list(range(1, 2501))
+
+def test_corrupt_block_loads_the_backup(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = write_inventory(path, 2500)
+    # The next save moves the 2500 item file to the backup
+    inventory.add_item(make_items(1, 2500)[0])
+    lines = read_lines(path)
+    lines[1500] = lines[1500].replace('"price": 1.0', '"price": 9.0')
+    write_lines(path, lines)
+
+    loaded = Inventory(path, journal=False)
+    assert len(loaded) == 2500
+    assert loaded.total_value == 2500.0
+    assert read_lines(path + ".damaged") == lines
+    assert len(Inventory(path, journal=False)) == 2500
+
+def test_corrupt_block_and_backup_keeps_the_others(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = write_inventory(path, 2500)
+    inventory.add_item(make_items(1, 2500)[0])
+    for damaged in (path, path + ".bak"):
+        lines = read_lines(damaged)
+        lines[1500] = lines[1500].replace('"price": 1.0', '"price": 9.0')
+        write_lines(damaged, lines)
+
+    loaded = Inventory(path, journal=False)
+    names = item_names(loaded)
+    assert len(names) == 1501
+    assert "Item999" in names and "Item1000" not in names and "Item2500" in names
+    # The blocks that were kept are written back verified
+    assert len(Inventory(path, journal=False)) == 1501
+
+def test_corrupt_block_without_backup_keeps_the_others(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    write_inventory(path, 2500)
+    lines = read_lines(path)
+    lines[1500] = lines[1500].replace('"price": 1.0', '"price": 9.0')
+    write_lines(path, lines)
+
+    loaded = Inventory(path, journal=False)
+    names = item_names(loaded)
+    assert len(names) == 1500
+    assert "Item999" in names and "Item1000" not in names and "Item2000" in names
+    assert read_lines(path + ".damaged") == lines
+
+def test_incomplete_block_loads_the_backup(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = write_inventory(path, 2500)
+    inventory.add_item(make_items(1, 2500)[0])
+    # A write that stopped halfway through the second block
+    write_lines(path, read_lines(path)[:1500])
+
+    loaded = Inventory(path, journal=False)
+    assert item_names(loaded) == [item['item'] for item in make_items(2500)]
+    assert Inventory(path, journal=False).total_value == 2500.0
+
+def test_old_whole_file_checksum(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    data = '\n'.join(json.dumps(item) for item in make_items(LOAD_BLOCK_RECORDS + 200))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{data}\n{hashlib.md5(data.encode('utf-8')).hexdigest()}")
+
+    loaded = Inventory(path, journal=False)
+    assert item_names(loaded) == [item['item'] for item in make_items(LOAD_BLOCK_RECORDS + 200)]
+    # The next save writes checksummed blocks
+    loaded.save()
+    assert sum(line.startswith(BLOCK_CHECKSUM) for line in read_lines(path)) == 2
+    assert len(Inventory(path, journal=False)) == LOAD_BLOCK_RECORDS + 200
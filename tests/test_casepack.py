@@ -0,0 +1,99 @@
+import os
+import shutil
+
+import pytest
+
+import casepack
+from conftest import write_case
+from core import CaseCatalog
+
+def test_pack_round_trip(tmp_path, cases_folder):
+    folder = os.path.join(cases_folder, "Alpha Case")
+    with open(os.path.join(folder, "case.txt"), 'a', encoding='utf-8') as f:
+        f.write("legendary=0.5\n")
+    os.remove(os.path.join(folder, "sprites", "Glock_Sand.png"))
+    out_path = str(tmp_path / "Alpha Case.casepack")
+    assert casepack.pack_folder(folder, out_path) == out_path
+
+    pack = casepack.open_pack(out_path)
+    assert (pack.name, pack.price, pack.rarity_weights) == ("Alpha Case", 5.0, {'legendary': 0.5})
+    items = list(pack.read_items())
+    assert [item[:4] for item in items] == [("AK-47", "Redline", 12.5, "rare"),
+                                           ("Glock", "Sand", 0.5, "common"),
+                                           ("AWP", "Dragon Lore", 2500.0, "legendary")]
+    # Blob 0 is the case image; an item without a sprite has no blob
+    assert [item[4] for item in items] == [1, -1, 2]
+    with open(os.path.join(folder, "case.png"), 'rb') as f:
+        assert bytes(pack.blob(0)) == f.read()
+    with open(os.path.join(folder, "sprites", "AWP_Dragon Lore.png"), 'rb') as f:
+        assert bytes(pack.blob(2)) == f.read()
+    with pytest.raises(IndexError):
+        pack.blob(3)
+
+    with casepack.open_sprite(casepack.sprite_ref(out_path, 1)) as image:
+        assert image.size == (4, 4)
+        assert image.convert('RGB').getpixel((0, 0)) == (200, 90, 90)
+    with pack.open_image(0) as image:
+        assert image.size == (8, 8)
+    assert casepack.parse_ref(casepack.sprite_ref(out_path, 2)) == (out_path, 2)
+
+def test_open_pack_is_shared_until_the_file_changes(tmp_path, cases_folder):
+    out_path = str(tmp_path / "Beta Case.casepack")
+    casepack.pack_folder(os.path.join(cases_folder, "Beta Case"), out_path)
+    pack = casepack.open_pack(out_path)
+    assert casepack.open_pack(out_path) is pack
+
+    write_case(str(tmp_path / "Beta Case"), "Beta Case", "3.00", ["P90;Grim;1.25;uncommon"])
+    casepack.pack_folder(str(tmp_path / "Beta Case"), out_path)
+    stat = os.stat(out_path)
+    os.utime(out_path, ns=(stat.st_atime_ns, pack.mtime_ns + 1))
+    changed = casepack.open_pack(out_path)
+    assert changed is not pack
+    assert (changed.price, changed.item_count) == (3.0, 1)
+
+def test_blob_reader():
+    reader = casepack.BlobReader(memoryview(b"0123456789"))
+    assert reader.read(3) == b"012"
+    assert reader.seek(-2, os.SEEK_END) == 8
+    assert reader.read() == b"89"
+    assert reader.read(4) == b""
+    reader.seek(2)
+    buffer = bytearray(4)
+    assert reader.readinto(buffer) == 4 and buffer == b"2345"
+    assert reader.seek(1, os.SEEK_CUR) == 7
+    with pytest.raises(ValueError):
+        reader.seek(-1)
+
+def test_name_too_long_for_a_pack(tmp_path, cases_folder):
+    folder = os.path.join(cases_folder, "Alpha Case")
+    out_path = str(tmp_path / "Alpha Case.casepack")
+    with pytest.raises(ValueError):
+        casepack.write_pack(out_path, "Alpha Case", 5.0, {}, os.path.join(folder, "case.png"),
+                            [("K" * (casepack.MAX_NAME_BYTES + 1), "Fade", 1.0, "rare", None)])
+    assert os.listdir(tmp_path) == ["cases"]
+
+def test_not_a_pack(tmp_path):
+    path = str(tmp_path / "broken.casepack")
+    with open(path, 'wb') as f:
+        f.write(b"\0" * casepack.HEADER.size)
+    with pytest.raises(ValueError):
+        casepack.CasePack(path)
+
+def test_catalog_loads_packs(tmp_path, cases_folder):
+    alpha = os.path.join(cases_folder, "Alpha Case")
+    casepack.pack_folder(alpha)
+    casepack.pack_folder(os.path.join(cases_folder, "Beta Case"))
+    shutil.rmtree(alpha)
+    # Beta Case keeps its folder, which is used instead of the pack
+    write_case(os.path.join(cases_folder, "Beta Case"), "Beta Case", "2.75",
+               ["P90;Grim;1.25;uncommon"])
+
+    cases = {case.name: case for case in CaseCatalog(cases_folder).load()}
+    assert sorted(cases) == ["Alpha Case", "Beta Case"]
+    assert cases["Beta Case"].price == 2.75
+
+    items = {item['item']: item for item in cases["Alpha Case"].items}
+    assert (items["AWP"]['price'], items["AWP"]['rarity']) == (2500.0, "legendary")
+    assert casepack.is_pack_ref(items["AWP"]['sprite'])
+    with casepack.open_sprite(items["AWP"]['sprite']) as image:
+        assert image.size == (4, 4)
@@ -0,0 +1,28 @@
+import threading
+from concurrent.futures import Future
+
+from core import Case
+
+def item(name):
+    return {'item': name, 'skin': "Plain", 'price': 1.0, 'rarity': 'common', 'sprite': None}
+
+def test_newer_items_win_over_a_slow_load():
+    loading = Future()
+    case = Case("Alpha Case", 5.0, None, loading)
+    seen = []
+    reader = threading.Thread(target=lambda: seen.append(case.items))
+    reader.start()
+
+    # A hot reload replaces the items while the first load is still running
+    case.set_items([item("Reloaded")])
+    loading.set_result([item("Stale")])
+    reader.join()
+    assert [found['item'] for found in case.items] == ["Reloaded"]
+    assert [found['item'] for found in seen[0]] == ["Reloaded"]
+
+def test_failed_load_leaves_no_items():
+    loading = Future()
+    loading.set_exception(OSError("items.txt is gone"))
+    case = Case("Alpha Case", 5.0, None, loading)
+    assert case.items == []
+    assert len(case.sampler) == 0
@@ -0,0 +1,130 @@
+import os
+
+import pytest
+
+import cli
+from core import Account, Case, CaseCatalog, Inventory
+
+@pytest.fixture
+def run(tmp_path, cases_folder, capsys):
+    # Runs one command against files in tmp_path; returns (exit code, output)
+    def run(*argv):
+        code = cli.main(["--cases", cases_folder, "--money", str(tmp_path / "money.txt"),
+                         "--inventory", str(tmp_path / "inventory.txt"),
+                         "--ledger", str(tmp_path / "ledger.log"), *argv])
+        return code, capsys.readouterr().out
+    return run
+
+def test_balance_without_any_files(run, tmp_path):
+    assert run("balance") == (0, "Balance: $1000.00\n")
+    # Reading the balance writes nothing
+    assert list(tmp_path.iterdir()) == [tmp_path / "cases"]
+
+def test_open_list_stats_and_sell(run):
+    code, output = run("open", "beta case", "40", "--seed", "3")
+    assert code == 0
+    assert "Opened 40 x Beta Case for $100.00" in output
+    assert output.endswith("Balance: $900.00\n")
+    assert run("balance") == (0, "Balance: $900.00\n")
+
+    code, output = run("list", "--limit", "0")
+    lines = output.splitlines()
+    assert lines[-1] == "Showing 40 of 40 matching items (40 in inventory)"
+    assert [int(line.split()[0]) for line in lines[:-1]] == list(range(1, 41))
+
+    code, output = run("list", "--rarity", "mythical", "--sort", "price", "--desc", "--limit", "2")
+    mythical = int(output.splitlines()[-1].split()[3])
+    assert output.count("M4A4 | Howl") == min(mythical, 2)
+
+    code, output = run("stats")
+    assert "Items: 40 worth" in output
+    assert "Beta Case" in output and "Alpha Case" not in output
+
+    code, output = run("sell", "--rarity", "uncommon", "--dry-run")
+    uncommon = 40 - mythical
+    assert output == f"Would sell {uncommon} items for ${uncommon * 1.25:.2f}\n"
+    assert run("balance") == (0, "Balance: $900.00\n")
+
+    code, output = run("sell", "--rarity", "uncommon")
+    assert output.startswith(f"Sold {uncommon} items for ${uncommon * 1.25:.2f}\n")
+    assert run("balance") == (0, f"Balance: ${900 + uncommon * 1.25:.2f}\n")
+    assert run("list")[1].splitlines()[-1] == \
+        f"Showing {mythical} of {mythical} matching items ({mythical} in inventory)"
+
+def test_open_is_reproducible_with_a_seed(run):
+    first = run("open", "Alpha Case", "20", "--seed", "7")[1]
+    run("sell", "--all")
+    second = run("open", "Alpha Case", "20", "--seed", "7")[1]
+    assert first.splitlines()[1:-1] == second.splitlines()[1:-1]
+
+def test_list_and_stats_only_read(run, tmp_path):
+    # An inventory in the old plain format is converted by any load that may write
+    path = tmp_path / "inventory.txt"
+    path.write_text('{"item": "Glock", "skin": "Sand", "price": 0.5, "rarity": "common"}\n',
+                    encoding='utf-8')
+    code, output = run("list")
+    assert output.splitlines()[-1] == "Showing 1 of 1 matching items (1 in inventory)"
+    assert "Items: 1 worth $0.50" in run("stats")[1]
+    assert path.read_text(encoding='utf-8').startswith('{"item": "Glock"')
+    assert sorted(os.listdir(tmp_path)) == ["cases", "inventory.txt"]
+
+def test_refusals(run):
+    assert run("open", "Gamma Case") == (1, "Case Gamma Case not found\n")
+    assert run("open", "Alpha Case", "0") == (1, "Count must be positive\n")
+    assert run("open", "Alpha Case", "201") == (1, "Not enough funds!\n")
+    assert run("sell")[0] == 1
+    assert run("balance") == (0, "Balance: $1000.00\n")
+
+def test_writes_wait_for_an_open_account(run, tmp_path):
+    account = Account(str(tmp_path / "money.txt"), str(tmp_path / "inventory.txt"),
+                      str(tmp_path / "ledger.log"))
+    try:
+        code, output = run("open", "Alpha Case", "1")
+        assert code == 1 and "in use by another CasePy" in output
+        assert run("sell", "--all")[0] == 1
+        # Reading needs no lock
+        assert run("balance") == (0, "Balance: $1000.00\n")
+    finally:
+        account.close()
+    assert run("open", "Alpha Case", "1")[0] == 0
+
+def test_items_are_parsed_on_first_use(cases_folder, monkeypatch):
+    parsed = []
+    read_items = Case.read_items
+    monkeypatch.setattr(Case, 'read_items', staticmethod(
+        lambda folder_path, case_name: parsed.append(case_name) or read_items(folder_path, case_name)))
+    catalog = CaseCatalog(cases_folder, preload_items=False)
+    cases = {case.name: case for case in catalog.load()}
+    assert parsed == []
+    assert [item['item'] for item in cases["Beta Case"].items] == ["M4A4", "P90"]
+    assert parsed == ["Beta Case"]
+
+def test_open_and_sell_by_id_leave_the_inventory_on_disk(run, tmp_path, catalog, monkeypatch):
+    run("open", "Alpha Case", "30", "--seed", "1")
+    # Folds the ledger into a compacted inventory file
+    Account(str(tmp_path / "money.txt"), str(tmp_path / "inventory.txt"), str(tmp_path / "ledger.log"),
+            catalog).close()
+    path = tmp_path / "inventory.txt"
+    before = path.read_bytes()
+
+    loads = []
+    load_blocks = Inventory.load_blocks
+    monkeypatch.setattr(Inventory, 'load_blocks', lambda self: loads.append(self) or load_blocks(self))
+    code, output = run("open", "Beta Case", "4", "--seed", "2")
+    assert code == 0 and output.endswith("Balance: $840.00\n")
+    assert loads == []
+
+    prices = {int(line.split()[0]): float(line.split("$")[-1].split()[0])
+              for line in run("list", "--limit", "0")[1].splitlines()[:-1]}
+    del loads[:]
+    # One id from the file, one from the ledger and one that doesn't exist
+    code, output = run("sell", "7", "32", "99")
+    assert code == 0 and output == f"Sold 2 items for ${prices[7] + prices[32]:.2f}\n" \
+        f"Balance: ${840 + prices[7] + prices[32]:.2f}\n"
+    assert run("sell", "7")[1].startswith("Sold 0 items")
+    assert loads == []
+    assert path.read_bytes() == before
+
+    lines = run("list", "--limit", "0")[1].splitlines()
+    assert lines[-1] == "Showing 32 of 32 matching items (32 in inventory)"
+    assert not {7, 32} & {int(line.split()[0]) for line in lines[:-1]}
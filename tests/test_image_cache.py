@@ -0,0 +1,71 @@
+import os
+
+from PIL import Image
+
+from image_cache import PHOTO_BYTES_PER_PIXEL, ImageCache
+
+def write_png(path, color=(200, 90, 90), size=(32, 32)):
+    Image.new('RGB', size, color=color).save(path)
+    return str(path)
+
+def test_failed_decode_uses_the_requested_placeholder(tmp_path):
+    broken = tmp_path / "broken.png"
+    broken.write_bytes(b"not a png")
+    cache = ImageCache()
+    assert cache.get(str(broken), (4, 4), 'red').getpixel((0, 0)) == (255, 0, 0)
+    assert cache.get(str(tmp_path / "missing.png"), (4, 4), 'blue').getpixel((0, 0)) == (0, 0, 255)
+
+def test_memory_budget_evicts_least_recently_used(tmp_path):
+    paths = [write_png(tmp_path / f"{number}.png") for number in range(3)]
+    # Room for two 8x8 RGB images
+    cache = ImageCache(max_bytes=2 * 8 * 8 * 3)
+    for path in paths[:2]:
+        cache.get(path, (8, 8))
+    cache.get(paths[0], (8, 8))
+    cache.get(paths[2], (8, 8))
+    assert [key[0] for key in cache.entries] == [paths[0], paths[2]]
+    assert cache.current_bytes == 2 * 8 * 8 * 3
+
+def test_photo_bytes_count_against_the_budget(tmp_path, monkeypatch):
+    from PIL import ImageTk
+
+    # PhotoImage needs a display; its size is all the cache looks at
+    monkeypatch.setattr(ImageTk, 'PhotoImage', lambda img: object())
+    path = write_png(tmp_path / "a.png")
+    cache = ImageCache()
+    cache.photo(path, (8, 8))
+    assert cache.current_bytes == 8 * 8 * (3 + PHOTO_BYTES_PER_PIXEL)
+    # The Tk copy is only counted once
+    cache.photo(path, (8, 8))
+    assert cache.current_bytes == 8 * 8 * (3 + PHOTO_BYTES_PER_PIXEL)
+
+def test_thumbnails_are_reused_and_pruned(tmp_path):
+    thumbnails = tmp_path / "thumbnails"
+    # Same pixels everywhere, so every thumbnail has the same size
+    paths = [write_png(tmp_path / f"{number}.png") for number in range(6)]
+    cache = ImageCache(cache_dir=str(thumbnails))
+    for path in paths:
+        cache.get(path, (16, 16))
+    files = sorted(thumbnails.iterdir(), key=lambda file: file.name)
+    assert len(files) == 6
+    size = files[0].stat().st_size
+
+    # Spread the last uses out, then use the first image again
+    for number, file in enumerate(sorted(files, key=lambda file: file.stat().st_mtime_ns)):
+        os.utime(file, ns=(0, number * 10**9))
+    ImageCache(cache_dir=str(thumbnails)).get(paths[0], (16, 16))
+    (thumbnails / "left.png.1.tmp").write_bytes(b"x")
+    os.utime(thumbnails / "left.png.1.tmp", ns=(0, 0))
+
+    cache = ImageCache(cache_dir=str(thumbnails), max_disk_bytes=4 * size)
+    assert cache.prune_disk() == 4
+    # Down to three quarters of the budget, the thumbnail just used is kept
+    assert cache.disk_bytes == 3 * size
+    assert cache.disk_path(cache.make_key(paths[0], (16, 16), 'gray')) in \
+        [str(file) for file in thumbnails.iterdir()]
+
+    # New thumbnails count towards the budget and prune again once over it
+    more = [write_png(tmp_path / f"more{number}.png") for number in range(2)]
+    for path in more:
+        cache.get(path, (16, 16))
+    assert len(list(thumbnails.iterdir())) == 3
@@ -0,0 +1,103 @@
+import random
+
+import pytest
+
+from core import RARITY_WEIGHTS, IdView, Inventory, SortedIds
+
+def make_item(name, price, rarity, case="Alpha Case"):
+    return {'case': case, 'item': name, 'skin': "Plain", 'price': price, 'rarity': rarity}
+
+def test_ids_are_stable_and_never_reused(tmp_path):
+    inventory = Inventory(str(tmp_path / "inventory.txt"))
+    assert inventory.add_items([make_item("A", 1.0, 'common'), make_item("B", 2.0, 'rare')]) == [1, 2]
+    assert inventory.remove_item(1)['item'] == "A"
+    assert inventory.remove_item(1) is None
+    assert inventory.add_item(make_item("C", 3.0, 'rare')) == 3
+    assert [item['item'] for item in inventory.items.values()] == ["B", "C"]
+    inventory.close()
+
+def test_aggregates_follow_every_change(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = Inventory(path)
+    inventory.add_items([make_item("A", 1.5, 'Common'), make_item("B", 20.0, 'rare'),
+                         make_item("C", 0.25, 'common', case="Beta Case")])
+    inventory.remove_items([2, 99])
+    assert inventory.total_value == 1.75
+    assert +inventory.rarity_counts == {'common': 2}
+    assert +inventory.case_counts == {"Alpha Case": 1, "Beta Case": 1}
+    inventory.close()
+
+    loaded = Inventory(path)
+    assert (loaded.total_value, +loaded.rarity_counts, +loaded.case_counts) == \
+        (inventory.total_value, +inventory.rarity_counts, +inventory.case_counts)
+    loaded.remove_items(list(loaded.items))
+    assert loaded.total_value == 0.0
+    assert not +loaded.rarity_counts
+    loaded.close()
+
+class SmallChunks(SortedIds):
+    # Splits after a handful of ids, so a few hundred cover many chunks
+    CHUNK_SIZE = 4
+
+def test_sorted_ids_against_a_list():
+    rng = random.Random(5)
+    prices = {item_id: rng.choice([1.0, 2.5, 2.5, 7.0]) for item_id in range(400)}
+    key = lambda item_id: (prices[item_id], item_id)
+    ids = SmallChunks(key=key)
+    expected = []
+    for item_id in rng.sample(range(400), 400):
+        ids.add(item_id)
+        expected.append(item_id)
+    for item_id in rng.sample(range(400), 250):
+        ids.remove(item_id)
+        expected.remove(item_id)
+    expected.sort(key=key)
+    assert list(ids) == expected
+    assert list(reversed(ids)) == expected[::-1]
+    assert len(ids) == len(expected)
+    assert [ids[i] for i in range(-len(expected), len(expected))] == expected + expected
+    with pytest.raises(IndexError):
+        ids[len(expected)]
+
+def test_id_view_walks_lists_in_order():
+    view = IdView([SortedIds([1, 4]), SortedIds(), SortedIds([2, 3, 9])])
+    assert (list(view), len(view), view[2], view[-1]) == ([1, 4, 2, 3, 9], 5, 2, 9)
+    backwards = IdView(view.lists, descending=True)
+    assert list(backwards) == [9, 3, 2, 4, 1]
+    assert [backwards[i] for i in range(5)] == [9, 3, 2, 4, 1]
+
+def test_index_queries_match_a_scan(tmp_path):
+    rng = random.Random(6)
+    rarities = ['common', 'uncommon', 'rare', 'legendary']
+    inventory = Inventory(str(tmp_path / "inventory.txt"))
+    inventory.add_items([make_item(f"Item{number % 7}", rng.choice([0.5, 1.0, 3.0]),
+                                   rng.choice(rarities), case=rng.choice(["Alpha Case", "Beta Case"]))
+                         for number in range(300)])
+    index = inventory.index
+    # The index is built once and then kept up to date
+    inventory.remove_items(rng.sample(list(inventory.items), 100))
+    inventory.add_items([make_item("Item9", 2.0, 'Rare'), make_item("Item3", 0.5, 'mythical')])
+    assert inventory.index is index
+
+    items = inventory.items
+    ranks = {rarity: rank for rank, rarity in enumerate(RARITY_WEIGHTS)}
+    orders = {
+        'acquired': lambda item_id: item_id,
+        'price': lambda item_id: (items[item_id]['price'], item_id),
+        'rarity': lambda item_id: (ranks[items[item_id]['rarity'].lower()], item_id)
+    }
+    for sort, order in orders.items():
+        for rarity in (None, 'rare', 'legendary'):
+            for case in (None, "Beta Case", "Gamma Case"):
+                for name in (None, "item3"):
+                    for descending in (False, True):
+                        expected = sorted(
+                            (item_id for item_id, item in items.items()
+                             if (rarity is None or item['rarity'].lower() == rarity)
+                             and (case is None or item['case'] == case)
+                             and (name is None or name in item['item'].lower())),
+                            key=order, reverse=descending)
+                        result = index.query(sort, descending, rarity, case, name)
+                        assert list(result) == expected, (sort, rarity, case, name, descending)
+    assert index.rarity_order() == ['common', 'uncommon', 'rare', 'mythical', 'legendary']
+    inventory.close()
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import os
+from types import SimpleNamespace
+
+from conftest import drop, write_case
+from core import (COMPACT_MIN_RECORDS, JOURNAL_HEADER, JOURNAL_VERSION, CaseCatalog, Inventory,
+                  InventoryItem)
+
+def make_items(count, start=0):
+    return [{'item': f"Item{number}", 'skin': "Plain", 'price': 1.0, 'rarity': 'common'}
+            for number in range(start, start + count)]
+
+def fill(path):
+    inventory = Inventory(path)
+    inventory.add_items(make_items(3))
+    inventory.add_item(make_items(1, 3)[0])
+    # Item1
+    inventory.remove_item(2)
+    inventory.close()
+    return inventory
+
+def record_lines(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.readlines()
+
+def write_lines(path, lines):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.writelines(lines)
+
+def names(inventory):
+    return [item['item'] for item in inventory.items.values()]
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    written = fill(path)
+
+    lines = record_lines(path)
+    assert lines[0].startswith(JOURNAL_HEADER)
+    assert [line.split(' ')[1] for line in lines[1:]] == ['A', 'A', 'A', 'A', 'D']
+
+    loaded = Inventory(path)
+    assert loaded.items == written.items
+    assert list(loaded.items) == [1, 3, 4]
+    assert loaded.next_id == 5
+    # Loading a clean journal doesn't rewrite it
+    assert record_lines(path) == lines
+
+def test_torn_last_record_is_dropped(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    fill(path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('1234abcd A 9 {"item": "Ha')
+
+    loaded = Inventory(path)
+    assert names(loaded) == ["Item0", "Item2", "Item3"]
+    assert record_lines(path)[-1].endswith('\n')
+    assert names(Inventory(path)) == ["Item0", "Item2", "Item3"]
+
+def test_corrupt_record_in_the_middle_is_skipped_alone(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = fill(path)
+    # Compaction keeps the previous file as the backup
+    inventory.save()
+    inventory.add_item(make_items(1, 4)[0])
+    inventory.remove_item(3)
+    inventory.close()
+    lines = record_lines(path)
+    lines[1] = lines[1].replace("Item0", "Item7")
+    write_lines(path, lines)
+
+    loaded = Inventory(path)
+    # Records after the bad one still count: Item4 is there and Item2 is sold
+    assert names(loaded) == ["Item3", "Item4"]
+    assert loaded.skipped_records == 1
+    assert record_lines(path + ".damaged") == lines
+    assert Inventory(path).skipped_records == 0
+    assert names(Inventory(path)) == ["Item3", "Item4"]
+
+def test_corrupt_record_without_backup(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    fill(path)
+    lines = record_lines(path)
+    lines[1] = lines[1].replace("Item0", "Item8")
+    write_lines(path, lines)
+
+    # Only the item whose record is bad is lost
+    assert names(Inventory(path)) == ["Item2", "Item3"]
+    assert not os.path.exists(path + ".bak")
+
+def test_second_damaged_file_keeps_the_first(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    fill(path)
+    for _ in range(2):
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write("00000000 D 1\n")
+        Inventory(path)
+    assert os.path.exists(path + ".damaged")
+    assert os.path.exists(path + ".damaged1")
+
+def test_removals_trigger_compaction(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    count = COMPACT_MIN_RECORDS + 200
+    inventory = Inventory(path)
+    inventory.add_items(make_items(count))
+    inventory.remove_items(range(1, count + 1, 2))
+    inventory.close()
+
+    # Only the live items are left, with their ids, between the header and the end record
+    lines = record_lines(path)
+    assert len(lines) == 1 + count // 2 + 1
+    assert lines[-1].split()[1:] == ['E', str(count + 1)]
+    loaded = Inventory(path)
+    assert list(loaded.items) == list(range(2, count + 1, 2))
+    assert loaded.next_id == count + 1
+
+def test_old_format_is_converted(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    data = '\n'.join(json.dumps(item) for item in make_items(3))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{data}\n{hashlib.md5(data.encode('utf-8')).hexdigest()}")
+
+    loaded = Inventory(path)
+    assert names(loaded) == ["Item0", "Item1", "Item2"]
+    assert record_lines(path)[0].startswith(JOURNAL_HEADER)
+    assert os.path.exists(path + ".bak")
+    assert names(Inventory(path)) == ["Item0", "Item1", "Item2"]
+
+GONE_ITEM = {'case': "Gone Case", 'item': "Knife", 'skin': "Fade", 'price': 300.0,
+             'rarity': 'legendary', 'sprite': None, 'acquired': 1600000000}
+
+def fill_from_catalog(path, catalog):
+    inventory = Inventory(path, catalog=catalog)
+    inventory.add_items([drop(catalog, "Alpha Case", "AK-47", "Redline"),
+                         drop(catalog, "Beta Case", "M4A4", "Howl"),
+                         dict(GONE_ITEM)])
+    inventory.add_item(drop(catalog, "Alpha Case", "Glock", "Sand", acquired=1700000001))
+    inventory.remove_item(2)
+    inventory.close()
+    return inventory
+
+def keys(inventory):
+    return {item_id: (item['case'], item['item'], item['skin'], item['acquired'])
+            for item_id, item in inventory.items.items()}
+
+def test_catalog_items_round_trip(tmp_path, catalog):
+    path = str(tmp_path / "inventory.txt")
+    written = fill_from_catalog(path, catalog)
+
+    lines = record_lines(path)
+    assert lines[0].split()[:2] == [JOURNAL_HEADER, JOURNAL_VERSION]
+    # Each case and key is written once, before the first record that uses it
+    assert [line.split(' ')[1] for line in lines[1:]] == ['C', 'K', 'R', 'C', 'K', 'R', 'A', 'K', 'R', 'D']
+
+    loaded = Inventory(path, catalog=catalog)
+    assert keys(loaded) == keys(written)
+    assert isinstance(loaded.items[1], InventoryItem)
+    assert loaded.items[3] == GONE_ITEM
+    assert loaded.total_value == 12.50 + 300.0 + 0.50
+
+def test_items_are_kept_by_name(tmp_path, cases_folder, catalog):
+    path = str(tmp_path / "inventory.txt")
+    fill_from_catalog(path, catalog)
+
+    # A new first line in items.txt moves every other item down one line
+    folder = os.path.join(cases_folder, "Alpha Case")
+    with open(os.path.join(folder, "items.txt"), 'r', encoding='utf-8') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    write_case(folder, "Alpha Case", "5.00", ["Deagle;Blaze;40.00;rare"] + lines)
+    edited = CaseCatalog(cases_folder)
+    edited.load()
+
+    loaded = Inventory(path, catalog=edited)
+    assert (loaded.items[1]['item'], loaded.items[1]['skin'], loaded.items[1]['price']) == \
+        ("AK-47", "Redline", 12.50)
+    assert loaded.items[4]['item'] == "Glock"
+
+def test_corrupt_key_drops_only_its_items(tmp_path, catalog):
+    path = str(tmp_path / "inventory.txt")
+    fill_from_catalog(path, catalog)
+    lines = record_lines(path)
+    position = next(i for i, line in enumerate(lines) if "Glock;Sand" in line)
+    lines[position] = lines[position].replace("Glock", "Glick")
+    write_lines(path, lines)
+
+    loaded = Inventory(path, catalog=catalog)
+    assert sorted(loaded.items) == [1, 3]
+    # The bad key and the record that uses it
+    assert loaded.skipped_records == 2
+
+def test_v1_journal_is_converted(tmp_path, catalog):
+    path = str(tmp_path / "inventory.txt")
+    inventory = Inventory(path, catalog=catalog, load=False)
+    # v1 references held line numbers in items.txt
+    records = ['C 0 "Alpha Case"', "R 1 0 0 1700000000", "R 2 0 2 1700000001", "D 1"]
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"{JOURNAL_HEADER} v1 3\n")
+        f.writelines(inventory.make_record(record) for record in records)
+
+    loaded = Inventory(path, catalog=catalog)
+    assert keys(loaded) == {2: ("Alpha Case", "AWP", "Dragon Lore", 1700000001)}
+    assert record_lines(path)[0].split()[1] == JOURNAL_VERSION
+    assert keys(Inventory(path, catalog=catalog)) == keys(loaded)
+
+def test_read_only_load_writes_nothing(tmp_path, catalog):
+    path = str(tmp_path / "inventory.txt")
+    fill_from_catalog(path, catalog)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write("00000000 D 1\n")
+    before = record_lines(path)
+
+    loaded = Inventory(path, catalog=catalog, read_only=True)
+    assert sorted(loaded.items) == [1, 3, 4]
+    assert record_lines(path) == before
+    assert sorted(os.listdir(tmp_path)) == ["cases", "inventory.txt"]
+
+def test_compacted_file_is_read_by_id(tmp_path, catalog):
+    path = str(tmp_path / "inventory.txt")
+    inventory = fill_from_catalog(path, catalog)
+    inventory.add_items([drop(catalog, "Beta Case", "P90", "Grim", acquired=1700000000 + number)
+                         for number in range(500)])
+    inventory.remove_items(range(10, 500, 3))
+    # Only a compacted file can be bisected; appended records need a full load
+    assert Inventory(path, catalog=catalog, load=False).peek_items([1]) is None
+    inventory.compact()
+
+    peeked = Inventory(path, catalog=catalog, load=False)
+    assert peeked.peek_next_id() == inventory.next_id
+    wanted = list(range(0, inventory.next_id + 2))
+    assert keys(SimpleNamespace(items=peeked.peek_items(wanted))) == keys(inventory)
+    assert peeked.items == {}
+
+def test_peek_without_an_inventory(tmp_path):
+    inventory = Inventory(str(tmp_path / "inventory.txt"), load=False)
+    assert inventory.peek_next_id() == 1
+    assert inventory.peek_items([1, 2]) == {}
+
+def test_v2_journal_is_converted(tmp_path):
+    path = str(tmp_path / "inventory.txt")
+    inventory = Inventory(path, load=False)
+    # v2 files had no end record
+    records = ['A 1 {"item": "Glock", "skin": "Sand", "price": 0.5, "rarity": "common"}']
+    write_lines(path, [f"{JOURNAL_HEADER} v2 2\n"] + [inventory.make_record(record) for record in records])
+    assert inventory.peek_next_id() is None
+
+    assert names(Inventory(path)) == ["Glock"]
+    assert record_lines(path)[0].split()[1] == JOURNAL_VERSION
+    assert Inventory(path, load=False).peek_items([1])[1]['item'] == "Glock"
@@ -0,0 +1,264 @@
+import os
+import threading
+
+import pytest
+
+from ledger import ROTATED_SUFFIX, Ledger, merge_change, read_records
+from core import Account, AccountLockedError
+
+def open_account(folder, **kwargs):
+    return Account(os.path.join(folder, "money.txt"), os.path.join(folder, "inventory.txt"),
+                   os.path.join(folder, "ledger.log"), **kwargs)
+
+def logged(path):
+    ledger = Ledger(path, window=0)
+    ledger.close()
+    return ledger.records
+
+def crash(account):
+    # Everything submitted reaches the log, nothing is checkpointed
+    account.ledger.flush()
+    account.ledger.close()
+    account.inventory.close()
+    account.lock.release()
+
+def make_item(name, price):
+    return {'case': "Alpha Case", 'item': name, 'skin': "Plain", 'price': price, 'rarity': 'common'}
+
+def test_group_commit(tmp_path):
+    path = str(tmp_path / "ledger.log")
+    ledger = Ledger(path, window=0.05)
+    start = threading.Barrier(8)
+
+    def submit(thread):
+        start.wait()
+        for number in range(25):
+            ledger.submit({'b': thread * 100 + number})
+
+    threads = [threading.Thread(target=submit, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ledger.flush()
+    ledger.close()
+
+    records = logged(path)
+    assert len(records) == 200
+    # Many records share one write and fsync
+    assert ledger.writes < 200
+    for thread in range(8):
+        own = [record['b'] for record in records if record['b'] // 100 == thread]
+        assert own == [thread * 100 + number for number in range(25)]
+
+def test_transaction_is_one_record(tmp_path):
+    path = str(tmp_path / "ledger.log")
+    ledger = Ledger(path, window=0)
+    with ledger.transaction():
+        ledger.record_balance(10.0)
+        ledger.record_items(added=[(1, make_item("A", 1.0)), (2, make_item("B", 1.0))])
+        ledger.record_items(removed=[2, 7])
+        ledger.record_balance(9.0)
+    ledger.flush()
+    ledger.close()
+
+    # Item 2 came and went inside the transaction, so it never reaches the log
+    assert logged(path) == [{'b': 9.0, 'a': [[1, make_item("A", 1.0)]], 'd': [7]}]
+
+def test_merge_change_keeps_removals_of_older_items():
+    record = {}
+    merge_change(record, {'a': [[5, {}]]})
+    merge_change(record, {'d': [4, 5]})
+    # Item 5 came and went; item 4 was added by an earlier record
+    assert record == {'a': [], 'd': [4]}
+
+def test_torn_tail_is_truncated(tmp_path):
+    path = str(tmp_path / "ledger.log")
+    ledger = Ledger(path, window=0)
+    ledger.submit({'b': 1.0}, wait=True)
+    ledger.submit({'b': 2.0}, wait=True)
+    ledger.close()
+    valid_size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'0badc0de {"b":3')
+
+    ledger = Ledger(path, window=0)
+    assert ledger.records == [{'b': 1.0}, {'b': 2.0}]
+    assert os.path.getsize(path) == valid_size
+    ledger.submit({'b': 4.0}, wait=True)
+    ledger.close()
+    assert logged(path) == [{'b': 1.0}, {'b': 2.0}, {'b': 4.0}]
+
+def test_checkpoint_is_asked_for_after_enough_records(tmp_path):
+    calls = []
+    ledger = Ledger(str(tmp_path / "ledger.log"), window=0, checkpoint_records=3,
+                    on_checkpoint=lambda: calls.append(ledger.record_count))
+    for number in range(3):
+        ledger.submit({'b': float(number)})
+    assert calls == [3]
+    ledger.reset()
+    assert ledger.records == [] and ledger.record_count == 0
+    ledger.close()
+    assert logged(ledger.path) == []
+
+def test_rotated_records_are_replayed_first(tmp_path):
+    path = str(tmp_path / "ledger.log")
+    ledger = Ledger(path, window=0)
+    ledger.submit({'b': 1.0})
+    ledger.rotate()
+    ledger.submit({'b': 2.0})
+    # A second rotation before the first part was dropped appends to it
+    ledger.rotate()
+    ledger.submit({'b': 3.0}, wait=True)
+    ledger.close()
+
+    assert read_records(path + ROTATED_SUFFIX)[0] == [{'b': 1.0}, {'b': 2.0}]
+    ledger = Ledger(path, window=0)
+    assert ledger.records == [{'b': 1.0}, {'b': 2.0}, {'b': 3.0}]
+    ledger.drop_rotated()
+    assert not os.path.exists(path + ROTATED_SUFFIX)
+    ledger.reset()
+    ledger.close()
+    assert logged(path) == []
+
+def test_account_replays_the_ledger_after_a_crash(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    with account.transaction():
+        account.money_manager.deduct_money(5.0)
+        account.inventory.add_item(make_item("A", 12.5))
+    with account.transaction():
+        account.money_manager.deduct_money(2.5)
+        account.inventory.add_item(make_item("B", 1.25))
+    with account.transaction():
+        account.money_manager.add_money(account.inventory.remove_item(1)['price'])
+    crash(account)
+    # The state files never saw any of it
+    assert not os.path.exists(os.path.join(folder, "inventory.txt"))
+
+    account = open_account(folder)
+    assert account.money_manager.balance == 1000.0 - 5.0 - 2.5 + 12.5
+    assert [(item_id, item['item']) for item_id, item in account.inventory.items.items()] == \
+        [(2, "B")]
+    # Loading folded the records into the state files
+    assert os.path.getsize(os.path.join(folder, "ledger.log")) == 0
+    account.close()
+
+    account = open_account(folder)
+    assert account.money_manager.balance == 1005.0
+    assert list(account.inventory.items) == [2]
+    account.close()
+
+def test_second_account_is_refused(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    with pytest.raises(AccountLockedError):
+        open_account(folder)
+    account.close()
+    # Closing the first one frees the files
+    open_account(folder).close()
+
+def test_lazy_account_leaves_the_state_files_alone(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    account.inventory.add_item(make_item("A", 12.5))
+    account.close()
+    inventory_path = os.path.join(folder, "inventory.txt")
+    with open(inventory_path, 'rb') as f:
+        before = f.read()
+
+    for name in ("B", "C"):
+        account = open_account(folder, eager_checkpoints=False)
+        with account.transaction():
+            account.money_manager.deduct_money(1.0)
+            account.inventory.add_item(make_item(name, 1.0))
+        account.close()
+    with open(inventory_path, 'rb') as f:
+        assert f.read() == before
+    assert len(read_records(os.path.join(folder, "ledger.log"))[0]) == 2
+
+    account = open_account(folder)
+    assert account.money_manager.balance == 998.0
+    assert [item['item'] for item in account.inventory.items.values()] == ["A", "B", "C"]
+    account.close()
+
+def test_rotate_leaves_the_move_to_the_commit_thread(tmp_path):
+    path = str(tmp_path / "ledger.log")
+    ledger = Ledger(path, window=0.05)
+    ledger.submit({'b': 1.0})
+    rotation = ledger.rotate()
+    # Submitted right after, but still behind the marker
+    ledger.submit({'b': 2.0})
+    ledger.wait_for(rotation)
+    ledger.flush()
+    ledger.close()
+    assert read_records(path + ROTATED_SUFFIX)[0] == [{'b': 1.0}]
+    assert read_records(path)[0] == [{'b': 2.0}]
+
+def test_account_checkpoints_in_the_background(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    account.ledger.checkpoint_records = 3
+    for name in ("A", "B", "C"):
+        with account.transaction():
+            account.money_manager.deduct_money(1.0)
+            account.inventory.add_item(make_item(name, 1.0))
+    assert account.checkpointing is not None
+    # Changes made while the checkpoint is written stay in the ledger
+    with account.transaction():
+        account.money_manager.deduct_money(1.0)
+        account.inventory.add_item(make_item("D", 1.0))
+    account.checkpointing.result()
+
+    with open(os.path.join(folder, "money.txt")) as f:
+        assert float(f.read()) == 997.0
+    assert not os.path.exists(os.path.join(folder, "ledger.log" + ROTATED_SUFFIX))
+    crash(account)
+    assert [record['b'] for record in logged(os.path.join(folder, "ledger.log"))] == [996.0]
+
+    account = open_account(folder)
+    assert account.money_manager.balance == 996.0
+    assert [item['item'] for item in account.inventory.items.values()] == ["A", "B", "C", "D"]
+    account.close()
+
+def test_close_waits_for_a_background_checkpoint(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder, eager_checkpoints=False)
+    account.ledger.checkpoint_records = 2
+    for name in ("A", "B"):
+        account.inventory.add_item(make_item(name, 1.0))
+    account.close()
+    assert account.checkpointing is None
+    assert not os.path.exists(os.path.join(folder, "ledger.log" + ROTATED_SUFFIX))
+    assert logged(os.path.join(folder, "ledger.log")) == []
+
+def test_partly_loaded_account_never_checkpoints(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    account.inventory.add_items([make_item("A", 1.0), make_item("B", 2.0)])
+    account.close()
+    inventory_path = os.path.join(folder, "inventory.txt")
+    with open(inventory_path, 'rb') as f:
+        before = f.read()
+
+    account = open_account(folder, load=False, eager_checkpoints=False)
+    account.ledger.checkpoint_records = 2
+    assert account.load_partial([2])
+    assert list(account.inventory.items) == [2]
+    with pytest.raises(RuntimeError):
+        account.checkpoint()
+    account.sell_items([2])
+    account.inventory.add_item(make_item("C", 3.0))
+    account.close()
+    with open(inventory_path, 'rb') as f:
+        assert f.read() == before
+    assert len(logged(os.path.join(folder, "ledger.log"))) == 2
+
+    # Once the ledger is due for a checkpoint only a full load will do
+    account = open_account(folder, load=False, eager_checkpoints=False)
+    account.ledger.checkpoint_records = 2
+    assert not account.load_partial([1])
+    account.finish_loading()
+    assert {item_id: item['item'] for item_id, item in account.inventory.items.items()} == {1: "A", 3: "C"}
+    assert account.money_manager.balance == 1002.0
+    account.close()
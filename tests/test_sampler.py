@@ -0,0 +1,57 @@
+import random
+from collections import Counter
+
+import pytest
+
+from core import RARITY_WEIGHTS, RaritySampler
+
+def make_items(rarities):
+    return [{'item': f"Item{number}", 'skin': "Plain", 'price': 1.0, 'rarity': rarity}
+            for number, rarity in enumerate(rarities)]
+
+def shares(items, drawn):
+    counts = Counter(item['item'] for item in drawn)
+    return [counts[item['item']] / len(drawn) for item in items]
+
+def expected(items, weights):
+    total = sum(weights[item['rarity']] for item in items)
+    return [weights[item['rarity']] / total for item in items]
+
+def test_draws_follow_the_rarity_weights():
+    items = make_items(list(RARITY_WEIGHTS) + ['common', 'legendary'])
+    sampler = RaritySampler(items)
+    rng = random.Random(1)
+    drawn = [sampler.draw(rng) for _ in range(200000)]
+    for share, probability in zip(shares(items, drawn), expected(items, RARITY_WEIGHTS)):
+        assert share == pytest.approx(probability, abs=0.005)
+
+def test_draw_many_matches_draw():
+    items = make_items(['common', 'rare', 'rare', 'mythical'])
+    sampler = RaritySampler(items)
+    drawn = sampler.draw_many(200000, random.Random(2))
+    assert len(drawn) == 200000
+    for share, probability in zip(shares(items, drawn), expected(items, RARITY_WEIGHTS)):
+        assert share == pytest.approx(probability, abs=0.005)
+    assert sampler.draw_many(0) == []
+
+def test_case_weights_override_the_defaults():
+    items = make_items(['common', 'legendary', 'mystery'])
+    # Names are case-insensitive, fractions are allowed and unknown rarities weigh 1
+    sampler = RaritySampler(items, {'LEGENDARY': 0.5, 'common': 2})
+    assert sampler.probabilities == pytest.approx([2 / 3.5, 0.5 / 3.5, 1 / 3.5])
+    drawn = sampler.draw_many(100000, random.Random(3))
+    for share, probability in zip(shares(items, drawn), sampler.probabilities):
+        assert share == pytest.approx(probability, abs=0.005)
+
+def test_zero_weight_items_are_never_drawn():
+    items = make_items(['common', 'legendary', 'common'])
+    sampler = RaritySampler(items, {'common': 0})
+    assert {item['item'] for item in sampler.draw_many(1000, random.Random(4))} == {"Item1"}
+
+def test_nothing_to_draw():
+    with pytest.raises(ValueError):
+        RaritySampler([]).draw()
+    with pytest.raises(ValueError):
+        RaritySampler(make_items(['common']), {'common': 0}).draw_many(5)
+    with pytest.raises(ValueError):
+        RaritySampler(make_items(['common']), {'common': -1})
@@ -0,0 +1,59 @@
+import os
+
+from ledger import Ledger
+from core import Account, item_filter
+
+ITEMS = [
+    {'case': "Alpha Case", 'item': "AK-47", 'skin': "Redline", 'price': 12.5, 'rarity': 'rare'},
+    {'case': "Alpha Case", 'item': "Glock", 'skin': "Sand", 'price': 0.5, 'rarity': 'common'},
+    {'case': "Beta Case", 'item': "P90", 'skin': "Grim", 'price': 1.25, 'rarity': 'Common'},
+    {'case': "Beta Case", 'item': "M4A4", 'skin': "Howl", 'price': 5.0, 'rarity': 'common'}
+]
+
+def open_account(folder):
+    return Account(os.path.join(folder, "money.txt"), os.path.join(folder, "inventory.txt"),
+                   os.path.join(folder, "ledger.log"))
+
+def matching(**query):
+    predicate = item_filter(**query)
+    return [item['item'] for item in ITEMS if predicate(item)]
+
+def test_item_filter():
+    assert matching() == ["AK-47", "Glock", "P90", "M4A4"]
+    assert matching(rarity='COMMON') == ["Glock", "P90", "M4A4"]
+    # max_price is exclusive, min_price inclusive
+    assert matching(rarity='common', max_price=5) == ["Glock", "P90"]
+    assert matching(min_price=1.25, max_price=12.5) == ["P90", "M4A4"]
+    assert matching(case="Beta Case", rarity='common') == ["P90", "M4A4"]
+    # Names match on "item | skin", ignoring case
+    assert matching(name="K | sa") == ["Glock"]
+    assert matching(case="Gamma Case") == []
+
+def test_sell_where_is_one_transaction(tmp_path):
+    folder = str(tmp_path)
+    account = open_account(folder)
+    account.inventory.add_items([dict(item) for item in ITEMS])
+    account.ledger.flush()
+    records_before = account.ledger.record_count
+
+    sold, total = account.sell_where(item_filter(rarity='common', max_price=5))
+    assert [item['item'] for item in sold] == ["Glock", "P90"]
+    assert total == 1.75
+    assert account.money_manager.balance == 1001.75
+    assert [item['item'] for item in account.inventory.items.values()] == ["AK-47", "M4A4"]
+    assert account.ledger.record_count == records_before + 1
+    assert account.sell_where(item_filter(rarity='legendary')) == ([], 0)
+    account.ledger.flush()
+    account.ledger.close()
+    account.inventory.close()
+    account.lock.release()
+
+    # The removals and the payment share one record
+    ledger = Ledger(os.path.join(folder, "ledger.log"), window=0)
+    ledger.close()
+    assert ledger.records[-1] == {'d': [2, 3], 'b': 1001.75}
+
+    account = open_account(folder)
+    assert account.money_manager.balance == 1001.75
+    assert list(account.inventory.items) == [1, 4]
+    account.close()
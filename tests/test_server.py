@@ -0,0 +1,192 @@
+import asyncio
+import os
+
+from core import CaseCatalog
+from server import AccountPool, CaseServer, MAX_ITEMS_IN_RESPONSE, MAX_OPEN_COUNT, request
+
+HOST = "127.0.0.1"
+
+def run_server(data_dir, cases_folder, scenario, **pool_options):
+    # Runs scenario(call) against a server on a free port; call(method, path,
+    # payload) returns (status, reply) over one keep-alive connection
+    async def main():
+        catalog = CaseCatalog(cases_folder)
+        catalog.load()
+        pool = AccountPool(data_dir, catalog, seed=1, **pool_options)
+        server = await asyncio.start_server(CaseServer(catalog, pool).handle_connection, HOST, 0)
+        port = server.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection(HOST, port)
+
+        def call(method, path, payload=None):
+            return request(reader, writer, HOST, method, path, payload)
+        # For scenarios that need a connection of their own
+        call.port = port
+
+        try:
+            return await scenario(call)
+        finally:
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            await pool.close()
+
+    return asyncio.run(main())
+
+def read_balance(data_dir, user):
+    with open(os.path.join(data_dir, user, "money.txt"), 'r') as f:
+        return float(f.read())
+
+def test_open_list_and_sell(tmp_path, cases_folder):
+    data_dir = str(tmp_path / "users")
+
+    async def scenario(call):
+        status, reply = await call('GET', '/cases')
+        assert status == 200
+        assert {case['name']: case['items'] for case in reply['cases']} == \
+            {"Alpha Case": 3, "Beta Case": 2}
+
+        status, opened = await call('POST', '/users/alice/open', {'case': "Alpha Case", 'count': 3})
+        assert status == 200
+        assert (opened['cost'], opened['balance']) == (15.0, 985.0)
+        assert [item['id'] for item in opened['items']] == [1, 2, 3]
+        assert opened['value'] == sum(item['price'] for item in opened['items'])
+
+        status, page = await call('GET', '/users/alice/inventory?offset=1&limit=1')
+        assert (status, page['total'], [item['id'] for item in page['items']]) == (200, 3, [2])
+
+        status, sold = await call('POST', '/users/alice/sell', {'ids': [1, 3, 42]})
+        assert status == 200
+        expected = opened['items'][0]['price'] + opened['items'][2]['price']
+        assert (sold['sold'], sold['total']) == (2, expected)
+
+        status, summary = await call('GET', '/users/alice')
+        assert (summary['balance'], summary['items']) == (985.0 + expected, 1)
+        status, other = await call('GET', '/users/bob')
+        assert (other['balance'], other['items']) == (1000.0, 0)
+        return summary
+
+    summary = run_server(data_dir, cases_folder, scenario)
+    # Closing the pool writes every account to its own files
+    assert read_balance(data_dir, "alice") == summary['balance']
+    assert os.path.getsize(os.path.join(data_dir, "ledger.log")) == 0
+
+def test_large_openings_return_counts(tmp_path, cases_folder):
+    async def scenario(call):
+        count = MAX_ITEMS_IN_RESPONSE + 1
+        status, opened = await call('POST', '/users/alice/open', {'case': "Beta Case", 'count': count})
+        assert status == 200
+        assert 'items' not in opened
+        assert sum(opened['counts'].values()) == count
+
+    run_server(str(tmp_path / "users"), cases_folder, scenario)
+
+def test_bad_requests(tmp_path, cases_folder):
+    async def scenario(call):
+        for method, path, payload, expected in (
+                ('GET', '/nothing', None, 404),
+                ('GET', '/users/no%20spaces', None, 400),
+                ('POST', '/users/alice', {}, 405),
+                ('GET', '/users/alice/open', None, 405),
+                ('POST', '/users/alice/trade', {}, 404),
+                ('POST', '/users/alice/open', {'case': "Gamma Case"}, 404),
+                ('POST', '/users/alice/open', {'case': "Alpha Case", 'count': 0}, 400),
+                ('POST', '/users/alice/open', {'case': "Alpha Case", 'count': "2"}, 400),
+                ('POST', '/users/alice/open', {'case': "Alpha Case", 'count': 201}, 409),
+                ('POST', '/users/alice/open', {'case': "Alpha Case", 'count': True}, 400),
+                ('POST', '/users/alice/open', {'case': "Alpha Case", 'count': MAX_OPEN_COUNT + 1}, 400),
+                ('POST', '/users/alice/sell', {'ids': [True]}, 400),
+                ('POST', '/users/alice/sell', {'ids': "1"}, 400),
+                ('POST', '/users/alice/sell', [1], 400),
+                ('GET', '/users/alice/inventory?limit=x', None, 400)):
+            status, reply = await call(method, path, payload)
+            assert (path, status) == (path, expected)
+            assert 'error' in reply
+        status, summary = await call('GET', '/users/alice')
+        assert (summary['balance'], summary['items']) == (1000.0, 0)
+
+    run_server(str(tmp_path / "users"), cases_folder, scenario)
+
+def test_bad_body_sizes_are_answered(tmp_path, cases_folder):
+    async def send_raw(port, head):
+        # The reply status; the server closes the connection after it
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(head)
+        status = int((await reader.readline()).split()[1])
+        await reader.read()
+        writer.close()
+        return status
+
+    async def scenario(call):
+        post = b"POST /users/alice/open HTTP/1.1\r\nHost: x\r\n"
+        assert await send_raw(call.port, post + b"Content-Length: abc\r\n\r\n") == 400
+        assert await send_raw(call.port, post + b"Content-Length: 99000000\r\n\r\n") == 413
+        # The shared connection is still fine
+        status, summary = await call('GET', '/users/alice')
+        assert (status, summary['balance']) == (200, 1000.0)
+
+    run_server(str(tmp_path / "users"), cases_folder, scenario)
+
+def test_changes_survive_a_crash(tmp_path, cases_folder, monkeypatch):
+    data_dir = str(tmp_path / "users")
+
+    async def scenario(call):
+        await call('POST', '/users/alice/open', {'case': "Alpha Case", 'count': 2})
+        status, opened = await call('POST', '/users/bob/open', {'case': "Beta Case", 'count': 4})
+        return opened
+
+    # A pool that never writes the accounts' files, as after a crash
+    async def crash(pool):
+        pool.ledger.close()
+        pool.executor.shutdown()
+        pool.file_lock.release()
+
+    monkeypatch.setattr(AccountPool, 'close', crash)
+    opened = run_server(data_dir, cases_folder, scenario)
+    monkeypatch.undo()
+    # Only the shared ledger has the changes
+    assert read_balance(data_dir, "bob") == 1000.0
+
+    async def check(call):
+        status, alice = await call('GET', '/users/alice')
+        status, bob = await call('GET', '/users/bob')
+        return alice, bob
+
+    alice, bob = run_server(data_dir, cases_folder, check)
+    assert (alice['balance'], alice['items']) == (990.0, 2)
+    assert (bob['balance'], bob['items']) == (opened['balance'], 4)
+
+def test_checkpoint_writes_changed_accounts(tmp_path, cases_folder):
+    data_dir = str(tmp_path / "users")
+
+    async def scenario(call):
+        for _ in range(3):
+            await call('POST', '/users/alice/open', {'case': "Beta Case", 'count': 1})
+        # The third record reached the limit: alice's files get all three in
+        # the background, then the rotated part of the log goes
+        ledger_path = os.path.join(data_dir, "ledger.log")
+        for _ in range(200):
+            if not os.path.exists(ledger_path + ".old"):
+                break
+            await asyncio.sleep(0.01)
+        assert read_balance(data_dir, "alice") == 1000.0 - 3 * 2.5
+        assert not os.path.exists(ledger_path + ".old")
+
+    run_server(data_dir, cases_folder, scenario, checkpoint_records=3)
+
+def test_sell_by_query(tmp_path, cases_folder):
+    async def scenario(call):
+        status, opened = await call('POST', '/users/alice/open', {'case': "Alpha Case", 'count': 50})
+        commons = [item for item in opened['items'] if item['rarity'] == 'common']
+        status, sold = await call('POST', '/users/alice/sell', {'rarity': "common", 'max_price': 1})
+        assert status == 200
+        assert (sold['sold'], sold['total']) == (len(commons), 0.5 * len(commons))
+        status, summary = await call('GET', '/users/alice')
+        assert summary['items'] == 50 - len(commons)
+        assert 'common' not in {rarity for rarity, count in summary['rarities'].items() if count}
+
+        status, reply = await call('POST', '/users/alice/sell', {})
+        assert status == 400
+        status, reply = await call('POST', '/users/alice/sell', {'rarity': 5})
+        assert status == 400
+
+    run_server(str(tmp_path / "users"), cases_folder, scenario)
@@ -0,0 +1,201 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+
+import casepack
+
+# Seconds between snapshots when inotify isn't available
+POLL_INTERVAL = 2.0
+# Changes are reported once the folder has been quiet for this long, so a
+# case being copied in is reloaded once rather than file by file
+SETTLE_DELAY = 0.3
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+EVENT = struct.Struct("iIII")
+
+class Inotify:
+    # Minimal ctypes binding; raises OSError or AttributeError where inotify
+    # doesn't exist so callers can fall back to polling
+    def __init__(self):
+        self.libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+    def add_watch(self, path, mask=WATCH_MASK):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"Can't watch {path}")
+        return wd
+
+    def read(self, timeout):
+        # Yields (watch descriptor, mask, name) for every event read within timeout
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = EVENT.unpack_from(data, offset)
+            offset += EVENT.size
+            name = data[offset:offset + length].rstrip(b'\0').decode('utf-8', 'surrogateescape')
+            offset += length
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+class CaseWatcher:
+    # Watches the cases folder from a background thread and calls
+    # on_change(names) with the top-level entries (case folders or pack
+    # files) that were added, removed or changed. Uses inotify on Linux and
+    # compares mtime snapshots everywhere else. on_change runs on the
+    # watcher thread; GUI code has to hand the names over to the Tk thread
+    def __init__(self, folder, on_change, interval=POLL_INTERVAL, settle=SETTLE_DELAY):
+        self.folder = folder
+        self.on_change = on_change
+        self.interval = interval
+        self.settle = settle
+        self.stop_event = threading.Event()
+        try:
+            self.inotify = Inotify()
+        except (OSError, AttributeError):
+            self.inotify = None
+        target = self.run_inotify if self.inotify else self.run_polling
+        self.thread = threading.Thread(target=target, name="case-watcher", daemon=True)
+        self.thread.start()
+
+    @staticmethod
+    def ignored(name):
+        # The catalog manifest and half-written files live in the same folder
+        return not name or name.startswith('.') or name.endswith(".tmp")
+
+    def entry_signature(self, path):
+        # mtime and size of everything a case is loaded from, sprites included
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if not os.path.isdir(path):
+            return (st.st_mtime_ns, st.st_size)
+        signature = [(st.st_mtime_ns, st.st_size)]
+        for name in ("case.txt", "items.txt", "case.png"):
+            try:
+                st = os.stat(os.path.join(path, name))
+                signature.append((name, st.st_mtime_ns, st.st_size))
+            except OSError:
+                signature.append((name, None))
+        try:
+            with os.scandir(os.path.join(path, "sprites")) as entries:
+                for entry in entries:
+                    st = entry.stat()
+                    signature.append((entry.name, st.st_mtime_ns, st.st_size))
+        except OSError:
+            pass
+        return tuple(sorted(signature, key=str))
+
+    def snapshot(self):
+        snapshot = {}
+        try:
+            names = os.listdir(self.folder)
+        except OSError:
+            return snapshot
+        for name in names:
+            if not self.ignored(name):
+                path = os.path.join(self.folder, name)
+                if os.path.isdir(path) or name.endswith(casepack.PACK_EXTENSION):
+                    snapshot[name] = self.entry_signature(path)
+        return snapshot
+
+    def run_polling(self):
+        previous = self.snapshot()
+        while not self.stop_event.wait(self.interval):
+            current = self.snapshot()
+            changed = {name for name in previous.keys() | current.keys()
+                       if previous.get(name) != current.get(name)}
+            previous = current
+            if changed:
+                self.report(changed)
+
+    def run_inotify(self):
+        watches = {}  # watch descriptor -> top-level entry name, '' for the folder itself
+
+        def watch(path, name):
+            try:
+                watches[self.inotify.add_watch(path)] = name
+            except OSError:
+                pass
+
+        def watch_case(name):
+            path = os.path.join(self.folder, name)
+            if os.path.isdir(path):
+                watch(path, name)
+                watch(os.path.join(path, "sprites"), name)
+
+        watch(self.folder, '')
+        for name in os.listdir(self.folder):
+            if not self.ignored(name):
+                watch_case(name)
+
+        changed = set()
+        try:
+            while not self.stop_event.is_set():
+                # Wait for the first event, then collect until things settle
+                events = list(self.inotify.read(self.settle if changed else self.interval))
+                if not events and changed:
+                    self.report(changed)
+                    changed = set()
+                    continue
+                for wd, mask, name in events:
+                    if mask & IN_Q_OVERFLOW:
+                        # Events were lost, treat every case as changed
+                        changed.update(n for n in os.listdir(self.folder) if not self.ignored(n))
+                        continue
+                    if mask & IN_IGNORED:
+                        watches.pop(wd, None)
+                        continue
+                    top = watches.get(wd)
+                    if top is None:
+                        continue
+                    if top == '':
+                        if self.ignored(name):
+                            continue
+                        changed.add(name)
+                        if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                            watch_case(name)
+                    else:
+                        changed.add(top)
+                        if name == "sprites" and mask & (IN_CREATE | IN_MOVED_TO):
+                            watch(os.path.join(self.folder, top, name), top)
+        finally:
+            self.inotify.close()
+
+    def report(self, names):
+        try:
+            self.on_change(sorted(names))
+        except Exception as e:
+            print(f"Error reloading cases: {str(e)}")
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()